@@ -0,0 +1,222 @@
+# coding=utf-8
+"""
+Local stand-in for the PyPI JSON API, the GitHub REST API, the raw GitHub file host, the Bitbucket API and project
+home pages.
+
+Each service listens on its own loopback address (127.0.0.1, 127.0.0.2, ...), so the GitHub rate limit scheduler
+only paces the GitHub stand-in and every service has its own in-flight limit, as the real hosts do. Package
+``pkg-<i>`` is hosted on a service chosen by ``i``:
+
+* 0: GitHub home page, license from the raw ``LICENSE`` file or ``/repos/<owner>/<repo>/license``
+* 1: Bitbucket home page, license from the raw ``LICENSE`` file or the repository ``src`` listing
+* 2: documentation home page linking the GitHub repository
+* 3: home page without repository links, found with the GitHub repository search
+"""
+import base64
+import json
+import random
+import re
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler
+from BaseHTTPServer import HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import parse_qs
+from urlparse import urlparse
+
+OWNER = "bench"
+LICENSE_TEXT = ("Copyright (c) 2018 {}\n\nPermission is hereby granted, free of charge, to any person obtaining a "
+                "copy of this software and associated documentation files...\n")
+HOSTING = ["github", "bitbucket", "home_page", "github_search"]
+
+
+def hosting(name):
+    """
+    Hosting kind of a synthetic package
+    :param name: pkg-<i>
+    :return: one of HOSTING
+    """
+    match = re.match(r"^pkg-(\d+)$", name)
+    return HOSTING[int(match.group(1)) % len(HOSTING)] if match else "github_search"
+
+
+class ThreadedServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # clients close home page downloads early
+        pass
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # one send per response, otherwise delayed ACKs add 40 ms to every request
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        services = self.server.services
+        services.count(self.server.service)
+        if services.latency:
+            time.sleep(random.uniform(services.latency / 2.0, services.latency * 1.5))
+        if services.error_rate and random.random() < services.error_rate:
+            return self.send_body(503, {"message": "Service Unavailable"})
+        parsed_url = urlparse(self.path)
+        handler = getattr(self, "get_" + self.server.service)
+        handler(parsed_url.path.strip("/").split("/"), parse_qs(parsed_url.query))
+
+    do_HEAD = do_GET
+
+    def send_body(self, status, body, content_type="application/json", headers=None):
+        if not isinstance(body, basestring):
+            body = json.dumps(body)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def get_pypi(self, parts, query):
+        # /pypi/<name>/<version>/json or /pypi/<name>/json
+        if len(parts) < 3 or parts[0] != "pypi" or parts[-1] != "json":
+            return self.send_body(404, {"message": "Not Found"})
+        name = parts[1]
+        version = parts[2] if len(parts) == 4 else "1.0"
+        services = self.server.services
+        home_pages = {
+            "github": "https://github.com/{}/{}".format(OWNER, name),
+            "bitbucket": "https://bitbucket.org/{}/{}".format(OWNER, name),
+            "home_page": "{}/docs/{}".format(services.urls["home"], name),
+            "github_search": "{}/plain/{}".format(services.urls["home"], name),
+        }
+        info = {"name": name, "version": version, "author": "Author of {}".format(name),
+                "author_email": "{}@example.org".format(name), "license": "MIT",
+                "home_page": home_pages[hosting(name)], "requires_dist": [], "classifiers": []}
+        self.send_body(200, {"info": info, "releases": {version: []}})
+
+    def get_github(self, parts, query):
+        allowed, headers = self.server.services.spend_rate_limit(self.headers.get("Authorization"))
+        if not allowed:
+            return self.send_body(403, {"message": "API rate limit exceeded"}, headers=headers)
+        if parts[0] == "repos" and len(parts) == 4 and parts[3] == "license":
+            content = base64.b64encode(LICENSE_TEXT.format(parts[2]))
+            return self.send_body(200, {"name": "LICENSE", "content": content, "encoding": "base64",
+                                        "license": {"spdx_id": "MIT", "name": "MIT License"}}, headers=headers)
+        if parts == ["search", "repositories"]:
+            name = query.get("q", [""])[0]
+            item = {"name": name, "url": "{}/repos/{}/{}".format(self.server.services.urls["github"], OWNER, name)}
+            return self.send_body(200, {"total_count": 1, "items": [item]}, headers=headers)
+        self.send_body(404, {"message": "Not Found"}, headers=headers)
+
+    def get_raw(self, parts, query):
+        # /<owner>/<repo>/HEAD/<file>
+        if len(parts) == 4 and parts[2] == "HEAD" and parts[3] == "LICENSE":
+            return self.send_body(200, LICENSE_TEXT.format(parts[1]), content_type="text/plain")
+        self.send_body(404, "404: Not Found", content_type="text/plain")
+
+    def get_bitbucket(self, parts, query):
+        # /repositories/<owner>/<repo>/src, /raw/<owner>/<repo>/LICENSE and /<owner>/<repo>/raw/HEAD/<file>
+        if len(parts) == 5 and parts[2:4] == ["raw", "HEAD"]:
+            if parts[4] == "LICENSE":
+                return self.send_body(200, LICENSE_TEXT.format(parts[1]), content_type="text/plain")
+            return self.send_body(404, "Not Found", content_type="text/plain")
+        if parts[0] == "repositories" and len(parts) == 4 and parts[3] == "src":
+            href = "{}/raw/{}/{}/LICENSE".format(self.server.services.urls["bitbucket"], parts[1], parts[2])
+            return self.send_body(200, {"pagelen": 100, "values": [
+                {"path": "README.rst", "links": {"self": {"href": href.replace("LICENSE", "README.rst")}}},
+                {"path": "LICENSE", "links": {"self": {"href": href}}}]})
+        if parts[0] == "raw" and len(parts) == 4:
+            return self.send_body(200, LICENSE_TEXT.format(parts[2]), content_type="text/plain")
+        self.send_body(404, {"message": "Not Found"})
+
+    def get_home(self, parts, query):
+        if len(parts) != 2:
+            return self.send_body(404, "Not Found", content_type="text/html")
+        links = ""
+        if parts[0] == "docs":
+            repo_url = "https://github.com/{}/{}".format(OWNER, parts[1])
+            links = "".join('<a href="{}{}">{}</a>'.format(repo_url, path, path or "source")
+                            for path in ("", "", "/issues", ""))
+        filler = "<p>{}</p>".format("documentation " * 50) * 40
+        body = "<html><head><title>{0}</title></head><body><h1>{0}</h1>{1}{2}</body></html>".format(
+            parts[1], links, filler)
+        self.send_body(200, body, content_type="text/html; charset=utf-8")
+
+
+class FakeServices(object):
+    """
+    Starts the stand-in services on free ports of their own loopback addresses
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, rate_limit=None, rate_limit_window=60.0, seed=None):
+        """
+        :param latency: mean response delay in seconds, each response waits between 0.5x and 1.5x of it
+        :param error_rate: fraction of requests answered with 503
+        :param rate_limit: GitHub requests allowed per token and window, None for no limit
+        :param rate_limit_window: seconds after which a GitHub rate limit resets
+        :param seed: seed of the latency and error draws
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.requests = {}
+        self.urls = {}
+        self._servers = []
+        self._budgets = {}
+        self._lock = threading.Lock()
+        if seed is not None:
+            random.seed(seed)
+
+    def count(self, service):
+        with self._lock:
+            self.requests[service] = self.requests.get(service, 0) + 1
+
+    def spend_rate_limit(self, token):
+        """
+        Count a GitHub request against the budget of its token
+        :return: whether the request is allowed and the rate limit headers of the response
+        """
+        if self.rate_limit is None:
+            return True, {}
+        now = time.time()
+        with self._lock:
+            remaining, reset = self._budgets.get(token, (self.rate_limit, now + self.rate_limit_window))
+            if reset <= now:
+                remaining, reset = self.rate_limit, now + self.rate_limit_window
+            allowed = remaining > 0
+            remaining = max(remaining - 1, 0)
+            self._budgets[token] = (remaining, reset)
+        return allowed, {"X-RateLimit-Limit": str(self.rate_limit), "X-RateLimit-Remaining": str(remaining),
+                         "X-RateLimit-Reset": str(int(reset) + 1)}
+
+    def start(self):
+        for number, service in enumerate(("pypi", "github", "raw", "bitbucket", "home")):
+            server = ThreadedServer(("127.0.0.{}".format(number + 1), 0), FakeHandler)
+            server.service = service
+            server.services = self
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+            self._servers.append(server)
+            self.urls[service] = "http://{}:{}".format(*server.server_address)
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
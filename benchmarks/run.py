@@ -0,0 +1,168 @@
+# coding=utf-8
+"""
+Benchmark of the license resolution against the local stand-in services of :mod:`fake_services`.
+
+For every size a synthetic requirements file of ``pkg-0==1.0`` ... ``pkg-<n-1>==1.0`` is resolved in a separate
+interpreter, so the peak RSS is that of the resolution alone. The report has the wall time, the throughput, the
+p50/p99 latency of a package (time spent fetching its details and finding its license, queueing excluded) and the
+peak RSS.
+
+    python benchmarks/run.py --sizes 10 100 1000 --workers 16 --latency 0.02 --error-rate 0.01
+"""
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from urlparse import urlparse
+
+import os
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_services import FakeServices  # noqa: E402
+
+parser = ArgumentParser(description="pylicense-manager benchmark against local stand-in services")
+parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000],
+                    help="number of packages of each run [default: %(default)s]")
+parser.add_argument("-w", "--workers", type=int, default=16, help="packages resolved concurrently [default: %(default)s]")
+parser.add_argument("--async", dest="async_mode", action="store_true", default=False,
+                    help="resolve on gevent greenlets, --workers is the concurrency")
+parser.add_argument("--latency", type=float, default=0.02, help="mean response delay in seconds [default: %(default)s]")
+parser.add_argument("--error-rate", type=float, default=0.0,
+                    help="fraction of responses that are 503 errors [default: %(default)s]")
+parser.add_argument("--rate-limit", type=int, default=None,
+                    help="GitHub requests allowed per token and window [default: unlimited]")
+parser.add_argument("--rate-limit-window", type=float, default=60.0,
+                    help="seconds after which the GitHub rate limit resets [default: %(default)s]")
+parser.add_argument("--tokens", type=int, default=1, help="number of GitHub tokens to rotate [default: %(default)s]")
+parser.add_argument("--seed", type=int, default=0, help="seed of the latency and error draws [default: %(default)s]")
+parser.add_argument("--json", dest="json_path", default=None, help="also write the results to this JSON file")
+# set by the parent process for a single run
+parser.add_argument("--run", type=int, default=None, help="==SUPPRESS==")
+parser.add_argument("--urls", default=None, help="==SUPPRESS==")
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[int(round(fraction * (len(ordered) - 1)))]
+
+
+def run_once(options):
+    """
+    Resolve one synthetic requirements file, called in the child interpreter
+    :return: result dict
+    """
+    if options.async_mode:
+        from pylicense_manager import green
+        green.patch()
+    from pylicense_manager.environment import DistributionIndex
+    from pylicense_manager.manager import Manager
+
+    urls = json.loads(options.urls)
+    temp_dir = tempfile.mkdtemp()
+    try:
+        requirements_path = os.path.join(temp_dir, "requirements.txt")
+        with open(requirements_path, "w") as requirements_file:
+            requirements_file.write("".join("pkg-{}==1.0\n".format(i) for i in range(options.run)))
+        manager = Manager(requirements_path=requirements_path, output_path=temp_dir,
+                          gh_token=["token-{}".format(i) for i in range(options.tokens)],
+                          workers=options.workers, pool_maxsize=options.workers,
+                          host_limits=dict((urlparse(url).hostname, options.workers * 4) for url in urls.values()),
+                          environment=DistributionIndex(paths=[]),
+                          pypi_url=urls["pypi"] + "/pypi", github_api_url=urls["github"],
+                          bitbucket_api_url=urls["bitbucket"], github_raw_url=urls["raw"],
+                          bitbucket_raw_url=urls["bitbucket"], rate_limit_wait=options.rate_limit_window + 1)
+
+        durations = {}
+        lock = threading.Lock()
+
+        def timed(func):
+            def wrapper(package):
+                started = time.time()
+                try:
+                    return func(package)
+                finally:
+                    with lock:
+                        durations[id(package)] = durations.get(id(package), 0.0) + time.time() - started
+            return wrapper
+
+        manager._get_package_details = timed(manager._get_package_details)
+        manager._route_package = timed(manager._route_package)
+        started = time.time()
+        try:
+            if options.async_mode:
+                packages = manager.parse_requirements_async(concurrency=options.workers)
+            else:
+                packages = manager.parse_requirements()
+        finally:
+            manager.close()
+        elapsed = time.time() - started
+    finally:
+        shutil.rmtree(temp_dir)
+
+    strategies = {}
+    for package in packages:
+        strategy = package.get("strategy") or "unresolved"
+        strategies[strategy] = strategies.get(strategy, 0) + 1
+    latencies = list(durations.values())
+    return {
+        "packages": len(packages),
+        "seconds": elapsed,
+        "packages_per_second": len(packages) / elapsed if elapsed else None,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        # kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "strategies": strategies,
+        "unresolved": len(manager.unresolved)
+    }
+
+
+def run_size(options, size):
+    with FakeServices(latency=options.latency, error_rate=options.error_rate, rate_limit=options.rate_limit,
+                      rate_limit_window=options.rate_limit_window, seed=options.seed) as services:
+        command = [sys.executable, os.path.abspath(__file__), "--run", str(size), "--urls", json.dumps(services.urls),
+                   "--workers", str(options.workers), "--tokens", str(options.tokens),
+                   "--rate-limit-window", str(options.rate_limit_window)]
+        if options.async_mode:
+            command.append("--async")
+        with open(os.devnull, "w") as devnull:
+            output = subprocess.check_output(command, stderr=devnull)
+        result = json.loads(output.strip().splitlines()[-1])
+        result["requests"] = dict(services.requests)
+    return result
+
+
+def main():
+    options = parser.parse_args()
+    if options.run is not None:
+        print(json.dumps(run_once(options)))
+        return 0
+
+    columns = "{:>8} {:>10} {:>12} {:>10} {:>10} {:>10} {:>10}  {}"
+    print(columns.format("packages", "seconds", "packages/s", "p50 ms", "p99 ms", "peak MB", "requests", "strategies"))
+    results = []
+    for size in options.sizes:
+        result = run_size(options, size)
+        results.append(result)
+        print(columns.format(result["packages"], "{:.2f}".format(result["seconds"]),
+                             "{:.1f}".format(result["packages_per_second"]), "{:.1f}".format(result["p50_ms"]),
+                             "{:.1f}".format(result["p99_ms"]), "{:.1f}".format(result["peak_rss_mb"]),
+                             sum(result["requests"].values()),
+                             ", ".join("{}={}".format(*item) for item in sorted(result["strategies"].items()))))
+        sys.stdout.flush()
+    if options.json_path:
+        with open(options.json_path, "w") as json_file:
+            json.dump({"options": vars(options), "results": results}, json_file, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# coding=utf-8
+"""
+Read metadata and license files straight out of wheel and sdist archives.
+
+Wheels and zip sdists are opened through the zip central directory and only the METADATA/PKG-INFO and
+LICENSE*/LICENCE*/COPYING* members are read. Tar sdists are streamed and the same members are read as they go
+by. Nothing is unpacked to disk.
+"""
+import logging
+import multiprocessing
+import posixpath
+import re
+import tarfile
+import zipfile
+from email import message_from_string
+
+import os
+
+from pylicense_manager import utils
+from pylicense_manager.github import license_file_names
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+sdist_extensions = ['.tar.gz', '.tgz', '.tar.bz2', '.tar', '.zip']
+license_member_pattern = re.compile(r"^(licen[cs]e|copying)", re.IGNORECASE)
+
+
+def archive_name_version(file_name):
+    """
+    Package name and version of a wheel or sdist file name
+    :param file_name:
+    :return: tuple of name and version, None when the file is not a package archive
+    """
+    if file_name.endswith(".whl"):
+        parts = file_name[:-4].split("-")
+        return (parts[0], parts[1]) if len(parts) >= 5 else None
+    for extension in sdist_extensions:
+        if file_name.endswith(extension):
+            base = file_name[:-len(extension)]
+            if "-" not in base:
+                return None
+            return tuple(base.rsplit("-", 1))
+    return None
+
+
+def index_wheelhouse(directory):
+    """
+    Archives of a wheelhouse directory, wheels are preferred over sdists
+    :param directory:
+    :return: dict of (normalized name, version) to archive path
+    """
+    archives = {}
+    for file_name in sorted(os.listdir(directory)):
+        name_version = archive_name_version(file_name)
+        if name_version is None:
+            continue
+        key = (utils.normalize_name(name_version[0]), name_version[1])
+        if key not in archives or file_name.endswith(".whl"):
+            archives[key] = os.path.join(directory, file_name)
+    return archives
+
+
+def license_rank(member_name):
+    """
+    Sort key of license files, well known names first
+    :param member_name: archive member or file path
+    :return:
+    """
+    base_name = posixpath.basename(member_name)
+    try:
+        return license_file_names.index(base_name), member_name
+    except ValueError:
+        return len(license_file_names), member_name
+
+
+def _is_metadata_member(member_name, is_wheel):
+    parts = member_name.split("/")
+    if is_wheel:
+        return len(parts) == 2 and parts[0].endswith(".dist-info") and parts[1] == "METADATA"
+    return len(parts) == 2 and parts[1] == "PKG-INFO"
+
+
+def _is_license_member(member_name, is_wheel):
+    parts = member_name.split("/")
+    if not license_member_pattern.match(parts[-1]):
+        return False
+    if is_wheel:
+        # dist-info/LICENSE or dist-info/licenses/... (License-File)
+        return parts[0].endswith(".dist-info")
+    # license files at the root of the sdist project directory
+    return len(parts) == 2
+
+
+def _metadata(content):
+    message = message_from_string(content)
+    metadata = {k.lower(): v for k, v in dict(message).iteritems()}
+    metadata["classifiers"] = message.get_all("Classifier") or []
+    metadata["project_urls"] = message.get_all("Project-URL") or []
+    return metadata
+
+
+def read_archive(path):
+    """
+    Metadata and license text of a package archive
+    :param path: wheel or sdist path
+    :return: dict with metadata, license_file and license_text, None when the archive cannot be read
+    """
+    is_wheel = path.endswith(".whl")
+    metadata_content = None
+    licenses = {}
+    try:
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for member_name in archive.namelist():
+                    if _is_metadata_member(member_name, is_wheel):
+                        metadata_content = archive.read(member_name)
+                    elif _is_license_member(member_name, is_wheel):
+                        licenses[member_name] = archive.read(member_name)
+        else:
+            archive = tarfile.open(path, "r|*")
+            try:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+                    if _is_metadata_member(member.name, False):
+                        metadata_content = archive.extractfile(member).read()
+                    elif _is_license_member(member.name, False):
+                        licenses[member.name] = archive.extractfile(member).read()
+            finally:
+                archive.close()
+    except (IOError, OSError, zipfile.BadZipfile, tarfile.TarError) as exp:
+        logger.error("Error in reading package archive %s - %s" % (path, exp))
+        return None
+
+    license_file = min(licenses, key=license_rank) if licenses else None
+    return {
+        "path": path,
+        "metadata": _metadata(metadata_content) if metadata_content else {},
+        "license_file": license_file,
+        "license_text": licenses[license_file].decode("utf8", "replace") if license_file else None
+    }
+
+
+def read_archives(paths, processes=None):
+    """
+    Read package archives in parallel across CPU cores
+    :param paths: archive paths
+    :param processes: worker processes, defaults to the number of CPUs
+    :return: dict of archive path to read_archive result
+    """
+    paths = sorted(set(paths))
+    processes = min(processes or multiprocessing.cpu_count(), len(paths))
+    if processes <= 1:
+        return dict(zip(paths, map(read_archive, paths)))
+    pool = multiprocessing.Pool(processes)
+    try:
+        return dict(zip(paths, pool.map(read_archive, paths)))
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,137 @@
+# coding=utf-8
+"""
+Single archive output: license texts are streamed into one zip or tar archive instead of one file each.
+
+Every member is written to the archive as soon as it is added and dropped from memory, only the small member
+headers are kept until the archive is closed. The index of the members is spooled to a temporary file and added as
+``index.jsonl`` last, one JSON object per line. The archive is written next to its final path and renamed on close.
+"""
+import io
+import json
+import logging
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+
+import os
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "index.jsonl"
+# archive extension to tarfile mode, zip archives are deflated
+archive_modes = [(".tar.gz", "w:gz"), (".tgz", "w:gz"), (".tar.bz2", "w:bz2"), (".tar", "w"), (".zip", "zip")]
+
+
+def archive_mode(path):
+    """
+    Archive format of an output path
+    :param path:
+    :return: "zip" or a tarfile write mode
+    """
+    for extension, mode in archive_modes:
+        if path.lower().endswith(extension):
+            return mode
+    raise ValueError("Unsupported archive {}, use one of {}".format(
+        path, ", ".join(extension for extension, _ in archive_modes)))
+
+
+class LicenseBundle(object):
+    """
+    Thread safe incremental writer of a zip or tar archive with an index member
+    """
+
+    def __init__(self, path):
+        """
+        :param path: archive path, the format follows the extension
+        """
+        self.path = path
+        self.mode = archive_mode(path)
+        self.members = 0
+        self.closed = False
+        self._part_path = path + ".part"
+        self._index = None
+        self._archive = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if self._archive is not None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        if self.mode == "zip":
+            self._archive = zipfile.ZipFile(self._part_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+        else:
+            self._archive = tarfile.open(self._part_path, self.mode)
+        self._index = tempfile.NamedTemporaryFile(prefix="pylicense-index-", suffix=".jsonl", delete=False)
+
+    def _write_member(self, name, data, size=None):
+        """
+        :param data: bytes, or a file object of size bytes
+        """
+        if self.mode == "zip":
+            if isinstance(data, bytes):
+                info = zipfile.ZipInfo(name, time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                self._archive.writestr(info, data)
+            else:
+                self._archive.write(data.name, name)
+        else:
+            info = tarfile.TarInfo(name)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            if isinstance(data, bytes):
+                info.size = len(data)
+                data = io.BytesIO(data)
+            else:
+                info.size = size
+            self._archive.addfile(info, data)
+
+    def add(self, member, content, **fields):
+        """
+        Write a member and record it in the index
+        :param member: member path
+        :param content: text of the member
+        :param fields: index fields of the member
+        """
+        data = content.encode("utf8") if isinstance(content, unicode) else content
+        with self._lock:
+            if self.closed:
+                raise ValueError("Archive {} is closed".format(self.path))
+            self._open()
+            self._write_member(member, data)
+            fields.update(member=member, size=len(data))
+            self._index.write(json.dumps(fields, sort_keys=True) + "\n")
+            self.members += 1
+
+    def close(self):
+        """
+        Add the index and move the archive to its path, a run without licenses writes an archive with an empty index
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._open()
+            try:
+                self._index.flush()
+                os.chmod(self._index.name, 0o644)
+                size = self._index.tell()
+                self._index.seek(0)
+                self._write_member(INDEX_NAME, self._index, size)
+                self._archive.close()
+                os.rename(self._part_path, self.path)
+                logger.info("Wrote {} license(s) to {}".format(self.members, self.path))
+            finally:
+                self._index.close()
+                os.remove(self._index.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
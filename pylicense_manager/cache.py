@@ -0,0 +1,215 @@
+# coding=utf-8
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+import urllib
+from collections import OrderedDict
+
+import os
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from pylicense_manager import utils
+from pylicense_manager.defaults import DEFAULT_CACHE_DIR
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+# validators and headers kept with a cached body
+stored_headers = ['etag', 'last-modified', 'content-type']
+
+
+class ResponseCache(object):
+    """
+    On-disk cache of HTTP responses revalidated with conditional requests.
+
+    Entries are stored one JSON file per method+URL+params key together with the ETag/Last-Modified validators.
+    Entries older than ``ttl`` are dropped and fetched again in full, and the least recently validated entries
+    are evicted once the cache grows past ``max_size`` bytes.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttl=7 * 24 * 60 * 60, max_size=256 * 1024 * 1024):
+        """
+        :param directory: cache directory
+        :param ttl: seconds an entry may be revalidated before it is fetched again in full
+        :param max_size: maximum cache size in bytes
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        utils.create_path(self.directory)
+        self.prune()
+
+    @staticmethod
+    def key(method, request_url, params=None):
+        if params:
+            request_url = "{}?{}".format(request_url, urllib.urlencode(sorted(dict(params).items())))
+        return hashlib.sha1(u"{} {}".format(method.upper(), request_url).encode("utf8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, "{}.json".format(key))
+
+    def get(self, key):
+        """
+        Cached entry for key, or None when it is missing or expired
+        :param key:
+        :return: entry dict
+        """
+        path = self._path(key)
+        try:
+            with open(path) as entry_file:
+                entry = json.load(entry_file)
+        except (IOError, ValueError):
+            return None
+        if time.time() - entry["stored_at"] > self.ttl:
+            self._remove(path)
+            return None
+        return entry
+
+    def set(self, key, response):
+        """
+        Store a 200 response carrying an ETag or Last-Modified validator
+        :param key:
+        :param response: requests.Response with its body read
+        """
+        headers = dict((name, response.headers[name]) for name in stored_headers if name in response.headers)
+        if "etag" not in headers and "last-modified" not in headers:
+            return
+        entry = {
+            "url": response.url,
+            "status": response.status_code,
+            "encoding": response.encoding,
+            "headers": headers,
+            "content": base64.b64encode(response.content),
+            "stored_at": time.time()
+        }
+        self._write(key, entry)
+
+    def touch(self, key, entry):
+        """
+        Restart the TTL of an entry after a 304 Not Modified
+        """
+        entry["stored_at"] = time.time()
+        self._write(key, entry)
+
+    def _write(self, key, entry):
+        path = self._path(key)
+        # write then rename so concurrent readers never see a partial entry
+        temp_path = "{}.{}.{}.tmp".format(path, os.getpid(), id(entry))
+        try:
+            with open(temp_path, "w") as entry_file:
+                json.dump(entry, entry_file)
+            os.rename(temp_path, path)
+        except (IOError, OSError) as exp:
+            logger.error("Error in writing cache entry at %s - %s" % (path, exp))
+            self._remove(temp_path)
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if "etag" in entry["headers"]:
+            headers["If-None-Match"] = entry["headers"]["etag"]
+        if "last-modified" in entry["headers"]:
+            headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+        return headers
+
+    @staticmethod
+    def build_response(entry):
+        """
+        Rebuild a requests.Response from a cached entry
+        """
+        response = Response()
+        response.status_code = entry["status"]
+        response.reason = "OK"
+        response.url = entry["url"]
+        response.encoding = entry["encoding"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = base64.b64decode(entry["content"])
+        response._content_consumed = True
+        response.from_cache = True
+        return response
+
+    def prune(self):
+        """
+        Drop expired entries, then the oldest entries until the cache fits in max_size
+        """
+        now = time.time()
+        entries = []
+        total_size = 0
+        for file_name in os.listdir(self.directory):
+            path = os.path.join(self.directory, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.ttl:
+                self._remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self._remove(path)
+            total_size -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class MemoryCache(object):
+    """
+    Thread safe in-memory cache bounded in entries and age.
+
+    The least recently used entries are evicted once more than ``max_entries`` are kept, and entries older than
+    ``ttl`` are dropped on lookup, so the caches of a long running process neither grow without end nor answer
+    stale data forever.
+    """
+
+    def __init__(self, max_entries=4096, ttl=None):
+        """
+        :param max_entries: maximum number of entries
+        :param ttl: seconds an entry is kept, None keeps it until it is evicted
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        :param key:
+        :param default: value answered when the key is missing or expired
+        :return: cached value
+        """
+        with self._lock:
+            if key not in self._entries:
+                return default
+            stored_at, value = self._entries.pop(key)
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                return default
+            # most recently used last
+            self._entries[key] = stored_at, value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = time.time(), value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def update(self, values):
+        for key, value in values.items():
+            self.set(key, value)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
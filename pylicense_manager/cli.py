@@ -15,6 +15,8 @@ Why does this file exist, and why not put this in __main__?
 
   Also see (1) from http://click.pocoo.org/5/setuptools/#setuptools-integration
 """
+import datetime
+import importlib
 import logging
 import sys
 import traceback
@@ -22,7 +24,11 @@ from argparse import ArgumentParser, RawDescriptionHelpFormatter
 
 import os
 
-from pylicense_manager.manager import Manager
+from pylicense_manager import green
+from pylicense_manager.defaults import DEFAULT_ADDRESS
+from pylicense_manager.defaults import DEFAULT_CACHE_DIR
+from pylicense_manager.defaults import DEFAULT_STORE_PATH
+from pylicense_manager.instrumentation import Recorder
 
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
 BASE_PATH = os.path.realpath(os.path.join(SCRIPT_DIR, '../../'))
@@ -35,10 +41,10 @@ parser = ArgumentParser(
 parser.add_argument(
     '-r', "--requirements",
     dest="requirements_file",
-    help="path to requirements.txt",
+    help="path to requirements.txt, several paths or a quoted glob resolve every package once for all files",
     metavar="requirements_file",
-    nargs='?', const=BASE_PATH, type=str,
-    default=BASE_PATH)
+    nargs='+', type=str,
+    action="append")
 parser.add_argument(
     "-o", "--outputDirectory",
     dest="output_path",
@@ -48,9 +54,247 @@ parser.add_argument(
 parser.add_argument(
     "-a", "--github-token",
     dest="gh_token",
-    help="generate global statistics",
+    help="GitHub API token, repeat to rotate across several tokens",
     metavar="gh_token",
+    action="append",
+    default=[])
+parser.add_argument(
+    "--rate-limit-wait",
+    dest="rate_limit_wait",
+    help="longest wait in seconds for a GitHub rate limit reset before giving up [default: %(default)s]",
+    metavar="rate_limit_wait",
+    type=int,
+    default=60)
+parser.add_argument(
+    "--pool-size",
+    dest="pool_size",
+    help="maximum number of keep-alive connections per host [default: %(default)s]",
+    metavar="pool_size",
+    type=int,
+    default=10)
+parser.add_argument(
+    "-w", "--workers",
+    dest="workers",
+    help="number of packages resolved concurrently [default: %(default)s]",
+    metavar="workers",
+    type=int,
+    default=1)
+parser.add_argument(
+    "--host-limit",
+    dest="host_limits",
+    help="maximum in-flight requests for a host as HOST=N, '*' for other hosts (repeatable)",
+    metavar="host_limit",
+    action="append",
+    default=[])
+parser.add_argument(
+    "--async",
+    dest="async_mode",
+    help="resolve packages on gevent greenlets instead of threads",
+    action="store_true",
+    default=False)
+parser.add_argument(
+    "--concurrency",
+    dest="concurrency",
+    help="maximum number of packages in flight with --async [default: %(default)s]",
+    metavar="concurrency",
+    type=int,
+    default=100)
+parser.add_argument(
+    "--cache-dir",
+    dest="cache_dir",
+    help="directory of the HTTP response cache [default: %(default)s]",
+    metavar="cache_dir",
+    default=DEFAULT_CACHE_DIR)
+parser.add_argument(
+    "--cache-ttl",
+    dest="cache_ttl",
+    help="seconds a cached response is revalidated before it is fetched again [default: %(default)s]",
+    metavar="cache_ttl",
+    type=int,
+    default=7 * 24 * 60 * 60)
+parser.add_argument(
+    "--cache-size",
+    dest="cache_size",
+    help="maximum size of the HTTP response cache in MB [default: %(default)s]",
+    metavar="cache_size",
+    type=int,
+    default=256)
+parser.add_argument(
+    "--no-cache",
+    dest="no_cache",
+    help="disable the HTTP response cache",
+    action="store_true",
+    default=False)
+parser.add_argument(
+    "--store",
+    dest="store_path",
+    help="SQLite store of resolved license results [default: %(default)s]",
+    metavar="store_path",
+    default=DEFAULT_STORE_PATH)
+parser.add_argument(
+    "--store-ttl",
+    dest="store_ttl",
+    help="seconds a stored license result is reused [default: %(default)s]",
+    metavar="store_ttl",
+    type=int,
+    default=30 * 24 * 60 * 60)
+parser.add_argument(
+    "--negative-ttl",
+    dest="negative_ttl",
+    help="seconds a package without license is not searched again [default: %(default)s]",
+    metavar="negative_ttl",
+    type=int,
+    default=24 * 60 * 60)
+parser.add_argument(
+    "--no-store",
+    dest="no_store",
+    help="do not read or write stored license results",
+    action="store_true",
+    default=False)
+parser.add_argument(
+    "--github-batch",
+    dest="github_batch",
+    help="fetch GitHub repository licenses with batched GraphQL requests (needs --github-token)",
+    action="store_true",
+    default=False)
+parser.add_argument(
+    "--hedge",
+    dest="hedge",
+    help="race the license sources of a package, later sources start after a stagger and the best ranked source "
+         "that finds the license wins as in a serial run",
+    action="store_true",
+    default=False)
+parser.add_argument(
+    "--hedge-stagger",
+    dest="hedge_stagger",
+    help="seconds between the starts of the license sources with --hedge [default: %(default)s]",
+    metavar="hedge_stagger",
+    type=float,
+    default=0.25)
+parser.add_argument(
+    "--hedge-deadline",
+    dest="hedge_deadline",
+    help="seconds to wait for the license sources of a package with --hedge, the best license found by then wins",
+    metavar="hedge_deadline",
+    type=float,
+    default=None)
+parser.add_argument(
+    "--deadline",
+    dest="deadline",
+    help="seconds the run may take, packages not resolved by then are reported as unresolved and the license files "
+         "found so far are kept",
+    metavar="deadline",
+    type=float,
+    default=None)
+parser.add_argument(
+    "--max-host-failures",
+    dest="max_host_failures",
+    help="failed requests in a row (timeouts, connection errors, 5xx) after which a host is skipped for the rest of "
+         "the run [default: %(default)s]",
+    metavar="max_host_failures",
+    type=int,
+    default=3)
+parser.add_argument(
+    "--pypi-url",
+    dest="pypi_url",
+    help="base url of the PyPI JSON API or a mirror of it [default: %(default)s]",
+    metavar="pypi_url",
+    default="https://pypi.python.org/pypi")
+parser.add_argument(
+    "--github-api-url",
+    dest="github_api_url",
+    help="base url of the GitHub REST API, the GraphQL endpoint of --github-batch is derived from it "
+         "[default: %(default)s]",
+    metavar="github_api_url",
+    default="https://api.github.com")
+parser.add_argument(
+    "--bitbucket-api-url",
+    dest="bitbucket_api_url",
+    help="base url of the Bitbucket API [default: %(default)s]",
+    metavar="bitbucket_api_url",
+    default="https://api.bitbucket.org/2.0")
+parser.add_argument(
+    "--github-raw-url",
+    dest="github_raw_url",
+    help="base url of the raw GitHub file host license files are fetched from [default: %(default)s]",
+    metavar="github_raw_url",
+    default="https://raw.githubusercontent.com")
+parser.add_argument(
+    "--bitbucket-raw-url",
+    dest="bitbucket_raw_url",
+    help="base url of Bitbucket repositories raw license files are fetched from [default: %(default)s]",
+    metavar="bitbucket_raw_url",
+    default="https://bitbucket.org")
+parser.add_argument(
+    "--readthedocs-api-url",
+    dest="readthedocs_api_url",
+    help="Read the Docs project API used to find the repository of projects documented there [default: %(default)s]",
+    metavar="readthedocs_api_url",
+    default="https://readthedocs.org/api/v2/project/")
+parser.add_argument(
+    "--pypi-index",
+    dest="pypi_index",
+    help="local PyPI metadata index: directory of JSON files, JSON lines file or SQLite database",
+    metavar="pypi_index",
+    default=None)
+parser.add_argument(
+    "--offline",
+    dest="offline",
+    help="never access the network, use local metadata and license templates only",
+    action="store_true",
+    default=False)
+parser.add_argument(
+    "--wheelhouse",
+    dest="wheelhouse",
+    help="directory of wheels and sdists to read package metadata and license files from",
+    metavar="wheelhouse",
     default=None)
+parser.add_argument(
+    "--incremental",
+    dest="incremental",
+    help="keep license files in a stable output directory with a manifest and only resolve requirements that "
+         "changed since the last run",
+    action="store_true",
+    default=False)
+parser.add_argument(
+    "--spdx-dir",
+    dest="spdx_dir",
+    help="directory of SPDX license texts (<SPDX id>.txt) to identify license files by, besides the bundled "
+         "templates",
+    metavar="spdx_dir",
+    default=None)
+parser.add_argument(
+    "--archive",
+    dest="archive",
+    help="stream the license files and an index.jsonl into this .zip, .tar, .tar.gz or .tar.bz2 archive instead "
+         "of the output directory",
+    metavar="archive",
+    default=None)
+parser.add_argument(
+    "--with-deps",
+    dest="with_deps",
+    help="also resolve the transitive dependencies of the requirements",
+    action="store_true",
+    default=False)
+parser.add_argument(
+    "--profile",
+    dest="profile",
+    help="log the time per stage, host and package and the winning strategies at the end of the run",
+    action="store_true",
+    default=False)
+parser.add_argument(
+    "--report-json",
+    dest="report_json",
+    help="write the instrumentation report of the run to this JSON file",
+    metavar="report_json",
+    default=None)
+parser.add_argument(
+    "--hook",
+    dest="hooks",
+    help="instrumentation hook as module:callable, called with (event, fields) for every measurement (repeatable)",
+    metavar="hook",
+    action="append",
+    default=[])
 parser.add_argument(
     "-v", "--verbose",
     dest="verbose",
@@ -58,6 +302,167 @@ parser.add_argument(
     help="set verbosity level",
     default=0)
 
+# pylicense serve: the resolution options of a run plus the address, requirements come with every request
+serve_parser = ArgumentParser(
+    prog="pylicense serve",
+    description="Resolver daemon keeping connection pools, indexes and caches warm between requests",
+    parents=[parser],
+    conflict_handler="resolve")
+serve_parser.add_argument(
+    "--listen",
+    dest="listen",
+    help="HOST:PORT on localhost or the path of a Unix socket to answer on [default: %(default)s]",
+    metavar="listen",
+    default=DEFAULT_ADDRESS)
+serve_parser.add_argument(
+    "--allow-remote",
+    dest="allow_remote",
+    help="answer on an address other hosts can connect to, the API has no authentication",
+    action="store_true",
+    default=False)
+serve_parser.add_argument(
+    "--host-retry-after",
+    dest="host_retry_after",
+    help="seconds a failing host is skipped before it is tried again [default: %(default)s]",
+    metavar="host_retry_after",
+    type=float,
+    default=300)
+
+# pylicense client: resolve on a running daemon and write the files a local run writes
+client_parser = ArgumentParser(
+    prog="pylicense client",
+    description="Resolve requirements on a running pylicense serve daemon")
+client_parser.add_argument(
+    '-r', "--requirements",
+    dest="requirements_file",
+    help="path to requirements.txt, one output tree is written per file",
+    metavar="requirements_file",
+    nargs='+',
+    required=True)
+client_parser.add_argument(
+    "-o", "--outputDirectory",
+    dest="output_path",
+    help="paths to put generated licenses [default: %(default)s]",
+    metavar="output_path",
+    default=BASE_PATH)
+client_parser.add_argument(
+    "--connect",
+    dest="connect",
+    help="HOST:PORT or Unix socket path of the daemon [default: %(default)s]",
+    metavar="connect",
+    default=DEFAULT_ADDRESS)
+client_parser.add_argument(
+    "--timeout",
+    dest="timeout",
+    help="seconds to wait for the daemon to answer [default: %(default)s]",
+    metavar="timeout",
+    type=float,
+    default=600)
+
+
+def load_hook(hook_path):
+    """
+    Import an instrumentation hook
+    :param hook_path: module:callable
+    :return: callable
+    """
+    module_name, _, attribute = hook_path.partition(":")
+    if not attribute:
+        raise ValueError("Hook {} is not of the form module:callable".format(hook_path))
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def build_manager(manager_class, args, requirements_path, output_path, **kwargs):
+    """
+    Manager configured by the parsed options of a run
+    :param manager_class: Manager, imported by the caller once sockets are patched
+    :param args: parsed options
+    :param requirements_path:
+    :param output_path:
+    :param kwargs: further Manager arguments
+    :return: Manager
+    """
+    host_limits = dict((host, int(limit)) for host, limit in
+                       (host_limit.rsplit("=", 1) for host_limit in args.host_limits))
+    return manager_class(requirements_path=requirements_path, output_path=output_path, gh_token=args.gh_token,
+                         pool_maxsize=args.pool_size, workers=args.workers, host_limits=host_limits,
+                         cache_dir=None if args.no_cache else args.cache_dir, cache_ttl=args.cache_ttl,
+                         cache_max_size=args.cache_size * 1024 * 1024,
+                         store_path=None if args.no_store else args.store_path, store_ttl=args.store_ttl,
+                         store_negative_ttl=args.negative_ttl, github_batch=args.github_batch,
+                         pypi_url=args.pypi_url, pypi_index=args.pypi_index, offline=args.offline,
+                         wheelhouse=args.wheelhouse, rate_limit_wait=args.rate_limit_wait,
+                         incremental=args.incremental, with_deps=args.with_deps,
+                         github_api_url=args.github_api_url, bitbucket_api_url=args.bitbucket_api_url,
+                         readthedocs_api_url=args.readthedocs_api_url, archive=args.archive,
+                         spdx_dir=args.spdx_dir, github_raw_url=args.github_raw_url,
+                         bitbucket_raw_url=args.bitbucket_raw_url, hedge=args.hedge,
+                         hedge_stagger=args.hedge_stagger, hedge_deadline=args.hedge_deadline,
+                         deadline=args.deadline, max_host_failures=args.max_host_failures, **kwargs)
+
+
+def serve(arguments):
+    """
+    Run the resolver daemon until it is interrupted
+    :param arguments: command line arguments after "serve"
+    """
+    args = serve_parser.parse_args(arguments)
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    if args.async_mode:
+        green.patch()
+    from pylicense_manager.manager import Manager
+    from pylicense_manager.server import Resolver
+    from pylicense_manager.server import is_loopback
+    from pylicense_manager.server import make_server
+
+    if not args.allow_remote and not is_loopback(args.listen):
+        serve_parser.error("--listen {} is not a loopback address, pass --allow-remote to answer other hosts".format(
+            args.listen))
+    if args.archive or args.incremental or args.deadline:
+        logger.warning("--archive, --incremental and --deadline apply to single runs, the daemon ignores them")
+        args.archive, args.incremental, args.deadline = None, False, None
+    manager = build_manager(Manager, args, None, args.output_path, host_retry_after=args.host_retry_after)
+    # build the fingerprints before the first request
+    manager.license_index
+    server = make_server(Resolver(manager), args.listen, allow_remote=args.allow_remote)
+    logger.info("Resolving requirements on %s", args.listen)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        manager.close()
+    return 0
+
+
+def client(arguments):
+    """
+    Resolve requirements files on a running daemon and write their license files and reports
+    :param arguments: command line arguments after "client"
+    :return: exit code, 1 when a package is unresolved
+    """
+    from pylicense_manager.server import ResolverClient
+    from pylicense_manager.server import write_result
+
+    args = client_parser.parse_args(arguments)
+    logger.setLevel(logging.INFO)
+    resolver = ResolverClient(args.connect, timeout=args.timeout)
+    now = datetime.datetime.now().time().isoformat().replace(":", "").replace(".", "")
+    output_dir = os.path.join(args.output_path, "pylicense_{}".format(now))
+    unresolved = 0
+    for requirements_path in args.requirements_file:
+        with open(requirements_path) as requirements_file:
+            result = resolver.resolve(requirements_file.read())
+        tree = output_dir
+        if len(args.requirements_file) > 1:
+            tree = os.path.join(output_dir, os.path.splitext(os.path.basename(requirements_path))[0])
+        written = write_result(tree, result)
+        logger.info("Wrote %d license files of %s to %s in %.2fs", written, requirements_path, tree,
+                    result["seconds"])
+        for package in result["unresolved"]:
+            logger.error("%s unresolved: %s", package["name"], package["reason"])
+        unresolved += len(result["unresolved"])
+    return 1 if unresolved else 0
+
 
 def main(args=None):
     if args is None:
@@ -66,6 +471,12 @@ def main(args=None):
         arguments = sys.argv
         arguments.extend(args)
 
+    if len(arguments) > 1 and arguments[1] in ("serve", "client"):
+        try:
+            return serve(arguments[2:]) if arguments[1] == "serve" else client(arguments[2:])
+        except KeyboardInterrupt:
+            return 0
+
     # if no arguments
     if len(arguments) == 2:
         parser.print_help()
@@ -74,7 +485,7 @@ def main(args=None):
     program_name = os.path.basename(arguments[1])
     try:
         args = parser.parse_args()
-        reqs_path = args.requirements
+        reqs_path = [path for paths in args.requirements_file or [[BASE_PATH]] for path in paths]
         output_path = args.output_path
         gh_token = args.gh_token
         verbose = args.verbose
@@ -89,9 +500,33 @@ def main(args=None):
         logger.info("Output Directory: %s", output_path)
         logger.info("verbosity level: %d", verbose)
         if reqs_path:
+            if args.async_mode:
+                # sockets have to be patched before requests and ssl are imported with the manager
+                green.patch()
+            from pylicense_manager.manager import Manager
+
             logger.info("Generating licenses for passed requirements.txt: [%s]", reqs_path)
-            manager = Manager(requirements_path=reqs_path, output_path=output_path, gh_token=gh_token)
-            manager.parse_requirements()
+            recorder = None
+            if args.profile or args.report_json or args.hooks:
+                recorder = Recorder(hooks=[load_hook(hook_path) for hook_path in args.hooks])
+            manager = build_manager(Manager, args, reqs_path, output_path, recorder=recorder)
+            try:
+                if args.async_mode:
+                    manager.parse_requirements_async(concurrency=args.concurrency)
+                else:
+                    manager.parse_requirements()
+            finally:
+                manager.close()
+            if recorder is not None:
+                if args.report_json:
+                    recorder.write(args.report_json, manager.resolved_packages, manager.unresolved)
+                    logger.info("Wrote run report to %s", args.report_json)
+                if args.profile:
+                    for line in recorder.summary(manager.resolved_packages, manager.unresolved):
+                        logger.info(line)
+            if manager.unresolved:
+                logger.error("Generated license files, %d package(s) unresolved", len(manager.unresolved))
+                return 1
             logger.info("Successfully generated license files")
         else:
             logger.info("Requirements not passed. Exiting!")
@@ -0,0 +1,247 @@
+# coding=utf-8
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from urlparse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import Retry
+
+from pylicense_manager.health import DeadlineExceeded
+from pylicense_manager.parallel import check_cancelled
+from pylicense_manager.ratelimit import RateLimitExhausted
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'Content-Type': "application/json"
+}
+
+# cap on in-flight requests per host, "*" is shared by every other host (project home pages)
+DEFAULT_HOST_LIMITS = {
+    "api.github.com": 4,
+    "pypi.python.org": 8,
+    "api.bitbucket.org": 4,
+    "*": 8,
+}
+
+
+class HostLimiter(object):
+    """
+    Bounds the number of in-flight requests per host
+    """
+
+    def __init__(self, limits=None):
+        """
+        :param limits: dict of host name to maximum concurrent requests, "*" applies to all other hosts
+        """
+        self.limits = dict(limits or {})
+        self._semaphores = dict((host.lower(), threading.BoundedSemaphore(limit))
+                                for host, limit in self.limits.items() if limit)
+
+    @contextmanager
+    def slot(self, request_url):
+        host = (urlparse(request_url).hostname or "").lower()
+        semaphore = self._semaphores.get(host, self._semaphores.get("*"))
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
+
+
+class DeadlineRetry(Retry):
+    """
+    Retry policy that gives up once the run deadline passed and never backs off past it
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.health = kwargs.pop("health", None)
+        super(DeadlineRetry, self).__init__(*args, **kwargs)
+
+    def new(self, **kwargs):
+        retry = super(DeadlineRetry, self).new(**kwargs)
+        retry.health = self.health
+        return retry
+
+    def get_backoff_time(self):
+        backoff = super(DeadlineRetry, self).get_backoff_time()
+        remaining = self.health.remaining() if self.health is not None else None
+        return backoff if remaining is None else max(0, min(backoff, remaining))
+
+    def is_exhausted(self):
+        return super(DeadlineRetry, self).is_exhausted() or (self.health is not None and self.health.expired())
+
+
+class HttpClient(object):
+    """
+    Long-lived HTTP client that keeps one keep-alive connection pool per host.
+
+    A single ``requests.Session`` is shared by every call made through the client. The session is configured
+    once and never mutated afterwards, per-request options are passed with each call, so the client can be
+    used from several threads at once.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False, max_retries=None, host_limits=None,
+                 cache=None, scheduler=None, recorder=None, health=None):
+        """
+        :param pool_connections: number of per-host connection pools to keep
+        :param pool_maxsize: maximum number of connections kept alive per host
+        :param pool_block: block when a host pool has no free connection instead of opening a new one
+        :param max_retries: urllib3 Retry policy
+        :param host_limits: dict of host name to maximum in-flight requests, see HostLimiter
+        :param cache: ResponseCache revalidating GET responses, None disables caching
+        :param scheduler: GithubScheduler pacing GitHub API requests and choosing their token
+        :param recorder: instrumentation Recorder of every request, None records nothing
+        :param health: HostHealth skipping failing hosts and adapting the timeouts, None sends every request
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.limiter = HostLimiter(host_limits)
+        self.cache = cache
+        self.scheduler = scheduler
+        self.recorder = recorder
+        self.health = health
+        if max_retries is None:
+            max_retries = DeadlineRetry(
+                total=2,
+                status_forcelist=[429, 500, 502, 503],
+                backoff_factor=5,
+                health=health
+            )
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=max_retries
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, request_url, params=None, data=None, headers=None, stream=False, verify=True,
+                timeout=60):
+        """
+        Send a request over the pooled session. Non-streamed GET responses are served from the cache when the
+        server answers the conditional request with 304 Not Modified.
+        :return: requests.Response
+        """
+        if self.scheduler is None or not self.scheduler.applies(request_url):
+            return self._send(method, request_url, params, data, headers, stream, verify, timeout)
+
+        # one attempt per token, plus one after a Retry-After pause
+        for _ in range(len(self.scheduler.tokens) + 1):
+            token = self.scheduler.acquire(request_url)
+            request_headers = dict(headers or {})
+            if token:
+                request_headers["Authorization"] = "token {}".format(token)
+            response = self._send(method, request_url, params, data, request_headers, stream, verify, timeout)
+            if not self.scheduler.update(token, request_url, response):
+                return response
+            logger.info("GitHub rate limit hit, sending %s again" % request_url)
+            if self.recorder is not None:
+                self.recorder.rate_limited(request_url)
+            response.close()
+        raise RateLimitExhausted("GitHub rate limit still exceeded after {} attempts".format(
+            len(self.scheduler.tokens) + 1))
+
+    def _send(self, method, request_url, params, data, headers, stream, verify, timeout):
+        # a parallel attempt whose result is dropped sends nothing more
+        check_cancelled()
+        if self.health is not None:
+            # raises instead of sending to a host with an open circuit or after the deadline
+            timeout = self.health.timeout(request_url, timeout)
+        if self.recorder is None and self.health is None:
+            return self._send_cached(method, request_url, params, data, headers, stream, verify, timeout)
+        started = time.time()
+        try:
+            response = self._send_cached(method, request_url, params, data, headers, stream, verify, timeout)
+        except Exception as exp:
+            self._record_failure(request_url)
+            if self.recorder is not None:
+                self.recorder.request(request_url, method, None, time.time() - started, error=True)
+            if self.health is not None and self.health.expired():
+                raise DeadlineExceeded("Run deadline passed while requesting {} - {}".format(request_url, exp))
+            raise
+        seconds = time.time() - started
+        if self.health is not None:
+            if response.status_code >= 500:
+                self._record_failure(request_url)
+            else:
+                self.health.success(request_url, seconds)
+        if self.recorder is None:
+            return response
+        retries = getattr(response.raw, "retries", None)
+        if stream:
+            # the body is read later, count the announced size
+            size = int(response.headers.get("Content-Length") or 0)
+        else:
+            size = len(response.content or "")
+        self.recorder.request(request_url, method, response.status_code, seconds, size=size,
+                              retries=len(retries.history) if retries is not None else 0,
+                              from_cache=getattr(response, "from_cache", False))
+        return response
+
+    def _record_failure(self, request_url):
+        if self.health is not None and self.health.failure(request_url) and self.recorder is not None:
+            self.recorder.circuit_opened(request_url)
+
+    def _send_cached(self, method, request_url, params, data, headers, stream, verify, timeout):
+        if self.cache is None or method.upper() != "GET" or stream:
+            return self.session.request(method=method, url=request_url, params=params, data=data, headers=headers,
+                                        stream=stream, verify=verify, timeout=timeout)
+
+        key = self.cache.key(method, request_url, params)
+        entry = self.cache.get(key)
+        if entry:
+            headers = dict(headers or {})
+            headers.update(self.cache.conditional_headers(entry))
+        response = self.session.request(method=method, url=request_url, params=params, data=data, headers=headers,
+                                        verify=verify, timeout=timeout)
+        if entry and response.status_code == 304:
+            logger.debug("Not modified, using cached response for %s" % request_url)
+            self.cache.touch(key, entry)
+            cached = self.cache.build_response(entry)
+            cached.headers.update((name, value) for name, value in response.headers.items()
+                                  if name.lower().startswith("x-ratelimit"))
+            return cached
+        if response.status_code == 200:
+            self.cache.set(key, response)
+        return response
+
+    def slot(self, request_url):
+        """
+        Context manager holding one of the in-flight slots of the request host
+        """
+        return self.limiter.slot(request_url)
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.prune()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """
+    Shared client used by callers that do not pass their own
+    :return: HttpClient
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
@@ -0,0 +1,14 @@
+# coding=utf-8
+"""
+Default locations read by the command line before it imports the resolver.
+
+Only the standard library is imported here: with ``--async`` gevent has to patch the sockets, ssl and threading
+before requests, urllib3 and the modules using them are imported.
+"""
+import os
+
+# address of the resolver daemon, kept out of pylicense_manager.server which imports httplib and with it ssl
+DEFAULT_ADDRESS = "127.0.0.1:8421"
+CACHE_ROOT = os.path.join(os.path.expanduser("~"), ".cache", "pylicense-manager")
+DEFAULT_CACHE_DIR = os.path.join(CACHE_ROOT, "http")
+DEFAULT_STORE_PATH = os.path.join(CACHE_ROOT, "results.sqlite")
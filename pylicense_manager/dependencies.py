@@ -0,0 +1,110 @@
+# coding=utf-8
+import logging
+
+import pkg_resources
+
+from pylicense_manager import utils
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+class DependencyResolver(object):
+    """
+    Transitive dependency closure of requirements. Requirements come from the installed metadata (Requires-Dist,
+    egg-info requires.txt) or the requires_dist of the PyPI metadata. One version is picked per package and
+    specifier, the installed one when there is one. The version of every requirement and the requirements of every
+    package version are memoized, so a subtree shared by several packages is only expanded once.
+    """
+
+    def __init__(self, environment, find_release=None, pypi_info=None):
+        """
+        :param environment: DistributionIndex of the installed distributions
+        :param find_release: callable returning the PyPI version that satisfies a pkg_resources.Requirement
+        :param pypi_info: callable returning the PyPI info dict of a name and version
+        """
+        self.environment = environment
+        self.find_release = find_release
+        self.pypi_info = pypi_info
+        self._versions = {}
+        self._requires = {}
+
+    def version(self, requirement):
+        """
+        Version a requirement resolves to
+        :param requirement: pkg_resources.Requirement
+        :return: version string, None when it is unknown
+        """
+        # foo==1.0 and foo==2.0 resolve to different releases
+        key = (utils.normalize_name(requirement.key), str(requirement.specifier))
+        if key not in self._versions:
+            version = self.environment.version(requirement.project_name)
+            if version is None and self.find_release is not None:
+                try:
+                    version = self.find_release(requirement)
+                except Exception as exp:
+                    logger.error("Error in finding a release of %s - %s" % (requirement, exp))
+            self._versions[key] = version
+        return self._versions[key]
+
+    def _requirement_strings(self, name, version):
+        distribution = self.environment.get(name)
+        if distribution is not None and distribution.version == version:
+            return distribution.requires
+        if version and self.pypi_info is not None:
+            try:
+                info = self.pypi_info(name, version)
+            except Exception as exp:
+                logger.error("Error in fetching the requirements of %s %s - %s" % (name, version, exp))
+                return []
+            return (info or {}).get("requires_dist") or []
+        return []
+
+    def requires(self, name, version, extras=()):
+        """
+        Direct requirements of a package that apply to this interpreter and the requested extras
+        :param name:
+        :param version:
+        :param extras:
+        :return: list of pkg_resources.Requirement
+        """
+        node = (utils.normalize_name(name), version, tuple(sorted(extras)))
+        if node not in self._requires:
+            requires = []
+            for requirement_string in self._requirement_strings(name, version):
+                try:
+                    requirement = pkg_resources.Requirement.parse(requirement_string)
+                except ValueError as exp:
+                    logger.info("Skipping requirement %s of %s - %s" % (requirement_string, name, exp))
+                    continue
+                marker = requirement.marker
+                if marker is None or any(marker.evaluate({"extra": extra}) for extra in ("",) + node[2]):
+                    requires.append(requirement)
+            self._requires[node] = requires
+        return self._requires[node]
+
+    def closure(self, requirements):
+        """
+        Dependencies of the requirements, depth first
+        :param requirements: top level pkg_resources.Requirement objects
+        :return: list of (requirement, version, required by) of the dependencies that are not top level
+        """
+        seen = set(utils.normalize_name(requirement.key) for requirement in requirements)
+        expanded = set()
+        dependencies = []
+        stack = list(reversed(requirements))
+        while stack:
+            requirement = stack.pop()
+            version = self.version(requirement)
+            node = (utils.normalize_name(requirement.key), version, tuple(sorted(requirement.extras)))
+            if node in expanded:
+                continue
+            expanded.add(node)
+            requires = self.requires(requirement.project_name, version, requirement.extras)
+            for dependency in requires:
+                key = utils.normalize_name(dependency.key)
+                if key not in seen:
+                    seen.add(key)
+                    dependencies.append((dependency, self.version(dependency), requirement.project_name))
+            stack.extend(reversed(requires))
+        return dependencies
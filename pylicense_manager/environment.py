@@ -0,0 +1,267 @@
+# coding=utf-8
+import logging
+import sys
+from email import message_from_string
+
+import os
+
+from pylicense_manager import utils
+from pylicense_manager.archives import license_member_pattern
+from pylicense_manager.archives import license_rank
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+meta_files_to_check = ['PKG-INFO', 'METADATA']
+# files named like licenses that are not license texts
+code_extensions = ('.py', '.pyc', '.pyo', '.so', '.pyd')
+# directories holding the code of other projects
+vendor_dirs = {'_vendor', 'vendor'}
+
+
+class InstalledDistribution(object):
+    """
+    Installed distribution found on disk. Its metadata file is only read when first needed.
+    """
+
+    def __init__(self, name, version, metadata_dir, metadata_file):
+        self.name = name
+        self._version = version
+        self.metadata_dir = metadata_dir
+        self.metadata_file = metadata_file
+        self._metadata = None
+        self._message = None
+
+    @property
+    def message(self):
+        if self._message is None:
+            try:
+                with open(self.metadata_file) as meta_file:
+                    self._message = message_from_string(meta_file.read())
+            except IOError as exp:
+                logger.error("Error in reading metadata of %s - %s" % (self.name, exp))
+                self._message = message_from_string("")
+        return self._message
+
+    @property
+    def metadata(self):
+        """
+        Metadata headers with lower case keys
+        :return: dict
+        """
+        if self._metadata is None:
+            message = self.message
+            metadata = {k.lower(): v for k, v in dict(message).iteritems()}
+            metadata["classifiers"] = message.get_all("Classifier") or []
+            metadata["project_urls"] = message.get_all("Project-URL") or []
+            self._metadata = metadata
+        return self._metadata
+
+    @property
+    def requires(self):
+        """
+        Requirement strings of the distribution, from Requires-Dist or the requires.txt of an egg-info
+        :return: list of PEP 508 requirements
+        """
+        requires = self.message.get_all("Requires-Dist")
+        if requires is None and self.metadata_dir is not None:
+            requires = self._egg_requires(os.path.join(self.metadata_dir, "requires.txt"))
+        return requires or []
+
+    @staticmethod
+    def _egg_requires(requires_path):
+        try:
+            with open(requires_path) as requires_file:
+                lines = requires_file.read().splitlines()
+        except IOError:
+            return []
+        requires = []
+        marker = None
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                # [extra], [:marker] or [extra:marker] sections
+                extra, _, section_marker = line[1:-1].partition(":")
+                markers = ["({})".format(section_marker)] if section_marker else []
+                if extra:
+                    markers.append('extra == "{}"'.format(extra))
+                marker = " and ".join(markers) or None
+                continue
+            requires.append("{}; {}".format(line, marker) if marker else line)
+        return requires
+
+    def _record_paths(self):
+        """
+        Files installed with the distribution, from the RECORD of a dist-info or the installed-files.txt of an
+        egg-info
+        :return: absolute paths
+        """
+        if os.path.basename(self.metadata_dir).endswith(".dist-info"):
+            record_path, base_dir = os.path.join(self.metadata_dir, "RECORD"), os.path.dirname(self.metadata_dir)
+        else:
+            record_path, base_dir = os.path.join(self.metadata_dir, "installed-files.txt"), self.metadata_dir
+        try:
+            with open(record_path) as record_file:
+                lines = record_file.read().splitlines()
+        except IOError:
+            return []
+        # RECORD lines are "path,hash,size", paths with commas are quoted
+        paths = [line.rsplit(",", 2)[0].strip('"') if record_path.endswith("RECORD") else line for line in lines]
+        return [os.path.normpath(os.path.join(base_dir, path)) for path in paths if path]
+
+    @staticmethod
+    def _is_license_file(path):
+        base_name = os.path.basename(path)
+        return bool(license_member_pattern.match(base_name)) and not base_name.lower().endswith(code_extensions)
+
+    def license_files(self):
+        """
+        License files shipped with the distribution: License-File entries, license files in the metadata
+        directory and its licenses/ directory, and license files at the top of the packages listed in RECORD or
+        installed-files.txt
+        :return: existing paths, best first
+        """
+        if self.metadata_dir is None:
+            return []
+        paths = set()
+        for license_file in self.message.get_all("License-File") or []:
+            paths.add(os.path.join(self.metadata_dir, "licenses", license_file))
+            paths.add(os.path.join(self.metadata_dir, license_file))
+        for directory in (self.metadata_dir, os.path.join(self.metadata_dir, "licenses")):
+            try:
+                paths.update(os.path.join(directory, entry) for entry in os.listdir(directory)
+                             if self._is_license_file(entry))
+            except OSError:
+                continue
+        metadata_prefix = os.path.normpath(self.metadata_dir) + os.sep
+        paths.update(path for path in self._record_paths()
+                     if self._is_license_file(path) and self._is_distribution_file(path, metadata_prefix))
+        paths = [os.path.normpath(path) for path in paths if os.path.isfile(path)]
+        # files of the metadata directory describe the distribution, the others are ranked after them
+        return sorted(set(paths), key=lambda path: (not path.startswith(metadata_prefix), license_rank(path)))
+
+    def _is_distribution_file(self, path, metadata_prefix):
+        """
+        Whether an installed file describes the distribution itself: it is in the metadata directory or at the top
+        of one of the installed packages. Deeper files belong to modules or vendored projects
+        (``pip/_vendor/requests/LICENSE``).
+        """
+        if path.startswith(metadata_prefix):
+            return True
+        parts = os.path.relpath(path, os.path.dirname(os.path.normpath(self.metadata_dir))).split(os.sep)
+        return len(parts) == 2 and parts[0] != os.pardir and not set(parts) & vendor_dirs
+
+    def license_text(self):
+        """
+        Text of the best license file shipped with the distribution
+        :return: tuple of path and text, None when the distribution has no readable license file
+        """
+        for path in self.license_files():
+            try:
+                with open(path) as license_file:
+                    text = license_file.read().decode("utf8", "replace")
+            except IOError as exp:
+                logger.error("Error in reading license file %s - %s" % (path, exp))
+                continue
+            if text.strip():
+                return path, text
+        return None
+
+    @property
+    def version(self):
+        if self._version is None:
+            self._version = self.message.get("Version")
+        return self._version
+
+
+class DistributionIndex(object):
+    """
+    Name to distribution index of an environment, built from a single scan of the dist-info and egg-info
+    metadata on sys.path. Lookups are dictionary lookups and never resolve dependencies.
+    """
+
+    def __init__(self, paths=None):
+        """
+        :param paths: directories to scan, defaults to sys.path
+        """
+        self.paths = list(sys.path if paths is None else paths)
+        self._distributions = {}
+        for path in self.paths:
+            self._scan(path)
+
+    def _scan(self, path):
+        try:
+            entries = os.listdir(path or os.curdir)
+        except OSError:
+            return
+        for entry in sorted(entries):
+            distribution = self._distribution(os.path.join(path, entry), entry)
+            if distribution is None:
+                continue
+            # first entry on the path wins, as it does for the import system
+            self._distributions.setdefault(utils.normalize_name(distribution.name), distribution)
+
+    @staticmethod
+    def _distribution(entry_path, entry):
+        base, extension = os.path.splitext(entry)
+        if extension == ".dist-info":
+            metadata_dir = entry_path
+        elif extension == ".egg-info":
+            # distutils installs write PKG-INFO as a plain .egg-info file
+            metadata_dir = entry_path if os.path.isdir(entry_path) else None
+        elif extension == ".egg" and os.path.isdir(entry_path):
+            metadata_dir = os.path.join(entry_path, "EGG-INFO")
+        elif extension == ".egg-link":
+            return DistributionIndex._linked_distribution(entry_path)
+        else:
+            return None
+
+        if metadata_dir is None:
+            metadata_file = entry_path
+        else:
+            metadata_file = None
+            for meta_file in meta_files_to_check:
+                meta_path = os.path.join(metadata_dir, meta_file)
+                if os.path.isfile(meta_path):
+                    metadata_file = meta_path
+                    break
+            if metadata_file is None:
+                return None
+
+        parts = base.split("-")
+        version = parts[1] if len(parts) > 1 else None
+        return InstalledDistribution(parts[0], version, metadata_dir, metadata_file)
+
+    @staticmethod
+    def _linked_distribution(link_path):
+        """
+        Distribution of a develop install, the .egg-link file points to the project holding the egg-info
+        """
+        try:
+            with open(link_path) as link_file:
+                project_dir = link_file.readline().strip()
+            project_entries = os.listdir(project_dir)
+        except (IOError, OSError):
+            return None
+        for entry in project_entries:
+            if entry.endswith(".egg-info"):
+                return DistributionIndex._distribution(os.path.join(project_dir, entry), entry)
+        return None
+
+    def get(self, name):
+        """
+        :param name: package name
+        :return: InstalledDistribution, None when the package is not installed
+        """
+        return self._distributions.get(utils.normalize_name(name))
+
+    def version(self, name):
+        distribution = self.get(name)
+        return distribution.version if distribution is not None else None
+
+    def __contains__(self, name):
+        return utils.normalize_name(name) in self._distributions
+
+    def __len__(self):
+        return len(self._distributions)
@@ -0,0 +1,199 @@
+# coding=utf-8
+"""
+Identification of license texts by their word shingles.
+
+A text is normalized (case, "licence" spelling, punctuation, whitespace, copyright lines and template variables
+dropped) and cut into overlapping runs of ``shingle_size`` words. The shingles of every reference text, the bundled
+templates and optionally a directory of SPDX license texts, go into one inverted index of shingle to references.
+Classifying a text counts its shared shingles per reference with one dictionary lookup per shingle and scores the
+references by the Dice coefficient of the shingle sets, so the cost depends on the length of the text and not on
+the number of references.
+"""
+import logging
+import re
+import threading
+
+import os
+
+from pylicense_manager.licenses import get_environment
+from pylicense_manager.licenses import known_licenses
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+SHINGLE_SIZE = 5
+# copies of a reference score above 0.9, another license sharing whole clauses with a reference scores about 0.55
+# (the Zope Public License against BSD-3-Clause)
+MIN_CONFIDENCE = 0.8
+# lines that differ between every copy of the same license
+copyright_pattern = re.compile(r"^[ \t#*/;!-]*(copyright\b|\(c\)|\xa9|all rights reserved).*$", re.MULTILINE | re.UNICODE)
+template_tag_pattern = re.compile(r"{{.*?}}|{%.*?%}")
+word_pattern = re.compile(r"[a-z0-9]+")
+spelling_pattern = re.compile(r"\blicence|\bhttps\b")
+spellings = {"licence": "license", "https": "http"}
+
+
+def normalize_text(text):
+    """
+    Words of a license text without its copyright lines
+    :param text:
+    :return: list of lower case words
+    """
+    if isinstance(text, str):
+        text = text.decode("utf8", "replace")
+    text = copyright_pattern.sub(" ", template_tag_pattern.sub(" ", text.lower()))
+    return word_pattern.findall(spelling_pattern.sub(lambda match: spellings[match.group(0)], text))
+
+
+def shingles(words, size=SHINGLE_SIZE):
+    """
+    Hashed shingles of a word list, texts shorter than a shingle are one shingle
+    :param words:
+    :param size: words per shingle
+    :return: set of hashes
+    """
+    if len(words) < size:
+        return {hash(tuple(words))} if words else set()
+    return set(map(hash, zip(*[words[offset:] for offset in range(size)])))
+
+
+def template_licenses():
+    """
+    SPDX id of every bundled template, header templates count as the license they announce
+    :return: dict of template name to SPDX id
+    """
+    spdx_ids = {}
+    for spdx_id, (template_name, _) in sorted(known_licenses.items()):
+        # GPL-2.0 and GPL-2.0+ share a text, the plain id names it
+        if template_name and (template_name not in spdx_ids or not spdx_id.endswith("+")):
+            spdx_ids[template_name] = spdx_id
+    templates = {}
+    for file_name in get_environment().loader.list_templates():
+        base = file_name[:-len(".txt")] if file_name.endswith(".txt") else file_name
+        spdx_id = spdx_ids.get(base.split("-header")[0])
+        if spdx_id:
+            templates[file_name] = spdx_id
+    return templates
+
+
+class LicenseIndex(object):
+    """
+    Inverted index of the shingles of reference license texts
+    """
+
+    def __init__(self, shingle_size=SHINGLE_SIZE):
+        self.shingle_size = shingle_size
+        # reference number -> (license id, reference name, number of shingles)
+        self.references = []
+        self.postings = {}
+        self._lock = threading.Lock()
+
+    def add(self, license_id, text, name=None):
+        """
+        Add a reference text
+        :param license_id: SPDX id the text identifies
+        :param text:
+        :param name: name of the reference, the license id by default
+        """
+        reference_shingles = shingles(normalize_text(text), self.shingle_size)
+        if not reference_shingles:
+            return
+        with self._lock:
+            number = len(self.references)
+            self.references.append((license_id, name or license_id, len(reference_shingles)))
+            for shingle in reference_shingles:
+                self.postings.setdefault(shingle, []).append(number)
+
+    def add_directory(self, directory):
+        """
+        Add the reference texts of a directory of ``<SPDX id>.txt`` files, as in the SPDX license-list-data
+        ``text`` directory
+        :param directory:
+        :return: number of texts added
+        """
+        added = 0
+        for file_name in sorted(os.listdir(directory)):
+            if not file_name.endswith(".txt"):
+                continue
+            try:
+                with open(os.path.join(directory, file_name)) as license_file:
+                    text = license_file.read()
+            except (IOError, OSError) as exp:
+                logger.error("Cannot read SPDX license text %s - %s" % (file_name, exp))
+                continue
+            self.add(file_name[:-len(".txt")], text, name=file_name)
+            added += 1
+        return added
+
+    def classify(self, text, min_confidence=MIN_CONFIDENCE):
+        """
+        License of a text
+        :param text:
+        :param min_confidence: lowest score of a match
+        :return: tuple of license id and confidence between 0 and 1, None when no reference is close enough
+        """
+        text_shingles = shingles(normalize_text(text), self.shingle_size)
+        if not text_shingles:
+            return None
+        postings = self.postings
+        hits = {}
+        for references in map(postings.get, text_shingles):
+            if references:
+                for number in references:
+                    hits[number] = hits.get(number, 0) + 1
+        best = None
+        for number, shared in hits.items():
+            license_id, _, size = self.references[number]
+            score = 2.0 * shared / (len(text_shingles) + size)
+            # the first reference wins ties, templates are added before the SPDX texts
+            if best is None or score > best[1] or (score == best[1] and number < best[2]):
+                best = (license_id, score, number)
+        if best is None or best[1] < min_confidence:
+            return None
+        return best[0], round(best[1], 3)
+
+    def __len__(self):
+        return len(self.references)
+
+
+def build_index(spdx_dir=None, shingle_size=SHINGLE_SIZE):
+    """
+    Index of the bundled templates and the SPDX license texts of a directory
+    :param spdx_dir: directory of ``<SPDX id>.txt`` files
+    :param shingle_size:
+    :return: LicenseIndex
+    """
+    index = LicenseIndex(shingle_size)
+    environment = get_environment()
+    for file_name, spdx_id in sorted(template_licenses().items()):
+        index.add(spdx_id, environment.loader.get_source(environment, file_name)[0], name=file_name)
+    if spdx_dir:
+        logger.info("Added {} SPDX license texts from {}".format(index.add_directory(spdx_dir), spdx_dir))
+    return index
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Index of the bundled templates, built on first use
+    :return: LicenseIndex
+    """
+    global _default_index
+    if _default_index is None:
+        with _default_index_lock:
+            if _default_index is None:
+                _default_index = build_index()
+    return _default_index
+
+
+def detect_license(text, index=None):
+    """
+    SPDX id of a license text
+    :param text:
+    :param index: LicenseIndex, the bundled templates by default
+    :return: tuple of SPDX id and confidence, None when the text matches no reference
+    """
+    return (index if index is not None else get_index()).classify(text)
@@ -0,0 +1,116 @@
+# coding=utf-8
+import json
+import logging
+
+from pylicense_manager import utils
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
+# well known license file names, in order of preference
+license_file_names = ['LICENSE', 'LICENSE.txt', 'LICENSE.md', 'LICENSE.rst', 'COPYING', 'LICENCE']
+
+
+def graphql_url(api_url):
+    """
+    GraphQL endpoint next to a GitHub REST API, GitHub Enterprise serves them at /api/v3 and /api/graphql
+    :param api_url: base url of the REST API
+    :return: url of the GraphQL endpoint
+    """
+    api_url = api_url.rstrip("/")
+    if api_url.endswith("/api/v3"):
+        return api_url[:-len("/v3")] + "/graphql"
+    return api_url + "/graphql"
+
+
+def repo_slug(repo_url):
+    """
+    owner/repo part of a github.com or api.github.com/repos url
+    :param repo_url:
+    :return: lower case "owner/repo", None when the url has no repository path
+    """
+    url_path = utils.parse_url(repo_url, only_domain=False, only_path=True)
+    parts = [part for part in url_path.strip("/").split("/") if part]
+    if parts and parts[0] == "repos":
+        parts = parts[1:]
+    if len(parts) < 2:
+        return None
+    owner, name = parts[0], parts[1]
+    if name.endswith(".git"):
+        name = name[:-4]
+    return "{}/{}".format(owner, name).lower()
+
+
+class GithubGraphQL(object):
+    """
+    Fetches license details of many repositories with one GraphQL request per batch
+    """
+
+    def __init__(self, token, client=None, url=GITHUB_GRAPHQL_URL, batch_size=25):
+        """
+        :param token: GitHub token, the GraphQL API does not accept anonymous requests
+        :param client: HttpClient to send the requests with
+        :param url: GraphQL endpoint
+        :param batch_size: repositories per request
+        """
+        self.token = token
+        self.client = client
+        self.url = url
+        self.batch_size = batch_size
+
+    @staticmethod
+    def build_query(slugs):
+        """
+        One aliased repository field per slug, each asking for licenseInfo and the well known license blobs
+        :param slugs: list of "owner/repo"
+        :return: GraphQL query
+        """
+        blobs = " ".join('f{}: object(expression: {}) {{ ... on Blob {{ text }} }}'.format(
+            index, json.dumps("HEAD:" + file_name)) for index, file_name in enumerate(license_file_names))
+        repositories = []
+        for index, slug in enumerate(slugs):
+            owner, name = slug.split("/", 1)
+            repositories.append('r{}: repository(owner: {}, name: {}) {{ licenseInfo {{ spdxId name }} {} }}'.format(
+                index, json.dumps(owner), json.dumps(name), blobs))
+        return "query {{ {} }}".format(" ".join(repositories))
+
+    def fetch_licenses(self, slugs):
+        """
+        License details of repositories
+        :param slugs: iterable of "owner/repo"
+        :return: dict of slug to None when the repository does not exist, else a dict with spdx_id,
+                 license_name and text (None when none of the well known license files exist)
+        """
+        slugs = sorted(set(slugs))
+        results = {}
+        for start in range(0, len(slugs), self.batch_size):
+            batch = slugs[start:start + self.batch_size]
+            response = utils.request("POST", self.url, data=json.dumps({"query": self.build_query(batch)}),
+                                     custom_headers={"Authorization": "bearer {}".format(self.token)},
+                                     client=self.client)
+            data = (response.get("data") or {}) if response else {}
+            for error in (response or {}).get("errors", []):
+                logger.info("GraphQL: %s" % error.get("message"))
+            for index, slug in enumerate(batch):
+                alias = "r{}".format(index)
+                if alias not in data:
+                    # failed batch, leave the repository to the REST lookup
+                    continue
+                repository = data[alias]
+                if repository is None:
+                    results[slug] = None
+                    continue
+                license_info = repository.get("licenseInfo") or {}
+                text = None
+                for file_index in range(len(license_file_names)):
+                    blob = repository.get("f{}".format(file_index))
+                    if blob and blob.get("text"):
+                        text = blob["text"]
+                        break
+                results[slug] = {
+                    "spdx_id": license_info.get("spdxId"),
+                    "license_name": license_info.get("name"),
+                    "text": text
+                }
+        return results
@@ -0,0 +1,54 @@
+# coding=utf-8
+"""
+Cooperative resolution engine.
+
+The package runs on Python 2.7, which has no asyncio, so the async engine is built on gevent greenlets. Once the
+standard library is patched, every blocking call in the synchronous resolution path (``_get_package_details``,
+``_route_package`` and the GitHub, Bitbucket and home page lookups they make) yields to the event loop while it
+waits on the network, so thousands of packages can be in flight at the cost of a greenlet each instead of a
+thread. Both paths run the same code and therefore write the same license files.
+
+:func:`patch` has to run before ``requests``, ``urllib3`` or ``ssl`` are imported.
+"""
+import logging
+
+try:
+    import gevent.monkey
+    import gevent.pool
+except ImportError:
+    gevent = None
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+def _require_gevent():
+    if gevent is None:
+        raise ImportError("The async engine requires gevent: pip install pylicense-manager[async]")
+
+
+def patch():
+    """
+    Patch the standard library so blocking I/O yields to other greenlets
+    """
+    _require_gevent()
+    gevent.monkey.patch_all()
+
+
+def is_patched():
+    return gevent is not None and gevent.monkey.is_module_patched("socket")
+
+
+def map_greenlets(func, items, concurrency):
+    """
+    Apply func to every item on a bounded pool of greenlets
+    :param func:
+    :param items:
+    :param concurrency: maximum number of greenlets running at once
+    :return: results in the order of items
+    """
+    _require_gevent()
+    if not is_patched():
+        logger.warning("socket module is not patched by gevent, network calls will not overlap")
+    pool = gevent.pool.Pool(concurrency)
+    return pool.map(func, items)
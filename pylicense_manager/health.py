@@ -0,0 +1,162 @@
+# coding=utf-8
+"""
+Per-host health of a run: circuit breakers, adaptive request timeouts and the run deadline.
+
+Every request outcome is reported to :class:`HostHealth`. A host that fails ``max_failures`` requests in a row
+(connection errors, timeouts or 5xx responses) has its circuit opened and is skipped for the rest of the run, so
+one unreachable documentation host costs a few timeouts instead of a few for every package pointing at it. A long
+running process sets ``retry_after``, a request is let through once the circuit was open that long and one more
+failure opens it again.
+
+The timeout of a request adapts to the host: an exponentially weighted average of the response times plus four
+times their mean deviation, as TCP computes its retransmission timeout, bounded by ``min_timeout`` and the
+timeout asked for by the caller. Once the run deadline passes no request is sent anymore.
+"""
+import logging
+import threading
+import time
+from urlparse import urlparse
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+# weights of a new response time in the average and in the deviation
+AVERAGE_WEIGHT = 0.125
+DEVIATION_WEIGHT = 0.25
+
+
+class DeadlineExceeded(Exception):
+    """
+    The run deadline passed
+    """
+
+
+class HostUnavailable(Exception):
+    """
+    The circuit of the host is open, the request is not sent
+    """
+
+
+class _HostState(object):
+
+    def __init__(self):
+        self.failures = 0
+        self.open = False
+        self.opened_at = None
+        self.samples = 0
+        self.average = None
+        self.deviation = None
+
+
+class HostHealth(object):
+    """
+    Thread safe health of the hosts requested in one run
+    """
+
+    def __init__(self, max_failures=3, min_samples=5, min_timeout=5.0, deadline=None, retry_after=None):
+        """
+        :param max_failures: consecutive failed requests that open the circuit of a host, None never opens it
+        :param min_samples: response times measured before the timeout of a host adapts
+        :param min_timeout: shortest adaptive timeout in seconds
+        :param deadline: time.time() after which no request is sent, None runs without deadline
+        :param retry_after: seconds after which an open circuit lets a request through, None keeps it open
+        """
+        self.max_failures = max_failures
+        self.min_samples = min_samples
+        self.min_timeout = min_timeout
+        self.deadline = deadline
+        self.retry_after = retry_after
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(request_url):
+        return urlparse(request_url).netloc.lower()
+
+    def _state(self, host):
+        if host not in self._hosts:
+            self._hosts[host] = _HostState()
+        return self._hosts[host]
+
+    def remaining(self):
+        """
+        :return: seconds until the deadline, None without deadline
+        """
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def timeout(self, request_url, timeout):
+        """
+        Timeout of a request that is about to be sent
+        :param request_url:
+        :param timeout: timeout asked for by the caller in seconds
+        :return: timeout in seconds
+        :raise DeadlineExceeded: the run deadline passed
+        :raise HostUnavailable: the circuit of the host is open
+        """
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("Run deadline passed before requesting {}".format(request_url))
+        host = self.host(request_url)
+        with self._lock:
+            state = self._state(host)
+            if state.open and self.retry_after is not None and time.time() - state.opened_at >= self.retry_after:
+                # half open, the failure count stays at the limit
+                state.open = False
+            if state.open:
+                raise HostUnavailable("{} is skipped after {} failed requests in a row".format(host, state.failures))
+            if state.samples >= self.min_samples:
+                timeout = min(timeout, max(self.min_timeout, state.average + 4 * state.deviation))
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        return timeout
+
+    def success(self, request_url, seconds):
+        """
+        Record a response
+        :param request_url:
+        :param seconds: response time
+        """
+        with self._lock:
+            state = self._state(self.host(request_url))
+            state.failures = 0
+            state.samples += 1
+            if state.average is None:
+                state.average, state.deviation = seconds, seconds / 2.0
+            else:
+                state.deviation += DEVIATION_WEIGHT * (abs(state.average - seconds) - state.deviation)
+                state.average += AVERAGE_WEIGHT * (seconds - state.average)
+
+    def failure(self, request_url):
+        """
+        Record a failed request
+        :param request_url:
+        :return: True when the failure opened the circuit of the host
+        """
+        if self.expired():
+            # cut short by the deadline, not the fault of the host
+            return False
+        host = self.host(request_url)
+        with self._lock:
+            state = self._state(host)
+            state.failures += 1
+            if state.open or self.max_failures is None or state.failures < self.max_failures:
+                return False
+            state.open = True
+            state.opened_at = time.time()
+        logger.warning("{} failed {} requests in a row, skipping it{}".format(
+            host, state.failures, " for the rest of the run" if self.retry_after is None else
+            " for {} seconds".format(self.retry_after)))
+        return True
+
+    def open_hosts(self):
+        """
+        :return: sorted hosts whose circuit is open
+        """
+        with self._lock:
+            return sorted(host for host, state in self._hosts.items() if state.open)
@@ -0,0 +1,186 @@
+# coding=utf-8
+"""
+Run instrumentation: wall time per pipeline stage and per package, requests per host and the winning license
+strategy of every package.
+
+Every measurement is also passed to the hooks as ``hook(event, fields)`` so it can be forwarded to a metrics
+system. Events are ``stage`` (stage, seconds), ``package_stage`` (package, stage, seconds), ``request`` (host,
+method, status, seconds, bytes, retries, from_cache, error), ``rate_limited`` (host) and ``circuit_opened`` (host).
+"""
+import datetime
+import json
+import logging
+import threading
+import time
+from urlparse import urlparse
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[int(round(fraction * (len(ordered) - 1)))]
+
+
+class _HostStats(object):
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.circuit_open = False
+        self.from_cache = 0
+        self.statuses = {}
+        self.latencies = []
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "circuit_open": self.circuit_open,
+            "from_cache": self.from_cache,
+            "statuses": dict((str(status), count) for status, count in self.statuses.items()),
+            "seconds": sum(self.latencies),
+            "p50_ms": _percentile(self.latencies, 0.5) * 1000 if self.latencies else None,
+            "p99_ms": _percentile(self.latencies, 0.99) * 1000 if self.latencies else None,
+            "max_ms": max(self.latencies) * 1000 if self.latencies else None
+        }
+
+
+class Recorder(object):
+    """
+    Thread safe collector of the measurements of one run
+    """
+
+    def __init__(self, hooks=None):
+        """
+        :param hooks: callables receiving (event, fields) for every measurement
+        """
+        self.hooks = list(hooks or [])
+        self.started_at = time.time()
+        self.stages = {}
+        self.hosts = {}
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def emit(self, event, **fields):
+        for hook in self.hooks:
+            try:
+                hook(event, fields)
+            except Exception as exp:
+                logger.error("Instrumentation hook failed on %s event - %s" % (event, exp))
+
+    def stage_time(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.emit("stage", stage=stage, seconds=seconds)
+
+    def package_time(self, package_name, stage, seconds):
+        self.emit("package_stage", package=package_name, stage=stage, seconds=seconds)
+
+    def _host(self, request_url):
+        host = urlparse(request_url).netloc.lower()
+        if host not in self.hosts:
+            self.hosts[host] = _HostStats()
+        return host, self.hosts[host]
+
+    def request(self, request_url, method, status, seconds, size=0, retries=0, from_cache=False, error=False):
+        """
+        Record a request
+        :param request_url:
+        :param method:
+        :param status: response status, None when no response was received
+        :param seconds: time until the response headers, or the body when it is not streamed
+        :param size: response body bytes
+        :param retries: retries made by the transport before the response
+        :param from_cache: the body came from the response cache
+        :param error: the request raised
+        """
+        with self._lock:
+            host, stats = self._host(request_url)
+            stats.requests += 1
+            stats.errors += 1 if error or (status is not None and status >= 500) else 0
+            stats.bytes += size
+            stats.retries += retries
+            stats.from_cache += 1 if from_cache else 0
+            if status is not None:
+                stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.latencies.append(seconds)
+        self.emit("request", host=host, method=method, status=status, seconds=seconds, bytes=size, retries=retries,
+                  from_cache=from_cache, error=error)
+
+    def rate_limited(self, request_url):
+        with self._lock:
+            host, stats = self._host(request_url)
+            stats.rate_limited += 1
+        self.emit("rate_limited", host=host)
+
+    def circuit_opened(self, request_url):
+        with self._lock:
+            host, stats = self._host(request_url)
+            stats.circuit_open = True
+        self.emit("circuit_opened", host=host)
+
+    def report(self, package_details=None, unresolved=None):
+        """
+        Run report
+        :param package_details: resolved packages, their ``timings`` and ``strategy`` are reported
+        :param unresolved: (name, reason) of the unresolved packages
+        :return: JSON serializable dict
+        """
+        packages = []
+        strategies = {}
+        for package in package_details or []:
+            strategy = package.get("strategy") or ("error" if "error" in package else "not_found")
+            strategies[strategy] = strategies.get(strategy, 0) + 1
+            timings = package.get("timings") or {}
+            packages.append({"name": package["name"], "strategy": strategy, "seconds": sum(timings.values()),
+                             "timings": timings})
+        with self._lock:
+            hosts = dict((host, stats.as_dict()) for host, stats in self.hosts.items())
+            stages = dict(self.stages)
+        return {
+            "started_at": datetime.datetime.utcfromtimestamp(self.started_at).isoformat() + "Z",
+            "wall_seconds": time.time() - self.started_at,
+            "stages": stages,
+            "hosts": hosts,
+            "strategies": strategies,
+            "packages": packages,
+            "unresolved": [{"name": name, "reason": reason} for name, reason in unresolved or []]
+        }
+
+    def write(self, path, package_details=None, unresolved=None):
+        with open(path, "w") as report_file:
+            json.dump(self.report(package_details, unresolved), report_file, indent=2, sort_keys=True)
+
+    def summary(self, package_details=None, unresolved=None):
+        """
+        Human readable profile of the run
+        :return: list of lines
+        """
+        report = self.report(package_details, unresolved)
+        lines = ["Run took {:.2f}s".format(report["wall_seconds"])]
+        for stage, seconds in sorted(report["stages"].items(), key=lambda item: -item[1]):
+            lines.append("  stage {:<20} {:>9.2f}s".format(stage, seconds))
+        for host, stats in sorted(report["hosts"].items(), key=lambda item: -item[1]["seconds"]):
+            lines.append("  host {:<30} {:>6} requests {:>10} bytes {:>9.2f}s p50 {:.0f}ms p99 {:.0f}ms "
+                         "{} retries {} rate limited".format(host, stats["requests"], stats["bytes"], stats["seconds"],
+                                                             stats["p50_ms"], stats["p99_ms"], stats["retries"],
+                                                             stats["rate_limited"]))
+        lines.append("  strategies " + ", ".join("{}={}".format(strategy, count)
+                                                 for strategy, count in sorted(report["strategies"].items())))
+        slowest = sorted(report["packages"], key=lambda package: -package["seconds"])[:5]
+        if slowest:
+            lines.append("  slowest packages " + ", ".join("{} {:.2f}s".format(package["name"], package["seconds"])
+                                                         for package in slowest))
+        return lines
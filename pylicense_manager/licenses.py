@@ -0,0 +1,172 @@
+# coding=utf-8
+"""
+License templates and the mapping of free text license names and Trove classifiers to SPDX ids.
+
+License names are normalized (case, punctuation, "licence", "v3"/"3.0" spellings, filler words) and looked up in
+an index built once at import, so the lookup does not depend on the number of known licenses. The Jinja
+environment is created once and caches the compiled templates.
+"""
+import logging
+import re
+import threading
+
+from jinja2 import Environment, PackageLoader, StrictUndefined
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+# SPDX id -> (template name, aliases). A None template means the text of that version is not shipped.
+known_licenses = {
+    "AGPL-3.0": ("agpl3", ["agpl", "agpl3", "agplv3", "agplv3+", "agpl-3.0-only", "agpl-3.0-or-later", "affero gpl",
+                           "gnu affero general public license", "gnu affero general public license v3",
+                           "GNU Affero General Public License v3 or later (AGPLv3+)"]),
+    "Apache-2.0": ("apache", ["apache", "apache2", "apache 2.0", "apache license", "asl 2.0", "apache software",
+                              "apache license, version 2.0", "Apache Software License",
+                              "apache software license 2.0", "apache license version 2.0"]),
+    "BSD-2-Clause": ("bsd", ["bsd", "bsd license", "bsd-2-clause", "bsd 2-clause", "2-clause bsd", "simplified bsd",
+                             "freebsd", "bsd2"]),
+    "BSD-3-Clause": ("bsd3", ["bsd3", "bsd-3-clause", "bsd 3-clause", "3-clause bsd", "new bsd", "modified bsd",
+                              "revised bsd", "bsd-new"]),
+    "CC0-1.0": ("cc0", ["cc0", "cc0 1.0", "cc0 1.0 universal", "CC0 1.0 Universal (CC0 1.0) Public Domain Dedication"]),
+    "CC-BY-3.0": ("cc_by", ["cc by", "cc-by", "cc by 3.0", "creative commons attribution",
+                            "creative commons attribution 3.0"]),
+    "CC-BY-NC-3.0": ("cc_by_nc", ["cc by nc", "cc-by-nc", "creative commons attribution noncommercial"]),
+    "CC-BY-NC-ND-3.0": ("cc_by_nc_nd", ["cc by nc nd", "cc-by-nc-nd",
+                                        "creative commons attribution noncommercial noderivs"]),
+    "CC-BY-NC-SA-3.0": ("cc_by_nc_sa", ["cc by nc sa", "cc-by-nc-sa",
+                                        "creative commons attribution noncommercial sharealike"]),
+    "CC-BY-ND-3.0": ("cc_by_nd", ["cc by nd", "cc-by-nd", "creative commons attribution noderivs"]),
+    "CC-BY-SA-3.0": ("cc_by_sa", ["cc by sa", "cc-by-sa", "creative commons attribution sharealike"]),
+    "CDDL-1.0": ("cddl", ["cddl", "common development and distribution license",
+                          "Common Development and Distribution License 1.0 (CDDL-1.0)"]),
+    "EPL-1.0": ("epl", ["epl", "eclipse public license", "Eclipse Public License 1.0 (EPL-1.0)"]),
+    "GPL-2.0": ("gpl2", ["gpl2", "gplv2", "gpl-2.0-only", "gnu gpl v2", "gnu general public license v2",
+                         "GNU General Public License v2 (GPLv2)"]),
+    "GPL-2.0+": ("gpl2", ["gplv2+", "gpl-2.0-or-later", "GNU General Public License v2 or later (GPLv2+)"]),
+    "GPL-3.0": ("gpl3", ["gpl3", "gplv3", "gpl-3.0-only", "gnu gpl v3", "gnu general public license v3",
+                         "GNU General Public License v3 (GPLv3)"]),
+    "GPL-3.0+": ("gpl3", ["gplv3+", "gpl-3.0-or-later", "GNU General Public License v3 or later (GPLv3+)"]),
+    "ISC": ("isc", ["isc", "iscl", "ISC License (ISCL)"]),
+    "LGPL-2.0": (None, ["lgpl2", "lgplv2", "GNU Library General Public License v2",
+                        "GNU Lesser General Public License v2 (LGPLv2)"]),
+    "LGPL-2.0+": (None, ["lgplv2+", "GNU Lesser General Public License v2 or later (LGPLv2+)"]),
+    "LGPL-2.1": (None, ["lgpl 2.1", "lgplv2.1", "lgpl-2.1-only", "gnu lesser general public license v2.1"]),
+    "LGPL-2.1+": (None, ["lgplv2.1+", "lgpl-2.1-or-later"]),
+    "LGPL-3.0": ("lgpl", ["lgpl", "lgpl3", "lgplv3", "lgpl-3.0-only", "gnu lgpl", "gnu lesser general public license",
+                          "GNU Lesser General Public License v3 (LGPLv3)",
+                          "GNU Library or Lesser General Public License (LGPL)"]),
+    "LGPL-3.0+": ("lgpl", ["lgplv3+", "lgpl-3.0-or-later", "GNU Lesser General Public License v3 or later (LGPLv3+)"]),
+    "MIT": ("mit", ["mit", "mit license", "expat", "the mit license"]),
+    "MPL-1.1": (None, ["mpl 1.1", "Mozilla Public License 1.1 (MPL 1.1)"]),
+    "MPL-2.0": ("mpl", ["mpl", "mpl2", "mpl 2.0", "mozilla public license", "mozilla public license 2.0",
+                        "Mozilla Public License 2.0 (MPL 2.0)"]),
+    "Unlicense": ("unlicense", ["unlicense", "the unlicense", "The Unlicense (Unlicense)"]),
+    "WTFPL": ("wtfpl", ["wtfpl", "do what the fuck you want to public license"]),
+    "X11": ("x11", ["x11", "mit/x11", "x11 license"]),
+    "Zlib": ("zlib", ["zlib", "zlib/libpng", "zlib/libpng license"]),
+}
+
+# words that do not tell licenses apart
+ignored_words = {"license", "the", "version", "v", "software"}
+
+
+def normalize_license_name(license_name):
+    """
+    Normalized spelling of a license name: "GPLv3", "GPL-3.0" and "GPL version 3" all become "gpl 3"
+    :param license_name:
+    :return: space separated words
+    """
+    text = license_name.lower().replace("licence", "license")
+    text = re.sub(r"(?<=[a-z])v(?=\d)", " ", text)
+    text = re.sub(r"(\d)\.0(?![\d.])", r"\1", text)
+    text = re.sub(r"([a-z])(\d)", r"\1 \2", text)
+    words = re.findall(r"[a-z]+|\d+(?:\.\d+)*\+?|\+", text)
+    return " ".join(word for word in words if word not in ignored_words)
+
+
+def _build_index():
+    index = {}
+    for spdx_id, (template_name, aliases) in known_licenses.items():
+        for alias in [spdx_id] + aliases:
+            key = normalize_license_name(alias)
+            if key in index and index[key][0] != spdx_id:
+                raise ValueError("License alias {} is ambiguous".format(alias))
+            index[key] = (spdx_id, template_name)
+    return index
+
+
+license_index = _build_index()
+# longest alias in words, bounds the phrases looked up in free text
+max_alias_words = max(len(key.split(" ")) for key in license_index)
+
+
+def _lookup(license_name):
+    key = normalize_license_name(license_name)
+    if not key:
+        return None
+    if key in license_index:
+        return license_index[key]
+    # the longest, leftmost known name mentioned in the text, e.g. "Dual licensed under MIT"
+    words = key.split(" ")
+    for size in range(min(max_alias_words, len(words)), 0, -1):
+        for start in range(len(words) - size + 1):
+            match = license_index.get(" ".join(words[start:start + size]))
+            if match:
+                return match
+    return None
+
+
+def classify_license(license_name, classifiers=None):
+    """
+    SPDX id and template name of a license
+    :param license_name: free text license name of the package metadata
+    :param classifiers: Trove classifiers, used when the license name is missing or unknown
+    :return: tuple of SPDX id and template name (None when there is no template), None when unknown
+    """
+    if license_name and license_name.strip().upper() != "UNKNOWN":
+        match = _lookup(license_name)
+        if match:
+            return match
+    for classifier in classifiers or []:
+        parts = [part.strip() for part in classifier.split("::")]
+        if parts[0] != "License" or len(parts) < 2:
+            continue
+        match = license_index.get(normalize_license_name(parts[-1]))
+        if match:
+            return match
+    return None
+
+
+_environment = None
+_environment_lock = threading.Lock()
+
+
+def get_environment():
+    """
+    Jinja environment of the license templates, created on first use
+    :return:
+    """
+    global _environment
+    if _environment is None:
+        with _environment_lock:
+            if _environment is None:
+                environment = Environment(loader=PackageLoader('pylicense_manager', 'templates'),
+                                          undefined=StrictUndefined)
+                # compile every template once
+                for template_name in set(template for template, _ in known_licenses.values() if template):
+                    environment.get_template(template_name + ".txt")
+                _environment = environment
+    return _environment
+
+
+def render_license(template_name, project, organization, year):
+    """
+    Render a license template
+    :param template_name:
+    :param project:
+    :param organization:
+    :param year:
+    :return: license text
+    """
+    license_template = get_environment().get_template(template_name + ".txt")
+    return license_template.render(project=project, organization=organization, year=year)
@@ -0,0 +1,67 @@
+# coding=utf-8
+import logging
+import re
+from collections import Counter
+from HTMLParser import HTMLParser
+from urlparse import urlparse
+
+from pylicense_manager import utils
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+repo_link_pattern = re.compile("^(http|https)://(github.com|bitbucket.org)/")
+# links every themed documentation page carries, they say nothing about the project
+ignored_links = ["https://github.com/snide/sphinx_rtd_theme"]
+
+
+class RepoLinkScanner(HTMLParser):
+    """
+    Incremental scanner of GitHub and Bitbucket links in a home page.
+
+    Feed it the page chunk by chunk. Link paths are tallied as they are seen, and ``done`` is set as soon as a
+    single repository has been linked ``min_votes`` times, so the rest of the page does not have to be read.
+    """
+
+    def __init__(self, min_votes=3):
+        HTMLParser.__init__(self)
+        self.min_votes = min_votes
+        self.paths = Counter()
+        self.repo_votes = Counter()
+        self.host_name = None
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        href = dict(attrs).get("href")
+        if not href or not repo_link_pattern.match(href) or href in ignored_links:
+            return
+        parsed_url = urlparse(href)
+        host_name = "{}://{}".format(parsed_url.scheme, parsed_url.netloc)
+        self.host_name = max(self.host_name, host_name)
+        self.paths[parsed_url.path] += 1
+        repo_path = "/".join(parsed_url.path.strip("/").split("/")[:2])
+        self.repo_votes[repo_path] += 1
+        if self.repo_votes[repo_path] >= self.min_votes:
+            self.done = True
+
+    def repo_url(self):
+        """
+        Repository url voted by the links seen so far
+        :return: repo url, None when no repository link was found
+        """
+        if not self.paths or not self.host_name:
+            return None
+
+        # retain common url paths
+        url_path_list = [path for path, count in self.paths.items() if count > 1]
+        if not url_path_list:
+            url_path_list = ["/".join(utils.longest_prefix(list(self.paths)).strip("/").split("/")[:2])]
+
+        # get common prefix from common elements
+        url_path_list = [path.strip("/") for path in url_path_list if len(path.strip("/").split("/")) <= 2]
+        valid_path = utils.longest_prefix(url_path_list)
+        if valid_path:
+            return self.host_name + "/" + valid_path
+        return None
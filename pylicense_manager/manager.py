@@ -1,39 +1,380 @@
 # coding=utf-8
 import base64
+import copy
 import datetime
+import glob
+import json
 import logging
-import urlparse
+import posixpath
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from HTMLParser import HTMLParseError
 from email import message_from_string
+from functools import partial
+from multiprocessing.pool import ThreadPool
 
 import os
 import pip
 import pip.req
 import pkg_resources
-import re
-from bs4 import BeautifulSoup
-from jinja2 import Environment, PackageLoader, StrictUndefined
 from pip.download import PipSession
+from requests import RequestException
 
 import utils
+from pylicense_manager import archives
+from pylicense_manager import green
+from pylicense_manager.archives import license_member_pattern
+from pylicense_manager.archives import license_rank
+from pylicense_manager.bundle import LicenseBundle
+from pylicense_manager.cache import MemoryCache
+from pylicense_manager.cache import ResponseCache
+from pylicense_manager.client import DEFAULT_HOST_LIMITS
+from pylicense_manager.client import HttpClient
+from pylicense_manager.dependencies import DependencyResolver
+from pylicense_manager.environment import DistributionIndex
+from pylicense_manager.environment import meta_files_to_check
+from pylicense_manager.fingerprint import build_index
+from pylicense_manager.fingerprint import get_index
+from pylicense_manager.github import GithubGraphQL
+from pylicense_manager.github import graphql_url
+from pylicense_manager.github import license_file_names
+from pylicense_manager.github import repo_slug
+from pylicense_manager.health import DeadlineExceeded
+from pylicense_manager.health import HostHealth
+from pylicense_manager.licenses import classify_license
+from pylicense_manager.licenses import render_license
+from pylicense_manager.links import RepoLinkScanner
+from pylicense_manager.manifest import MANIFEST_NAME
+from pylicense_manager.manifest import Manifest
+from pylicense_manager.manifest import content_hash
+from pylicense_manager.metadata_index import PyPIMetadataIndex
+from pylicense_manager.parallel import first_success
+from pylicense_manager.ratelimit import GithubScheduler
+from pylicense_manager.ratelimit import RateLimitExhausted
+from pylicense_manager.repo_urls import READTHEDOCS_API_URL
+from pylicense_manager.repo_urls import normalize_repo_url
+from pylicense_manager.repo_urls import readthedocs_repo_url
+from pylicense_manager.repo_urls import readthedocs_slug
+from pylicense_manager.repo_urls import repo_url_candidates
+from pylicense_manager.store import ResultStore
+from pylicense_manager.store import stored_fields
 
 logging.basicConfig()
 logger = logging.getLogger(__name__)
-meta_files_to_check = ['PKG-INFO', 'METADATA']
+PYPI_URL = "https://pypi.python.org/pypi"
+GITHUB_API_URL = "https://api.github.com"
+BITBUCKET_API_URL = "https://api.bitbucket.org/2.0"
+GITHUB_RAW_URL = "https://raw.githubusercontent.com"
+BITBUCKET_RAW_URL = "https://bitbucket.org"
+MAX_HOME_PAGE_BYTES = 1024 * 1024
+MAX_LICENSE_BYTES = 1024 * 1024
+# well known license file names probed at once on a raw file host
+PROBE_CONCURRENCY = 2
+# seconds a license file name is probed alone before the next name is probed as well, a missing file lets the next
+# name start at once
+PROBE_STAGGER = 0.15
+# pages of a Bitbucket directory listing read for a license file
+MAX_LISTING_PAGES = 10
+# seconds between the starts of the license sources of a package in hedged mode
+HEDGE_STAGGER = 0.25
+# bound of the PyPI details, prefetched GitHub licenses and detected licenses kept in memory, shared by the runs of
+# a long running process
+MEMORY_CACHE_ENTRIES = 4096
+MEMORY_CACHE_TTL = 60 * 60
+# cache lookups that may answer None
+_MISSING = object()
+# package fields of a requirements file report
+report_fields = ["name", "line_no", "requirement", "required_by", "installed_version", "version", "strategy",
+                 "repo_url", "license_file", "detected_license", "detected_confidence", "error"]
 
 
 class Manager(object):
-    def __init__(self, requirements_path, output_path, gh_token=None):
+    def __init__(self, requirements_path, output_path, gh_token=None, http_client=None, pool_connections=10,
+                 pool_maxsize=10, workers=1, host_limits=None, cache_dir=None, cache_ttl=7 * 24 * 60 * 60,
+                 cache_max_size=256 * 1024 * 1024, store_path=None, store_ttl=30 * 24 * 60 * 60,
+                 store_negative_ttl=24 * 60 * 60, environment=None, github_batch=False,
+                 github_graphql_url=None, github_batch_size=25, pypi_url=PYPI_URL, pypi_index=None,
+                 offline=False, wheelhouse=None, rate_limit_wait=60, incremental=False, with_deps=False,
+                 github_api_url=GITHUB_API_URL, bitbucket_api_url=BITBUCKET_API_URL, recorder=None, archive=None,
+                 readthedocs_api_url=READTHEDOCS_API_URL, spdx_dir=None, github_raw_url=GITHUB_RAW_URL,
+                 bitbucket_raw_url=BITBUCKET_RAW_URL, hedge=False, hedge_stagger=HEDGE_STAGGER, hedge_deadline=None,
+                 deadline=None, max_host_failures=3, host_retry_after=None):
         self.reqs_path = requirements_path
+        # instrumentation of stages, packages and requests, None records nothing
+        self.recorder = recorder
         self.output_path = output_path
-        self.gh_token = gh_token
+        # several tokens are rotated by the GitHub scheduler
+        self.gh_tokens = [gh_token] if isinstance(gh_token, basestring) else [token for token in gh_token or [] if token]
+        self.gh_token = self.gh_tokens[0] if self.gh_tokens else None
         self.custom_header = {"Authorization": "token {}".format(self.gh_token)} if self.gh_token else None
         self.session = PipSession()
+        self.workers = max(1, workers or 1)
+        self.pypi_url = pypi_url.rstrip("/")
+        self.github_api_url = github_api_url.rstrip("/")
+        # batched lookups go to the GraphQL endpoint of the same GitHub, api.github.com/graphql by default
+        self.github_graphql_url = github_graphql_url or graphql_url(self.github_api_url)
+        self.bitbucket_api_url = bitbucket_api_url.rstrip("/")
+        self.readthedocs_api_url = readthedocs_api_url
+        self.github_raw_url = github_raw_url.rstrip("/")
+        self.bitbucket_raw_url = bitbucket_raw_url.rstrip("/")
+        # race the license sources of a package instead of trying them one after another
+        self.hedge = hedge
+        self.hedge_stagger = hedge_stagger
+        self.hedge_deadline = hedge_deadline
+        # seconds a run may take, the packages not resolved by then are reported as unresolved
+        self.deadline = deadline
+        self._deadline_at = None
+        # prebuilt PyPI metadata, loaded once and looked up in memory
+        self.pypi_index = PyPIMetadataIndex(pypi_index) if pypi_index else None
+        self.offline = offline
+        self.wheelhouse = wheelhouse
+        if http_client is None:
+            limits = dict(DEFAULT_HOST_LIMITS)
+            pypi_host = utils.parse_url(self.pypi_url)
+            # a PyPI mirror gets the PyPI limit rather than the home page one
+            limits.setdefault(pypi_host.split(":")[0], limits["pypi.python.org"])
+            limits.update(host_limits or {})
+            cache = ResponseCache(cache_dir, ttl=cache_ttl, max_size=cache_max_size) if cache_dir else None
+            scheduler = GithubScheduler(self.gh_tokens, max_wait=rate_limit_wait,
+                                        hosts=(utils.parse_url(self.github_api_url).lower(),
+                                               utils.parse_url(self.github_graphql_url).lower()))
+            # one pooled client per run, so every GitHub/PyPI/Bitbucket call reuses open connections, every worker
+            # may probe several raw license files at once
+            # hosts failing repeatedly are skipped for the rest of the run
+            health = HostHealth(max_failures=max_host_failures, retry_after=host_retry_after)
+            http_client = HttpClient(pool_connections=pool_connections,
+                                     pool_maxsize=max(pool_maxsize, self.workers * PROBE_CONCURRENCY),
+                                     host_limits=limits, cache=cache, scheduler=scheduler, recorder=recorder,
+                                     health=health)
+        elif recorder is not None and http_client.recorder is None:
+            http_client.recorder = recorder
+        self.http_client = http_client
+        self.store = ResultStore(store_path, ttl=store_ttl, negative_ttl=store_negative_ttl) if store_path else None
+        # one scan of the installed distributions, looked up by name for every requirement
+        with self._timed("environment"):
+            self.environment = environment if environment is not None else DistributionIndex()
+        self.github_batch = github_batch
+        self.github_graphql = GithubGraphQL(self.gh_token, client=self.http_client, url=self.github_graphql_url,
+                                            batch_size=github_batch_size)
+        # license lookups answered by the batched GraphQL requests, keyed by owner/repo
+        self._github_prefetch = MemoryCache(MEMORY_CACHE_ENTRIES, ttl=MEMORY_CACHE_TTL)
+        # packages left unresolved, with the reason
+        self.unresolved = []
+        # packages resolved by this manager, for the run report
+        self.resolved_packages = []
+        # PyPI details by normalized name and version
+        self._pypi_infos = MemoryCache(MEMORY_CACHE_ENTRIES, ttl=MEMORY_CACHE_TTL)
+        self.with_deps = with_deps
+        self.dependency_resolver = DependencyResolver(self.environment, find_release=self._find_release,
+                                                      pypi_info=self._pypi_info)
         self.created_dirs = None
+        self._output_dir = None
+        # license texts are kept on the packages while a batch of requirements files is resolved
+        self._defer_writes = False
+        # stable output directory with a manifest, only changed requirements are resolved again
+        self.incremental = incremental
+        self.manifest = None
+        # zip or tar archive the license files are streamed into instead of the output directory
+        self.archive = LicenseBundle(archive) if archive else None
+        if self.archive is not None and incremental:
+            logger.warning("Incremental runs need license files on disk, resolving every package into the archive")
+            self.incremental = False
+        self._dirs_lock = threading.Lock()
+        self.green_concurrency = None
+        # SPDX license texts fingerprinted besides the bundled templates
+        self.spdx_dir = spdx_dir
+        self._license_index = None
+        self._index_lock = threading.Lock()
+        # detected license by sha256 of the license text
+        self._detected = MemoryCache(MEMORY_CACHE_ENTRIES)
+
+    @property
+    def license_index(self):
+        """
+        Fingerprints of the reference license texts, built on first use
+        """
+        if self._license_index is None:
+            with self._index_lock:
+                if self._license_index is None:
+                    self._license_index = build_index(self.spdx_dir) if self.spdx_dir else get_index()
+        return self._license_index
+
+    def fork(self, requirements_path, output_path=None):
+        """
+        Manager of another run that shares the connection pools, caches, environment index and license index of
+        this one, so a long running process resolves every run warm. The in-memory caches are bounded in size and
+        age, the dependency versions of a run are its own. Only the manager that was forked is closed.
+        :param requirements_path:
+        :param output_path: the output path of this manager by default
+        :return: Manager
+        """
+        # fingerprints are built once for every fork
+        self.license_index
+        run = copy.copy(self)
+        run.reqs_path = requirements_path
+        run.output_path = output_path or self.output_path
+        run.unresolved = []
+        run.resolved_packages = []
+        run.created_dirs = None
+        run._output_dir = None
+        run._defer_writes = False
+        run._deadline_at = None
+        run.green_concurrency = None
+        run.incremental = False
+        run.manifest = None
+        run.archive = None
+        # the versions it memoizes depend on the requirements of the run
+        run.dependency_resolver = DependencyResolver(run.environment, find_release=run._find_release,
+                                                     pypi_info=run._pypi_info)
+        return run
+
+    def resolve_texts(self, requirements_path=None):
+        """
+        Resolve the licenses of a requirements file without writing any file, the license text of every package
+        is kept in its "license_text"
+        :param requirements_path: the requirements path of the manager by default
+        :return: package details
+        """
+        self._start_deadline()
+        package_details = self._read_requirements(requirements_path or self.reqs_path)
+        self._defer_writes = True
+        try:
+            self._resolve(package_details)
+        finally:
+            self._defer_writes = False
+        return package_details
+
+    def close(self):
+        self.http_client.close()
+        if self.archive is not None:
+            with self._timed("write_archive"):
+                self.archive.close()
+        if self.store is not None:
+            self.store.close()
+
+    @contextmanager
+    def _timed(self, stage, package=None):
+        """
+        Record the time of a pipeline stage, or of a stage of one package
+        :param stage:
+        :param package: package the time is recorded on, in its "timings"
+        """
+        if self.recorder is None:
+            yield
+            return
+        started = time.time()
+        try:
+            yield
+        finally:
+            seconds = time.time() - started
+            if package is None:
+                self.recorder.stage_time(stage, seconds)
+            else:
+                timings = package.setdefault("timings", {})
+                timings[stage] = timings.get(stage, 0.0) + seconds
+                self.recorder.package_time(package["name"], stage, seconds)
+
+    def _package_timer(self, func, stage):
+        if self.recorder is None:
+            return func
+
+        def timed(package):
+            with self._timed(stage, package):
+                return func(package)
+        return timed
+
+    def run_report(self):
+        """
+        Instrumentation report of the packages resolved so far
+        :return: dict, None without a recorder
+        """
+        if self.recorder is None:
+            return None
+        return self.recorder.report(self.resolved_packages, self.unresolved)
+
+    def _start_deadline(self):
+        if self.deadline is None:
+            return
+        self._deadline_at = time.time() + self.deadline
+        if self.http_client.health is not None:
+            self.http_client.health.deadline = self._deadline_at
+
+    def _deadline_passed(self):
+        return self._deadline_at is not None and time.time() >= self._deadline_at
+
+    def _map(self, func, items):
+        """
+        Apply func to every item, on a worker pool when more than one worker is configured
+        :param func:
+        :param items:
+        :return: results in the order of items
+        """
+        if self.green_concurrency:
+            return green.map_greenlets(func, items, self.green_concurrency)
+        if self.workers == 1 or len(items) < 2:
+            return [func(item) for item in items]
+        pool = ThreadPool(min(self.workers, len(items)))
+        try:
+            return pool.map(func, items, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    def requirement_files(self):
+        """
+        Requirements files to resolve, glob patterns are expanded
+        :return: paths in the given order, without duplicates
+        """
+        paths = [self.reqs_path] if isinstance(self.reqs_path, basestring) else list(self.reqs_path)
+        requirement_files = []
+        for path in paths:
+            for match in (sorted(glob.glob(path)) if glob.has_magic(path) else [path]):
+                if match not in requirement_files:
+                    requirement_files.append(match)
+        return requirement_files
 
     def parse_requirements(self):
-        # parse requirements.txt file
+        """
+        Resolve the licenses of the requirements file. Several files (a list or a glob) are resolved as a batch
+        where every package is resolved once for all files.
+        :return: package details, a dict of requirements file to package details for several files
+        """
+        self._start_deadline()
+        requirement_files = self.requirement_files()
+        if len(requirement_files) > 1:
+            return self._parse_requirement_files(requirement_files)
+        package_details = self._read_requirements(requirement_files[0] if requirement_files else self.reqs_path)
+
+        pending = package_details
+        if self.incremental:
+            # package names may be replaced by the metadata spelling while resolving
+            manifest_keys = [utils.normalize_name(package["name"]) for package in package_details]
+            with self._timed("manifest"):
+                pending = self._skip_unchanged(manifest_keys, package_details)
+        self._resolve(pending)
+        if self.incremental:
+            with self._timed("manifest"):
+                self._update_manifest(manifest_keys, package_details)
+        return package_details
+
+    def _read_requirements(self, requirements_path):
+        """
+        Parse a requirements.txt file
+        :param requirements_path:
+        :return: package details
+        """
+        with self._timed("read_requirements"):
+            package_details = self._parse_requirements_file(requirements_path)
+        if self.with_deps:
+            with self._timed("dependencies"):
+                package_details = self._expand_dependencies(package_details)
+        return package_details
+
+    def _parse_requirements_file(self, requirements_path):
         package_details = []
-        requirement_file_list = pip.req.parse_requirements(self.reqs_path, session=self.session)
+        requirement_file_list = pip.req.parse_requirements(requirements_path, session=self.session)
         for item in requirement_file_list:
             if isinstance(item, pip.req.InstallRequirement):
                 comes_from = str(item.comes_from)
@@ -44,14 +385,16 @@ class Manager(object):
                     "as_egg": item.as_egg,
                     "line_no": line_no,
                     "editable": item.editable,
-                    "installed_version": item.installed_version,
+                    "installed_version": self.environment.version(item.name),
                     "is_wheel": item.is_wheel,
                     "link": item.link,
                     "update": item.update,
                     "nothing_to_uninstall": item.nothing_to_uninstall,
+                    "extras": sorted(item.extras),
 
                 }
                 logger.info("required package: {}".format(item.name))
+                package_info["requirement"] = item.link.url if item.link is not None else str(item.req)
 
                 if len(str(item.req.specifier)) > 0:
                     package_info["version_specific"] = str(item.req.specifier)
@@ -62,48 +405,415 @@ class Manager(object):
                     package_info["link_egg_file"] = item.link.egg_fragment
 
                 package_details.append(package_info)
+        return package_details
 
+    def _resolve(self, package_details):
+        """
+        Find and write the licenses of packages
+        :param package_details:
+        """
+        self.resolved_packages.extend(package_details)
+        if self.wheelhouse:
+            with self._timed("wheelhouse"):
+                self._read_wheelhouse(package_details)
         # add license details
-        package_details = self._get_license_details(package_details)
-        self.search_router(package_details)
-        return package_details
+        with self._timed("package_details"):
+            self._get_license_details(package_details)
+        if self.github_batch and not self.offline:
+            with self._timed("github_prefetch"):
+                self._prefetch_github_licenses(package_details)
+        with self._timed("search"):
+            self.search_router(package_details)
+        # the workers finish in any order, unresolved packages are reported in requirement order
+        order = {}
+        for index, package in enumerate(self.resolved_packages):
+            order.setdefault(package["name"], index)
+        self.unresolved.sort(key=lambda item: order.get(item[0], len(order)))
+        if self._deadline_passed():
+            logger.warning("Run deadline of {} seconds passed, the results are partial".format(self.deadline))
+        open_hosts = self.http_client.health.open_hosts() if self.http_client.health is not None else []
+        if open_hosts:
+            logger.warning("Skipped failing hosts: {}".format(", ".join(open_hosts)))
+        if self.unresolved:
+            logger.error("{} package(s) could not be resolved: {}".format(
+                len(self.unresolved), ", ".join("{} ({})".format(name, reason) for name, reason in self.unresolved)))
+
+    def _work_item_key(self, package):
+        return utils.normalize_name(package["name"]), self._package_version(package) or package["requirement"]
+
+    def _parse_requirement_files(self, requirement_files):
+        """
+        Resolve several requirements files. Packages are deduplicated by name and version across the files, each
+        one is resolved once and the results are written to an output tree and report per requirements file.
+        :param requirement_files:
+        :return: dict of requirements file to package details
+        """
+        if self.incremental:
+            logger.warning("Incremental runs apply to a single requirements file, resolving every package")
+        file_packages = [(path, self._read_requirements(path)) for path in requirement_files]
+        work_items = OrderedDict()
+        for _, packages in file_packages:
+            for package in packages:
+                work_items.setdefault(self._work_item_key(package), package)
+        logger.info("Resolving {} unique package(s) of {} requirements files".format(
+            len(work_items), len(requirement_files)))
+        work_item_list = list(work_items.values())
+        # keys are taken before resolving, metadata may change the package names
+        keys = [[self._work_item_key(package) for package in packages] for _, packages in file_packages]
+        self._defer_writes = True
+        try:
+            self._resolve(work_item_list)
+        finally:
+            self._defer_writes = False
+
+        with self._timed("write_trees"):
+            return self._write_trees(work_items, file_packages, keys)
+
+    def _write_trees(self, work_items, file_packages, keys):
+        """
+        Write the output tree and report of every requirements file of a batch
+        :param work_items: dict of work item key to resolved package
+        :param file_packages: list of requirements file and its packages
+        :param keys: work item keys of the packages of each file
+        :return: dict of requirements file to package details
+        """
+        base_dir = os.path.dirname(os.path.commonprefix([os.path.abspath(path) for path, _ in file_packages]))
+        results = OrderedDict()
+        for (path, packages), package_keys in zip(file_packages, keys):
+            tree_name = os.path.splitext(os.path.relpath(os.path.abspath(path), base_dir))[0].replace(os.sep, "_")
+            resolved = []
+            for package, key in zip(packages, package_keys):
+                resolved.append(dict(work_items[key], line_no=package["line_no"], requirement=package["requirement"]))
+            if self.archive is not None:
+                self._archive_tree(tree_name, path, resolved)
+            else:
+                tree = os.path.join(self.output_path, self._output_dir_name(), tree_name)
+                license_dir = os.path.join(tree, "license_files")
+                utils.create_path(license_dir)
+                for result in resolved:
+                    license_content = result.pop("license_text", None)
+                    if license_content is not None:
+                        utils.write_to_file(os.path.join(license_dir, result["license_file"]), license_content)
+                self._write_report(os.path.join(tree, "report.json"), path, resolved)
+            results[path] = resolved
+        for package in work_items.values():
+            package.pop("license_text", None)
+        return results
+
+    def _archive_tree(self, tree_name, requirements_path, package_details):
+        """
+        Write the license files and report of a requirements file of a batch under its tree in the archive
+        """
+        for package in package_details:
+            license_content = package.pop("license_text", None)
+            if license_content is not None:
+                self._archive_license(package, license_content, tree_name)
+        report = json.dumps(self._report(requirements_path, package_details), indent=2, sort_keys=True)
+        self.archive.add(posixpath.join(tree_name, "report.json"), report, tree=tree_name)
 
     @staticmethod
-    def _get_license_details(package_details):
+    def _report(requirements_path, package_details):
+        return {
+            "requirements": os.path.abspath(requirements_path),
+            "packages": [dict((field, package.get(field)) for field in report_fields) for package in package_details]
+        }
+
+    @classmethod
+    def _write_report(cls, report_path, requirements_path, package_details):
+        logger.info("Writing report to %s" % report_path)
+        with open(report_path, "w") as report_file:
+            json.dump(cls._report(requirements_path, package_details), report_file, indent=2, sort_keys=True)
+
+    def _skip_unchanged(self, manifest_keys, package_details):
+        """
+        Reuse the manifest entries of unchanged requirements and prune the license files of removed ones
+        :param manifest_keys: normalized requirement names
+        :param package_details:
+        :return: packages that have to be resolved
+        """
+        license_dir = self._create_directory_structure()
+        self.manifest = Manifest(os.path.join(os.path.dirname(license_dir), MANIFEST_NAME))
+        pending = []
+        for key, package in zip(manifest_keys, package_details):
+            if self.manifest.is_current(key, package["requirement"], package["installed_version"], license_dir):
+                entry = self.manifest.get(key)
+                package.update(strategy=entry["source"], repo_url=entry["repo_url"], version=entry["version"],
+                               license_file=entry["file"], detected_license=entry.get("detected_license"),
+                               detected_confidence=entry.get("detected_confidence"), unchanged=True)
+            else:
+                pending.append(package)
+        for key in set(self.manifest.entries) - set(manifest_keys):
+            logger.info("{}: removed from requirements".format(key))
+            self._remove_license_file(self.manifest.remove(key))
+        logger.info("{} of {} requirement(s) changed since the last run".format(len(pending), len(package_details)))
+        return pending
+
+    def _update_manifest(self, manifest_keys, package_details):
+        """
+        Record the resolved requirements in the manifest
+        :param manifest_keys: normalized requirement names
+        :param package_details:
+        """
+        for key, package in zip(manifest_keys, package_details):
+            if package.get("unchanged") or "error" in package:
+                # failed lookups are retried on the next run
+                continue
+            entry = {
+                "line": package["requirement"],
+                "installed_version": package["installed_version"],
+                "version": package.get("version") or self._package_version(package),
+                "source": package.get("strategy"),
+                "repo_url": package.get("repo_url"),
+                "file": package.get("license_file"),
+                "sha256": package.get("license_sha256"),
+                "detected_license": package.get("detected_license"),
+                "detected_confidence": package.get("detected_confidence")
+            }
+            previous = self.manifest.get(key)
+            if previous and previous.get("file") != entry["file"]:
+                self._remove_license_file(previous)
+            self.manifest.set(key, entry)
+        self.manifest.save()
+
+    def _remove_license_file(self, entry):
+        if not entry or not entry.get("file"):
+            return
+        try:
+            os.remove(os.path.join(self.created_dirs, entry["file"]))
+        except OSError as exp:
+            logger.info("Could not remove license file %s - %s" % (entry["file"], exp))
+
+    def parse_requirements_async(self, concurrency=100):
+        """
+        Parse requirements.txt and resolve every package on gevent greenlets instead of threads.
+        Call green.patch() before requests is imported to let network calls overlap.
+        :param concurrency: maximum number of packages resolved at once
+        :return: package details
+        """
+        self.green_concurrency = concurrency
+        try:
+            return self.parse_requirements()
+        finally:
+            self.green_concurrency = None
+
+    def _get_license_details(self, package_details):
         """
         Get package license details
         :param package_details:
         :return:
         """
+        self._map(self._package_timer(self._get_package_details, "details"), package_details)
+        return package_details
+
+    def _read_wheelhouse(self, package_details):
+        """
+        Attach metadata and license text read from the wheelhouse archive of each package
+        :param package_details:
+        """
+        wheelhouse = archives.index_wheelhouse(self.wheelhouse)
+        package_archives = {}
         for package in package_details:
-            pkg_name = package["name"]
-            pkg_version = package["version_specific"][2:] if "version_specific" in package else None
-            if package["installed_version"]:
-                installed_packages = pkg_resources.require(pkg_name)
-                installed_pkg = installed_packages[0]
-                for meta_file in meta_files_to_check:
-                    if not installed_pkg.has_metadata(meta_file):
-                        continue
-                    pkg_meta_data = installed_pkg.get_metadata(meta_file)
-                    meta_data = {k.lower(): v for k, v in dict(message_from_string(pkg_meta_data)).iteritems()}
-                    package.update(meta_data)
-                if "home-page" in package:
-                    logger.info("{}: Cannot find link to license home page.\n".format(pkg_name))
+            version = self._package_version(package)
+            path = wheelhouse.get((utils.normalize_name(package["name"]), version)) if version else None
+            if path:
+                package_archives[id(package)] = path
             else:
-                # Fetch details from PyPI server
-                if pkg_name and pkg_version:
-                    pyp_request_url = "https://pypi.python.org/pypi/{}/{}/json".format(pkg_name, pkg_version)
-                    package_online_info = utils.request("GET", pyp_request_url)
-                    if "info" in package_online_info:
-                        info = package_online_info["info"]
-                        package["author"] = info["author"]
-                        package["version"] = info["version"]
-                        package["author_email"] = info["author_email"]
-                        package["license"] = info["license"]
-                        package["home-page"] = info["home_page"]
+                logger.info("{}: no archive in wheelhouse".format(package["name"]))
+        if not package_archives:
+            return
+        results = archives.read_archives(package_archives.values())
+        for package in package_details:
+            result = results.get(package_archives.get(id(package)))
+            if result is not None:
+                package["archive"] = result
+
+    def _get_package_details(self, package):
+        """
+        Get license details of a single package
+        :param package:
+        :return:
+        """
+        pkg_name = package["name"]
+        if self._deadline_passed():
+            return
+        pkg_version = package["version_specific"][2:] if "version_specific" in package else None
+        archive = package.pop("archive", None)
+        installed_pkg = self.environment.get(pkg_name) if package["installed_version"] else None
+        # the license file shipped with the installed distribution needs no network at all
+        local_license = installed_pkg.license_text() if installed_pkg is not None else None
+        stored = self._lookup_result(package) if local_license is None else None
+        if stored is not None:
+            # resolved by an earlier run, skip the network
+            logger.info("{}: using stored license result".format(pkg_name))
+            package.update(stored["metadata"])
+            package["stored_result"] = stored
+            return
+        if archive is not None and local_license is None:
+            # metadata and license text come from the wheelhouse archive
+            package.update(archive["metadata"])
+            package["archive_license"] = archive["license_text"]
+            return
+        if package["installed_version"]:
+            if installed_pkg is not None:
+                package.update(installed_pkg.metadata)
+                if local_license is not None:
+                    package["local_license_file"], package["local_license"] = local_license
+            else:
+                self._update_from_working_set(package)
+            if "home-page" in package:
+                logger.info("{}: Cannot find link to license home page.\n".format(pkg_name))
+        else:
+            if pkg_name and pkg_version:
+                try:
+                    info = self._pypi_info(pkg_name, pkg_version)
+                except DeadlineExceeded as exp:
+                    logger.error("{}: {}".format(pkg_name, exp))
+                    return
+                except RequestException as exp:
+                    # reported as unresolved when the license is searched
+                    logger.error("{}: PyPI details unavailable - {}".format(pkg_name, exp))
+                    package["error"] = str(exp)
+                    package["unavailable_host"] = self._failed_host(exp)
+                    return
+                if info:
+                    self._update_from_pypi_info(package, info)
                 else:
-                    logger.error("Missing package name/version: {} - {}".format(pkg_name, pkg_version))
-        return package_details
+                    logger.info("{}: no PyPI details for version {}".format(pkg_name, pkg_version))
+            else:
+                logger.error("Missing package name/version: {} - {}".format(pkg_name, pkg_version))
+
+    def _pypi_info(self, name, version):
+        """
+        PyPI details of a release, from the local PyPI metadata index or the PyPI server
+        :param name:
+        :param version:
+        :return: PyPI info dict, None when it is not found
+        """
+        key = (utils.normalize_name(name), version)
+        info = self._pypi_infos.get(key, _MISSING)
+        if info is not _MISSING:
+            return info
+        info = None
+        # Look up details in the local PyPI metadata index
+        if self.pypi_index is not None:
+            info = self.pypi_index.get(name, version)
+        # Fetch details from PyPI server
+        if info is None and not self.offline:
+            pyp_request_url = "{}/{}/{}/json".format(self.pypi_url, name, version)
+            package_online_info = utils.request("GET", pyp_request_url, client=self.http_client)
+            info = package_online_info.get("info")
+        self._pypi_infos.set(key, info)
+        return info
+
+    def _find_release(self, requirement):
+        """
+        Newest PyPI release that satisfies a requirement
+        :param requirement: pkg_resources.Requirement
+        :return: version, None when no release is known
+        """
+        name = requirement.project_name
+        versions = []
+        if self.pypi_index is not None:
+            versions = self.pypi_index.versions(name)
+        if not versions and not self.offline:
+            document = utils.request("GET", "{}/{}/json".format(self.pypi_url, name), client=self.http_client)
+            info = document.get("info") or {}
+            if info.get("version") and info["version"] in requirement:
+                self._pypi_infos.set((utils.normalize_name(name), info["version"]), info)
+                return info["version"]
+            versions = list(document.get("releases") or {})
+        versions = [version for version in versions if version in requirement]
+        return max(versions, key=pkg_resources.parse_version) if versions else None
+
+    def _expand_dependencies(self, package_details):
+        """
+        Add the transitive dependencies of the requirements
+        :param package_details: top level packages
+        :return: top level packages followed by their dependencies
+        """
+        requirements = []
+        for package in package_details:
+            extras = "[{}]".format(",".join(package["extras"])) if package.get("extras") else ""
+            try:
+                requirements.append(pkg_resources.Requirement.parse(
+                    package["name"] + extras + package.get("version_specific", "")))
+            except ValueError as exp:
+                logger.error("{}: cannot expand dependencies - {}".format(package["name"], exp))
+        dependencies = []
+        for requirement, version, required_by in self.dependency_resolver.closure(requirements):
+            installed_version = self.environment.version(requirement.project_name)
+            dependency = {
+                "name": requirement.project_name,
+                "line_no": None,
+                "requirement": str(requirement),
+                "required_by": required_by,
+                "installed_version": installed_version,
+                "editable": False,
+                "link": None
+            }
+            if version and not installed_version:
+                dependency["version_specific"] = "=={}".format(version)
+            dependencies.append(dependency)
+        logger.info("{} requirement(s) have {} transitive dependencies".format(len(package_details), len(dependencies)))
+        return package_details + dependencies
+
+    @staticmethod
+    def _update_from_pypi_info(package, info):
+        package["author"] = info.get("author")
+        package["version"] = info.get("version")
+        package["author_email"] = info.get("author_email")
+        package["license"] = info.get("license")
+        package["home-page"] = info.get("home_page")
+        package["download-url"] = info.get("download_url")
+        package["project_urls"] = info.get("project_urls") or {}
+        package["classifiers"] = info.get("classifiers") or []
+
+    @staticmethod
+    def _update_from_working_set(package):
+        """
+        Read metadata through pkg_resources for distributions the index does not cover (zipped eggs, egg-links)
+        :param package:
+        """
+        try:
+            installed_pkg = pkg_resources.get_distribution(package["name"])
+        except pkg_resources.DistributionNotFound:
+            return
+        for meta_file in meta_files_to_check:
+            if not installed_pkg.has_metadata(meta_file):
+                continue
+            pkg_meta_data = installed_pkg.get_metadata(meta_file)
+            message = message_from_string(pkg_meta_data)
+            meta_data = {k.lower(): v for k, v in dict(message).iteritems()}
+            meta_data["classifiers"] = message.get_all("Classifier") or []
+            meta_data["project_urls"] = message.get_all("Project-URL") or []
+            package.update(meta_data)
+
+    def _prefetch_github_licenses(self, package_details):
+        """
+        Fetch the licenses of every GitHub repository referenced by the packages with batched GraphQL requests
+        :param package_details:
+        """
+        if not self.gh_token:
+            logger.warning("Batched GitHub lookups need a GitHub token, falling back to one request per repository")
+            return
+        slugs = set()
+        for package in package_details:
+            if "stored_result" in package or "local_license" in package:
+                continue
+            for _, repo_url in repo_url_candidates(package):
+                if "github.com" in utils.parse_url(repo_url).lower():
+                    slug = repo_slug(repo_url)
+                    if slug:
+                        slugs.add(slug)
+        if not slugs:
+            return
+        logger.info("Fetching licenses of {} GitHub repositories in batches".format(len(slugs)))
+        try:
+            self._github_prefetch.update(self.github_graphql.fetch_licenses(slugs))
+        except RateLimitExhausted as exp:
+            logger.error("GitHub rate limit exhausted while fetching licenses in batch: %s" % exp)
+        except Exception as exp:
+            logger.error("Failed to fetch GitHub licenses in batch: %s" % exp)
 
     def search_router(self, package_details):
         """
@@ -111,62 +821,234 @@ class Manager(object):
         :param package_details:
         :return:
         """
-        for package in package_details:
-            home_url = package["home-page"] if "home-page" in package else None
-            if not home_url or str(home_url).lower() == "unknown":
-                continue
-            name = package["name"]
-            author = package["author"]
-            license_name = package["license"] if "license" in package else None
-            domain_name = utils.parse_url(home_url).lower()
-            found = False
-            # Get license from github repo
-            if "github.com" in domain_name:
-                license_content = self._get_github_license(home_url)
-                if license_content:
-                    self._create_license_file(name, license_content)
-                    found = True
+        self._map(self._route_package, package_details)
 
-            # Get license from bitbucket repo
-            if "bitbucket.org" in domain_name:
-                license_content = self.bitbucket_repo_search(home_url)
-                if license_content:
-                    self._create_license_file(name, license_content)
-                    found = True
+    def _route_package(self, package):
+        """
+        Find and write the license file of a single package
+        :param package:
+        :return:
+        """
+        name = package["name"]
+        stored = package.pop("stored_result", None)
+        if stored is not None:
+            package["strategy"] = stored["strategy"]
+            package["repo_url"] = stored["repo_url"]
+            if stored["found"]:
+                self._write_license(package, stored["license_text"])
+            elif stored["strategy"] == "template":
+                # only the stored metadata is kept for a template, it is generated again from it
+                result = self._template_license(package)
+                if result:
+                    self._write_license(package, result[2])
+            return
+        if self._deadline_passed():
+            package["error"] = "Run deadline passed"
+            self.unresolved.append((name, "deadline exceeded"))
+            return
+        unavailable_host = package.pop("unavailable_host", None)
+        if unavailable_host:
+            self.unresolved.append((name, "{} unavailable".format(unavailable_host)))
+            return
+
+        try:
+            with self._timed("search", package):
+                result = self._search_license(package)
+        except RateLimitExhausted as exp:
+            # do not fall back to a generated license or remember the package as unresolvable
+            logger.error("{}: {}".format(name, exp))
+            package["error"] = str(exp)
+            self.unresolved.append((name, "GitHub rate limit exhausted"))
+            return
+        except DeadlineExceeded as exp:
+            logger.error("{}: {}".format(name, exp))
+            package["error"] = str(exp)
+            self.unresolved.append((name, "deadline exceeded"))
+            return
+        except RequestException as exp:
+            # a failing or skipped host ends the search of this package only, nothing is stored for it
+            host = self._failed_host(exp)
+            logger.error("{}: {} unavailable - {}".format(name, host, exp))
+            package["error"] = str(exp)
+            self.unresolved.append((name, "{} unavailable".format(host)))
+            return
+        if result:
+            package["strategy"], package["repo_url"], license_content = result
+            self._write_license(package, license_content)
+        else:
+            license_content = None
+        self._store_result(package, license_content)
+
+    @staticmethod
+    def _failed_host(exp):
+        """
+        :param exp: RequestException of a failed request
+        :return: host of the request
+        """
+        request = getattr(exp, "request", None)
+        return utils.parse_url(request.url) if request is not None and request.url else "unknown host"
 
-            # check if the homepage is on readthedocs and then parse for repo url
-            if not found:
-                extracted_url = self.extract_home_page_urls(home_url)
+    def _search_license(self, package):
+        """
+        Try the license sources of a package in order
+        :param package:
+        :return: tuple of strategy name, repository url and license content, None when nothing is found
+        """
+        local_license = package.pop("local_license", None)
+        if local_license:
+            return "installed", None, local_license
+        archive_license = package.pop("archive_license", None)
+        if archive_license:
+            return "wheelhouse", None, archive_license
+        home_url = package["home-page"] if "home-page" in package else None
+        candidates = repo_url_candidates(package)
+        if not candidates and (not home_url or str(home_url).lower() == "unknown"):
+            return None
+        if self.offline:
+            return self._template_license(package)
+        attempts = self._search_attempts(package, candidates)
+        if self.hedge:
+            # the best ranked source that found the license wins, as in a serial run
+            # errors end the search at their rank, as they do in a serial run
+            # searches still in flight when the result is known stop at their next request
+            found = first_success(lambda search: search(), attempts, stagger=self.hedge_stagger,
+                                  deadline=self.hedge_deadline,
+                                  fatal=(RateLimitExhausted, DeadlineExceeded, RequestException))
+            if found:
+                return found[1]
+        else:
+            for search in attempts:
+                result = search()
+                if result:
+                    return result
+        if self._deadline_passed():
+            # sources that swallow request errors may have been cut short, a template would hide that
+            raise DeadlineExceeded("Run deadline passed while searching the license of {}".format(package["name"]))
+
+        # Still, if not found generate license file
+        return self._template_license(package)
+
+    def _search_attempts(self, package, candidates):
+        """
+        License sources of a package in precedence order
+        :param package:
+        :param candidates: repository urls named by the metadata
+        :return: list of callables returning a tuple of strategy name, repository url and license content or None
+        """
+        name = package["name"]
+        home_url = package["home-page"] if "home-page" in package else None
+        # repositories without license, the later sources do not ask them again
+        tried = set()
+        attempts = []
+
+        # Get license from the repositories named by the metadata, no page has to be fetched
+        for source, repo_url in candidates:
+            if source == "home_page":
+                source = "github" if "github.com" in repo_url else "bitbucket"
+            attempts.append(partial(self._repo_attempt, source, repo_url, tried))
+
+        # Ask Read the Docs which repository the documentation is built from
+        slug = readthedocs_slug(package)
+        if slug:
+            def from_readthedocs():
+                repo_url = readthedocs_repo_url(slug, client=self.http_client, api_url=self.readthedocs_api_url)
+                return self._repo_attempt("readthedocs", repo_url, tried) if repo_url else None
+            attempts.append(from_readthedocs)
+
+        # parse the home page for repo links, unless it is a repository page already
+        if home_url and not normalize_repo_url(home_url):
+            def from_home_page():
+                extracted_url = self.extract_home_page_urls(home_url, client=self.http_client)
                 if extracted_url and name in extracted_url:
+                    return self._repo_attempt("home_page", extracted_url, tried)
+                return None
+            attempts.append(from_home_page)
+
+        # Again open search in github
+        def from_github_search():
+            search_result = self.github_repo_search(name)
+            if search_result:
+                license_content = self._get_github_license(search_result["url"])
+                if license_content:
+                    return "github_search", search_result["url"], license_content
+            return None
+        attempts.append(from_github_search)
+        return attempts
+
+    def _repo_attempt(self, strategy, repo_url, tried):
+        """
+        License of a repository that was not found without license before
+        :param strategy: name of the source that named the repository
+        :param repo_url:
+        :param tried: lower case urls of the repositories without license, repo_url is added when it has none
+        :return: tuple of strategy name, repository url and license content, None when it is not found
+        """
+        if repo_url.lower() in tried:
+            return None
+        license_content = self._get_repo_license(repo_url)
+        if not license_content:
+            tried.add(repo_url.lower())
+            return None
+        return strategy, repo_url, license_content
+
+    def _get_repo_license(self, repo_url):
+        """
+        License of a GitHub or Bitbucket repository
+        :param repo_url:
+        :return: license content, None or False when it is not found
+        """
+        if "github.com" in repo_url:
+            return self._get_github_license(repo_url)
+        if "bitbucket.org" in repo_url:
+            return self.bitbucket_repo_search(repo_url)
+        return None
+
+    def _template_license(self, package):
+        license_name = package["license"] if "license" in package else None
+        classifiers = package.get("classifiers")
+        if license_name or classifiers:
+            license_content = self.generate_license(license_name, package["name"], package.get("author"), "2018",
+                                                    classifiers=classifiers)
+            if license_content:
+                return "template", None, license_content
+        return None
 
-                    if "github.com" in extracted_url:
-                        license_content = self._get_github_license(extracted_url)
-                        if license_content:
-                            found = True
-                            self._create_license_file(name, license_content)
-                    elif "bitbucket.org" in extracted_url:
-                        license_content = self.bitbucket_repo_search(extracted_url)
-                        if license_content:
-                            found = True
-                            self._create_license_file(name, license_content)
-                    else:
-                        found = False
-
-            # Again open search in github
-            if not found:
-                search_result = self.github_repo_search(name)
-                if search_result:
-                    license_content = self._get_github_license(search_result["url"])
-                    if license_content:
-                        found = True
-                        self._create_license_file(name, license_content)
-
-            # Still, if not found generate license file
-            if not found:
-                if license_name:
-                    license_content = self.generate_license(license_name, name, author, "2018")
-                    if license_content:
-                        self._create_license_file(name, license_content)
+    @staticmethod
+    def _package_version(package):
+        """
+        Installed or pinned version of a package
+        :param package:
+        :return: version string, None when the requirement is not pinned
+        """
+        if package.get("installed_version"):
+            return str(package["installed_version"])
+        version_specific = package.get("version_specific")
+        if version_specific and version_specific.startswith("=="):
+            return version_specific[2:]
+        return None
+
+    def _lookup_result(self, package):
+        if self.store is None:
+            return None
+        version = self._package_version(package)
+        if not version:
+            return None
+        return self.store.get(package["name"], version)
+
+    def _store_result(self, package, license_content):
+        # an offline run has not searched
+        if self.store is None or self.offline:
+            return
+        version = self._package_version(package)
+        if not version:
+            return
+        # a template only stands in for a license that was not found: it is stored as a negative entry so the
+        # search is repeated once negative_ttl expires, and generated again from the metadata until then
+        found = bool(license_content) and package.get("strategy") != "template"
+        metadata = dict((field, package[field]) for field in stored_fields if field in package)
+        self.store.put(package["name"], version, found=found, strategy=package.get("strategy"),
+                       repo_url=package.get("repo_url"), license_text=license_content if found else None,
+                       metadata=metadata)
 
     def github_repo_search(self, repo_name):
         """
@@ -175,9 +1057,10 @@ class Manager(object):
         :return:
         """
         try:
-            search_url = "https://api.github.com/search/repositories"
+            search_url = "{}/search/repositories".format(self.github_api_url)
             query_params = {"q": str(repo_name)}
-            search_results = utils.request("GET", search_url, params=query_params, custom_headers=self.custom_header)
+            search_results = utils.request("GET", search_url, params=query_params, custom_headers=self.custom_header,
+                                           client=self.http_client)
             if "total_count" in search_results and search_results["total_count"] > 0:
                 # select search result with highest score. Default sorted based on score.
                 item = search_results["items"][0]
@@ -189,68 +1072,135 @@ class Manager(object):
             else:
                 logger.info("No search results found")
                 return None
+        except (RateLimitExhausted, DeadlineExceeded, RequestException):
+            # a failed search is not "no repository", the package must not fall back to a template
+            raise
         except Exception as exp:
             logger.error("Failed to search Github repository: %s" % exp)
             return None
 
     def bitbucket_repo_search(self, repo_url):
         """
-        Search Bitbucket repositories
+        Find the license of a Bitbucket repository, well known license file names are fetched from the raw file
+        host first and the source listing is only read when none of them exists
         :param repo_url:
         :return:
         """
         try:
             if "https://bitbucket.org/" in repo_url:
-                repo_uri = str(repo_url).replace("https://bitbucket.org/", "").strip()
-                search_url = "https://api.bitbucket.org/2.0/repositories/{}/src".format(repo_uri)
+                repo_uri = "/".join(str(repo_url).replace("https://bitbucket.org/", "").strip().split("/")[:2])
+                license_content = self._probe_license_files("{}/{}/raw/HEAD/{{}}".format(self.bitbucket_raw_url,
+                                                                                         repo_uri))
+                if license_content:
+                    return license_content
+                search_url = "{}/repositories/{}/src".format(self.bitbucket_api_url, repo_uri)
                 query_params = {"pagelen": 100}
-                search_results = utils.request("GET", search_url, params=query_params)
-                if "values" in search_results:
-                    repo_files = search_results["values"]
-                    license_file = [lice["links"]["self"]["href"] for lice in repo_files
-                                    if "license" in str(lice["path"]).lower()]
-                    if license_file:
-                        license_file_url = license_file[0]
-                        license_content = self._get_bitbucket_license(license_file_url)
-                        return license_content
-                    else:
-                        return None
-                else:
-                    logger.info("No search results found")
-                    return None
+                license_files = []
+                for _ in range(MAX_LISTING_PAGES):
+                    search_results = utils.request("GET", search_url, params=query_params, client=self.http_client)
+                    if "values" not in search_results:
+                        break
+                    license_files.extend((lice["path"], lice["links"]["self"]["href"])
+                                         for lice in search_results["values"] if self._is_license_path(lice["path"]))
+                    # the next page url carries the query
+                    search_url, query_params = search_results.get("next"), None
+                    if not search_url:
+                        break
+                if license_files:
+                    _, license_file_url = min(license_files, key=lambda entry: license_rank(entry[0]))
+                    return self._get_bitbucket_license(license_file_url, client=self.http_client)
+                logger.info("No license file found in {}".format(repo_url))
+                return None
         except Exception as exp:
             logger.error("Failed to search Bitbucket repository for [%s]: %s" % (repo_url, exp))
             return None
 
+    @staticmethod
+    def _is_license_path(path):
+        path = str(path)
+        return "license" in path.lower() or bool(license_member_pattern.match(posixpath.basename(path)))
+
+    def _probe_license_files(self, raw_url):
+        """
+        Look for the well known license file names of a repository, the best ranked file that exists wins and names
+        ranked after it are not requested. A name is probed once the names ranked before it are missing or had
+        their head start. The best ranked name, the usual one, is downloaded at once, the others are probed with
+        HEAD requests and only the winner is downloaded.
+        :param raw_url: raw file url of the repository with a {} placeholder for the file name
+        :return: license text, None when none of the files exists
+        """
+        def probe(file_name):
+            if file_name == license_file_names[0]:
+                return self._read_raw_file(raw_url.format(file_name))
+            return self._raw_file_exists(raw_url.format(file_name))
+
+        found = first_success(probe, license_file_names, concurrency=PROBE_CONCURRENCY, stagger=PROBE_STAGGER,
+                              join=True)
+        if not found:
+            return None
+        index, result = found
+        return result if index == 0 else self._read_raw_file(raw_url.format(license_file_names[index]))
+
+    def _raw_file_exists(self, file_url):
+        return bool(utils.request("HEAD", file_url, json_output=False, client=self.http_client))
+
+    def _read_raw_file(self, file_url):
+        """
+        Download a raw file, streamed so that no more than MAX_LICENSE_BYTES of it are read
+        :return: text of the file, empty when it does not exist
+        """
+        content = utils.request("GET", file_url, json_output=False, stream=True, max_bytes=MAX_LICENSE_BYTES,
+                                client=self.http_client)
+        if not content:
+            return u""
+        return content if isinstance(content, unicode) else content.decode("utf-8", "replace")
+
     def _get_github_license(self, home_url):
+        slug = repo_slug(home_url)
+        prefetched = self._github_prefetch.get(slug, _MISSING) if slug else _MISSING
+        if prefetched is not _MISSING:
+            if prefetched is None:
+                return False
+            if prefetched["text"]:
+                return prefetched["text"]
+            # the license file has an unusual name, let the REST license endpoint find it
+        elif slug:
+            # raw file requests do not count against the API rate limit
+            license_content = self._probe_license_files("{}/{}/HEAD/{{}}".format(self.github_raw_url, slug))
+            if license_content:
+                return license_content
         logger.info("Downloading license file from Github")
-        if "api.github.com/repos" not in home_url:
+        if not home_url.startswith(self.github_api_url + "/repos"):
             url_path = utils.parse_url(home_url, only_domain=False, only_path=True).lower()
-            license_url = "https://api.github.com/repos{}/license".format(url_path)
+            license_url = "{}/repos{}/license".format(self.github_api_url, url_path)
         else:
             url_path = home_url
             license_url = "{}/license".format(url_path)
 
-        license_response = utils.request("GET", license_url, custom_headers=self.custom_header)
+        license_response = utils.request("GET", license_url, custom_headers=self.custom_header,
+                                         client=self.http_client)
         if "content" in license_response:
             license_content = license_response["content"]
-            decode_license_txt = base64.b64decode(license_content)
+            # license texts are unicode everywhere else, non UTF-8 bytes must not end the run
+            decode_license_txt = base64.b64decode(license_content).decode("utf8", "replace")
             return decode_license_txt
         else:
             return False
 
     @staticmethod
-    def _get_bitbucket_license(license_url):
+    def _get_bitbucket_license(license_url, client=None):
         logger.info("Downloading license file from Bitbucket")
-        license_content = utils.request("GET", license_url, json_output=False, stream=True)
+        license_content = utils.request("GET", license_url, json_output=False, stream=True, client=client)
         return license_content
 
     def _create_directory_structure(self):
+        with self._dirs_lock:
+            return self._create_directories()
+
+    def _create_directories(self):
         if not self.created_dirs:
             logger.info("creating output directory structure")
-            now = datetime.datetime.now().time().isoformat().replace(":", "").replace(".", "")
-            output_dir_name = "pylicense_{}".format(now)
-            license_files = os.path.join(output_dir_name, "license_files")
+            license_files = os.path.join(self._output_dir_name(), "license_files")
             output_path = os.path.join(self.output_path, license_files)
             create_dirs = utils.create_path(output_path)
             if create_dirs:
@@ -262,6 +1212,15 @@ class Manager(object):
         else:
             return self.created_dirs
 
+    def _output_dir_name(self):
+        if self._output_dir is None:
+            if self.incremental:
+                self._output_dir = "pylicense"
+            else:
+                now = datetime.datetime.now().time().isoformat().replace(":", "").replace(".", "")
+                self._output_dir = "pylicense_{}".format(now)
+        return self._output_dir
+
     def _create_license_file(self, package_name, license_content):
         """
         Create license file with specified package name
@@ -271,91 +1230,84 @@ class Manager(object):
         self._create_directory_structure()
         license_file_path = os.path.join(self.created_dirs, "{}_license.txt".format(package_name))
         utils.write_to_file(license_file_path, license_content)
+        return license_file_path
+
+    def _write_license(self, package, license_content):
+        if self._defer_writes:
+            # written to the output tree of every requirements file that needs the package
+            package["license_text"] = license_content
+            package["license_file"] = "{}_license.txt".format(package["name"])
+        elif self.archive is not None:
+            with self._timed("write", package):
+                self._archive_license(package, license_content)
+        else:
+            with self._timed("write", package):
+                license_file_path = self._create_license_file(package["name"], license_content)
+            package["license_file"] = os.path.basename(license_file_path)
+        package["license_sha256"] = content_hash(license_content)
+        self._detect_license(package, license_content)
+
+    def _detect_license(self, package, license_content):
+        """
+        Identify the license text by its fingerprint, identical texts are classified once
+        """
+        sha256 = package["license_sha256"]
+        detected = self._detected.get(sha256, _MISSING)
+        if detected is _MISSING:
+            with self._timed("detect", package):
+                detected = self.license_index.classify(license_content)
+            self._detected.set(sha256, detected)
+        package["detected_license"], package["detected_confidence"] = detected or (None, None)
+        declared = classify_license(package.get("license"), package.get("classifiers"))
+        if detected and declared and declared[0] != detected[0]:
+            logger.info("{}: license text is {} but the metadata declares {}".format(
+                package["name"], detected[0], declared[0]))
+
+    def _archive_license(self, package, license_content, tree_name=None):
+        """
+        Stream a license file into the archive, under the tree of a requirements file for a batch
+        """
+        package["license_file"] = "{}_license.txt".format(package["name"])
+        member = posixpath.join(tree_name or "", "license_files", package["license_file"])
+        self.archive.add(member, license_content, name=package["name"], version=package.get("version"),
+                         strategy=package.get("strategy"), repo_url=package.get("repo_url"),
+                         sha256=content_hash(license_content), tree=tree_name)
 
     @staticmethod
-    def extract_home_page_urls(home_page_url):
+    def extract_home_page_urls(home_page_url, client=None, max_bytes=MAX_HOME_PAGE_BYTES):
         """
-        Extract urls from home page and then filter urls for Github and Bitbucket
+        Extract urls from home page and then filter urls for Github and Bitbucket. The page is parsed while it
+        downloads and the download stops once one repository is linked often enough or max_bytes were read.
         :param home_page_url:
+        :param client: HttpClient to send the request with
+        :param max_bytes: most bytes of the home page to read
         :return: repo url
         """
-        # Fetch html content from home page url
+        scanner = RepoLinkScanner()
         try:
-            html_page = utils.request("GET", home_page_url, json_output=False, stream=True)
+            chunks = utils.stream_text(home_page_url, client=client, max_bytes=max_bytes)
+            try:
+                for chunk in chunks:
+                    scanner.feed(chunk)
+                    if scanner.done:
+                        break
+            finally:
+                chunks.close()
+        except HTMLParseError as exp:
+            # keep the links read before the broken markup
+            logger.error("Error in parsing HTML for urls from %s\n%s" % (home_page_url, exp))
         except Exception as exp:
             logger.error("Error in extracting urls from %s\n%s" % (home_page_url, exp))
             return None
-
-        # parse html content
-        try:
-            soup = BeautifulSoup(html_page, 'html.parser')
-        except Exception as exp:
-            logger.error("Error in parsing HTML for urls from %s\n%s" % (home_page_url, exp))
-            return None
-
-        host_name_list = list()
-        url_path_list = list()
-
-        # loop through all extracted urls
-        for link in soup.findAll('a', attrs={'href': re.compile("^(http|https)://(github.com|bitbucket.org)/")}):
-            href = link.get('href')
-            if href != "https://github.com/snide/sphinx_rtd_theme":
-                parsed_url = urlparse.urlparse(href)
-                url_path_list.append(parsed_url.path)
-                host_name_list.append("{}://{}".format(parsed_url.scheme, parsed_url.netloc))
-
-        if url_path_list and host_name_list:
-
-            # retain common url paths
-            common_path_list = list(set([x for x in url_path_list if url_path_list.count(x) > 1]))
-            if common_path_list:
-                url_path_list = common_path_list
-            else:
-                url_path_list = ["/".join(utils.longest_prefix(url_path_list).strip("/").split("/")[:2])]
-
-            # get common prefix from common elements
-            url_path_list = [path.strip("/") for path in url_path_list if len(path.strip("/").split("/")) <= 2]
-            valid_path = utils.longest_prefix(url_path_list)
-            # valid_path = "/".join(common_path.strip("/").split("/")[:2])
-            if valid_path:
-                valid_path = "/" + valid_path
-
-            # retain common host names
-            host_names = [max(host_name_list)]
-            if host_names:
-                host_name_list = host_names
-
-            # get common prefix from common elements
-            hostname = utils.longest_prefix(host_name_list)
-
-            # join path
-            if hostname and valid_path:
-                full_path = hostname + valid_path
-                return full_path
-            else:
-                return None
-        else:
-            return None
+        return scanner.repo_url()
 
     @staticmethod
-    def generate_license(license_name, project_name, organization, year):
-        if all((license_name, project_name, organization, year)):
-            templates = ['agpl3', 'apache', 'bsd', 'bsd3', 'cc0', 'cc_by', 'cc_by_nc', 'cc_by_nc_nd',
-                         'cc_by_nc_sa', 'cc_by_nd', 'cc_by_sa', 'cddl', 'epl', 'gpl2', 'gpl3', 'isc', 'lgpl',
-                         'mit', 'mpl', 'unlicense', 'wtfpl', 'x11', 'zlib']
-            license_name = str(license_name).lower().replace("-", "_")
-            try:
-                template_name = next(license for license in templates if license in license_name)
-            except StopIteration:
-                template_name = None
-
+    def generate_license(license_name, project_name, organization, year, classifiers=None):
+        if all((license_name or classifiers, project_name, organization, year)):
+            match = classify_license(license_name, classifiers)
+            template_name = match[1] if match else None
             if template_name:
-                tmpl_env = Environment(
-                    loader=PackageLoader('pylicense_manager', 'templates'),
-                    undefined=StrictUndefined)
-                license_template = tmpl_env.get_template(str(template_name) + ".txt")
-                license_content = license_template.render(project=project_name, organization=organization, year=year)
-                return license_content
+                return render_license(template_name, project_name, organization, year)
             else:
                 return None
         else:
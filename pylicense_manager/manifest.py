@@ -0,0 +1,94 @@
+# coding=utf-8
+"""
+Manifest of an incremental output directory.
+
+For every requirement the manifest records the requirement line, the installed and resolved versions, the
+strategy that found the license, the license file and the sha256 of its content. A requirement whose line and
+installed version did not change and whose license file is intact is not resolved again.
+"""
+import hashlib
+import json
+import logging
+
+import os
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_FORMAT = 1
+
+
+def content_hash(content):
+    """
+    sha256 of a license text as it is written to disk
+    :param content: unicode license text, a byte string is hashed as it is
+    :return: hex digest
+    """
+    return hashlib.sha256(content.encode("utf8") if isinstance(content, unicode) else content).hexdigest()
+
+
+def file_hash(path):
+    try:
+        with open(path, "rb") as license_file:
+            return hashlib.sha256(license_file.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+
+
+class Manifest(object):
+
+    def __init__(self, path):
+        """
+        :param path: manifest file, created on save when it does not exist
+        """
+        self.path = path
+        self.entries = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as manifest_file:
+                data = json.load(manifest_file)
+        except (IOError, OSError, ValueError) as exp:
+            logger.error("Ignoring unreadable manifest %s - %s" % (self.path, exp))
+            return
+        if data.get("format") != MANIFEST_FORMAT:
+            logger.info("Ignoring manifest %s of another format" % self.path)
+            return
+        self.entries = data.get("packages") or {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, entry):
+        self.entries[key] = entry
+
+    def remove(self, key):
+        return self.entries.pop(key, None)
+
+    def is_current(self, key, line, installed_version, directory):
+        """
+        Whether the recorded result of a requirement can be reused
+        :param key: normalized requirement name
+        :param line: requirement line
+        :param installed_version: installed version, None when not installed
+        :param directory: directory of the license files
+        :return:
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry.get("line") != line or entry.get("installed_version") != installed_version:
+            return False
+        if entry.get("file"):
+            # the license file was removed or edited since the last run
+            return file_hash(os.path.join(directory, entry["file"])) == entry.get("sha256")
+        return True
+
+    def save(self):
+        temp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(temp_path, "w") as manifest_file:
+            json.dump({"format": MANIFEST_FORMAT, "packages": self.entries}, manifest_file, indent=2,
+                      sort_keys=True)
+        os.rename(temp_path, self.path)
@@ -0,0 +1,93 @@
+# coding=utf-8
+import json
+import logging
+import sqlite3
+
+import os
+
+from pylicense_manager import utils
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+class PyPIMetadataIndex(object):
+    """
+    Prebuilt PyPI metadata loaded once into memory, for runs without network access.
+
+    The index is one of
+      - a directory of PyPI JSON responses (``*.json``, searched recursively)
+      - a JSON lines file, one PyPI JSON response or ``info`` object per line
+      - a SQLite database (``.sqlite``/``.db``) with a ``metadata(name, version, json)`` table
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._index = {}
+        self._versions = None
+        if os.path.isdir(path):
+            self._load_directory(path)
+        elif os.path.splitext(path)[1] in (".sqlite", ".db"):
+            self._load_sqlite(path)
+        else:
+            self._load_json_lines(path)
+        logger.info("Loaded {} package versions from PyPI metadata index {}".format(len(self._index), path))
+
+    def _add(self, document):
+        info = document.get("info", document) if isinstance(document, dict) else None
+        if not info or not info.get("name") or not info.get("version"):
+            return
+        self._index[(utils.normalize_name(info["name"]), info["version"])] = info
+
+    def _load_directory(self, path):
+        for dir_path, _, file_names in os.walk(path):
+            for file_name in file_names:
+                if not file_name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(dir_path, file_name)) as json_file:
+                        self._add(json.load(json_file))
+                except (IOError, ValueError) as exp:
+                    logger.error("Error in reading PyPI metadata from %s - %s" % (file_name, exp))
+
+    def _load_json_lines(self, path):
+        with open(path) as json_file:
+            for line in json_file:
+                line = line.strip()
+                if line:
+                    self._add(json.loads(line))
+
+    def _load_sqlite(self, path):
+        connection = sqlite3.connect(path)
+        try:
+            for name, version, document in connection.execute("SELECT name, version, json FROM metadata"):
+                document = json.loads(document)
+                info = document.get("info", document)
+                info.setdefault("name", name)
+                info.setdefault("version", version)
+                self._add(info)
+        finally:
+            connection.close()
+
+    def get(self, name, version):
+        """
+        :param name: package name
+        :param version: package version
+        :return: PyPI ``info`` dict, None when the index has no such release
+        """
+        return self._index.get((utils.normalize_name(name), version))
+
+    def versions(self, name):
+        """
+        :param name: package name
+        :return: versions of the package in the index
+        """
+        if self._versions is None:
+            versions = {}
+            for index_name, version in self._index:
+                versions.setdefault(index_name, []).append(version)
+            self._versions = versions
+        return self._versions.get(utils.normalize_name(name), [])
+
+    def __len__(self):
+        return len(self._index)
@@ -0,0 +1,147 @@
+# coding=utf-8
+"""
+Ranked parallel attempts where the best ranked success wins.
+
+:func:`first_success` runs an attempt per item on its own thread (a greenlet once gevent has patched the standard
+library). Its result is the first item in rank order that succeeded, so it does not depend on which request
+happened to answer first. As soon as an item succeeded and every item ranked before it failed, the result is
+returned. Items ranked after a success are not started, and the results of attempts still in flight are dropped.
+Threads cannot be cancelled from outside: an attempt whose result is dropped stops at its next
+:func:`check_cancelled` (the HTTP client calls it before every request), with ``join`` the call also waits for the
+request such an attempt has in flight.
+
+A stagger starts the items one after another, each only when the items ranked before it had their head start or
+failed already, so cheap early successes save the requests of the later items. A deadline bounds the wait, the
+attempts still in flight when it passes count as failures.
+"""
+import logging
+import threading
+import time
+from functools import partial
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+_PENDING = object()
+
+# settled check of the attempt running on the current thread
+_attempt = threading.local()
+
+
+class Cancelled(Exception):
+    """
+    Raised in an attempt whose result is dropped
+    """
+
+
+def check_cancelled():
+    """
+    Raise Cancelled when called from an attempt of first_success whose result can no longer be used, the attempt
+    stops instead of sending its next request. Attempts of a nested first_success stop with the outer attempt.
+    """
+    settled = getattr(_attempt, "settled", None)
+    if settled is not None and settled():
+        raise Cancelled("A better ranked attempt succeeded or the race ended")
+
+
+class _Fatal(object):
+    """
+    Exception of an attempt that ends the race at the rank of the attempt
+    """
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def first_success(func, items, concurrency=None, stagger=None, deadline=None, fatal=(), join=False):
+    """
+    Apply func to the ranked items in parallel and return the best ranked truthy result
+    :param func: attempt, an exception counts as a failure
+    :param items: items in rank order, best first
+    :param concurrency: most attempts running at once, all items by default
+    :param stagger: seconds between the starts of consecutive items, an item starts at once when every item ranked
+        before it failed
+    :param deadline: seconds to wait for the result, None waits for every attempt that can still win
+    :param fatal: exception types that are raised when every attempt ranked before the failing one failed, as in
+        a serial run
+    :param join: wait for the attempts still in flight before returning, their results are dropped
+    :return: tuple of item index and result, None when no attempt succeeded
+    """
+    items = list(items)
+    if not items:
+        return None
+    results = [_PENDING] * len(items)
+    state = {"next": 0, "best": None, "done": False}
+    condition = threading.Condition()
+    started = time.time()
+    outer_settled = getattr(_attempt, "settled", None)
+
+    def settled(index):
+        return state["done"] or (state["best"] is not None and state["best"] < index) or \
+            (outer_settled is not None and outer_settled())
+
+    def attempt():
+        while True:
+            with condition:
+                index = state["next"]
+                if index >= len(items) or settled(index):
+                    return
+                state["next"] += 1
+                while stagger:
+                    if settled(index):
+                        return
+                    remaining = started + index * stagger - time.time()
+                    if remaining <= 0 or _PENDING not in results[:index]:
+                        break
+                    condition.wait(remaining)
+            _attempt.settled = partial(settled, index)
+            try:
+                result = func(items[index])
+            except fatal as exp:
+                result = _Fatal(exp)
+            except Exception as exp:
+                logger.info("Attempt on %s failed - %s" % (items[index], exp))
+                result = None
+            finally:
+                _attempt.settled = None
+            with condition:
+                results[index] = result
+                if result and (state["best"] is None or index < state["best"]):
+                    state["best"] = index
+                condition.notify_all()
+
+    threads = []
+    for _ in range(min(concurrency or len(items), len(items))):
+        thread = threading.Thread(target=attempt)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    try:
+        with condition:
+            try:
+                while True:
+                    expired = deadline is not None and time.time() >= started + deadline
+                    for index, result in enumerate(results):
+                        if result is _PENDING:
+                            if expired:
+                                continue
+                            break
+                        if isinstance(result, _Fatal):
+                            raise result.exception
+                        if result:
+                            return index, result
+                    else:
+                        if expired:
+                            logger.info("No attempt succeeded within {} seconds".format(deadline))
+                        return None
+                    condition.wait(None if deadline is None else max(0.0, started + deadline - time.time()))
+            finally:
+                # items that were not started yet are not started anymore
+                state["done"] = True
+                condition.notify_all()
+    finally:
+        if join:
+            # outside of the condition, the attempts record their results under it
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,143 @@
+# coding=utf-8
+import logging
+import threading
+import time
+from urlparse import urlparse
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExhausted(Exception):
+    """
+    Every GitHub token is out of requests and the rate limit does not reset soon enough
+    """
+
+
+class _Budget(object):
+    """
+    Request budget of one token for one GitHub rate limit resource
+    """
+
+    def __init__(self):
+        self.remaining = None
+        self.reset = 0
+        self.next_at = 0
+
+
+class GithubScheduler(object):
+    """
+    Paces GitHub API requests by the X-RateLimit-Remaining/X-RateLimit-Reset and Retry-After headers and rotates
+    across several tokens. Each token has a separate budget per rate limit resource (core, search, graphql).
+    When every token is exhausted, requests wait for the earliest reset up to ``max_wait`` seconds and then fail
+    with RateLimitExhausted.
+    """
+
+    def __init__(self, tokens=None, max_wait=60, pace_below=50, hosts=("api.github.com",)):
+        """
+        :param tokens: GitHub tokens, an empty list sends anonymous requests
+        :param max_wait: longest wait in seconds for a rate limit reset
+        :param pace_below: spread the remaining requests of a budget over the time to its reset once fewer
+                           than this many are left
+        :param hosts: hosts (or host:port) the scheduler applies to
+        """
+        self.tokens = list(tokens or []) or [None]
+        self.max_wait = max_wait
+        self.pace_below = pace_below
+        self.hosts = set(hosts)
+        self._budgets = {}
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    def applies(self, request_url):
+        parsed_url = urlparse(request_url)
+        return (parsed_url.hostname or "").lower() in self.hosts or parsed_url.netloc.lower() in self.hosts
+
+    @staticmethod
+    def resource(request_url):
+        path = urlparse(request_url).path
+        if path.startswith("/search/"):
+            return "search"
+        if path.startswith("/graphql"):
+            return "graphql"
+        return "core"
+
+    def _budget(self, token, resource):
+        key = (token, resource)
+        if key not in self._budgets:
+            self._budgets[key] = _Budget()
+        return self._budgets[key]
+
+    def acquire(self, request_url):
+        """
+        Pick the token for a request, sleeping while the request has to be paced
+        :param request_url:
+        :return: token, None for anonymous requests
+        """
+        resource = self.resource(request_url)
+        while True:
+            with self._lock:
+                now = time.time()
+                token, wait = self._choose(resource, now)
+                if wait <= 0:
+                    budget = self._budget(token, resource)
+                    if budget.remaining is not None:
+                        budget.remaining -= 1
+                        if budget.remaining < self.pace_below and budget.reset > now:
+                            budget.next_at = now + (budget.reset - now) / max(budget.remaining, 1)
+                    return token
+            if wait > self.max_wait:
+                raise RateLimitExhausted(
+                    "GitHub {} rate limit exhausted for all {} token(s), resets in {} seconds".format(
+                        resource, len(self.tokens), int(wait)))
+            logger.info("Waiting %.1f seconds for the GitHub %s rate limit" % (wait, resource))
+            time.sleep(wait)
+
+    def _choose(self, resource, now):
+        """
+        :return: token with the most remaining requests and the seconds to wait before it may be used
+        """
+        if self._paused_until > now:
+            return None, self._paused_until - now
+        best_token, best_wait, best_remaining = None, None, None
+        for token in self.tokens:
+            budget = self._budget(token, resource)
+            if budget.remaining is not None and budget.remaining <= 0:
+                if budget.reset <= now:
+                    # the window has passed, the budget is full again
+                    budget.remaining = None
+                wait = budget.reset - now if budget.remaining is not None else 0
+            else:
+                wait = budget.next_at - now
+            remaining = budget.remaining if budget.remaining is not None else float("inf")
+            if best_wait is None or (max(wait, 0), -remaining) < (max(best_wait, 0), -best_remaining):
+                best_token, best_wait, best_remaining = token, wait, remaining
+        return best_token, best_wait
+
+    def update(self, token, request_url, response):
+        """
+        Record the rate limit headers of a response
+        :return: True when the request was rejected by the rate limit and should be sent again
+        """
+        headers = response.headers
+        budget_resource = headers.get("X-RateLimit-Resource") or self.resource(request_url)
+        with self._lock:
+            budget = self._budget(token, budget_resource)
+            if "X-RateLimit-Remaining" in headers:
+                try:
+                    budget.remaining = int(headers["X-RateLimit-Remaining"])
+                    budget.reset = float(headers.get("X-RateLimit-Reset", 0))
+                except ValueError:
+                    pass
+            if response.status_code not in (403, 429):
+                return False
+            if "Retry-After" in headers:
+                # secondary rate limit, applies to every token
+                try:
+                    self._paused_until = time.time() + float(headers["Retry-After"])
+                except ValueError:
+                    self._paused_until = time.time() + 60
+                return True
+            if budget.remaining == 0:
+                return True
+        return False
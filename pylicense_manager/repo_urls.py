@@ -0,0 +1,143 @@
+# coding=utf-8
+"""
+Repository url inference from package metadata, without fetching anything.
+
+The source repository is often named outright by the ``Project-URL`` entries of the metadata (or ``project_urls``
+of the PyPI JSON API), the ``git+`` link of a requirement or the download url. Those are tried before the home page
+has to be downloaded and scraped or the GitHub repository search is used.
+"""
+import logging
+import re
+from urlparse import urlparse
+
+from pylicense_manager import utils
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+READTHEDOCS_API_URL = "https://readthedocs.org/api/v2/project/"
+repo_hosts = ["github.com", "bitbucket.org"]
+# Project-URL labels naming the repository, most specific first, compared lower case without punctuation
+source_labels = ["source", "source code", "sourcecode", "repository", "code", "github", "bitbucket", "git"]
+# repository paths that are not owner/repo
+reserved_owners = ["sponsors", "orgs", "settings", "site", "about", "features", "marketplace"]
+github_pages_pattern = re.compile(r"^([a-z0-9-]+)\.github\.(io|com)$")
+readthedocs_pattern = re.compile(r"^([a-z0-9-]+)\.(readthedocs\.(io|org)|rtfd\.io)$")
+scp_pattern = re.compile(r"^[\w.-]+@([\w.-]+):(.+)$")
+
+
+def normalize_repo_url(url):
+    """
+    Repository url of a url pointing into a GitHub or Bitbucket repository, from ``git+https``, ``git://``,
+    ``git@host:owner/repo.git``, archive, tree or issue urls
+    :param url:
+    :return: https://<host>/<owner>/<repo>, None when the url is not in a repository
+    """
+    if not url or not isinstance(url, basestring):
+        return None
+    url = url.strip()
+    scp_match = scp_pattern.match(url)
+    if scp_match:
+        url = "https://{}/{}".format(*scp_match.groups())
+    url = re.sub(r"^(git|hg)\+", "", url)
+    parsed_url = urlparse(url)
+    host = parsed_url.netloc.lower().rsplit("@", 1)[-1].split(":")[0]
+    if host.startswith("www."):
+        host = host[4:]
+    parts = [part for part in parsed_url.path.split("@")[0].split("/") if part]
+    if host == "codeload.github.com":
+        host = "github.com"
+    elif host == "api.github.com" and parts[:1] == ["repos"]:
+        host, parts = "github.com", parts[1:]
+    elif host == "raw.githubusercontent.com":
+        host = "github.com"
+    pages_match = github_pages_pattern.match(host)
+    if pages_match:
+        # https://<owner>.github.io/<repo> is published from github.com/<owner>/<repo>
+        host, parts = "github.com", [pages_match.group(1)] + parts[:1]
+    if host not in repo_hosts or len(parts) < 2 or parts[0].lower() in reserved_owners:
+        return None
+    name = parts[1][:-4] if parts[1].endswith(".git") else parts[1]
+    if not name:
+        return None
+    return "https://{}/{}/{}".format(host, parts[0], name)
+
+
+def _label_rank(label):
+    label = re.sub(r"[^a-z ]", "", label.lower()).strip()
+    return source_labels.index(label) if label in source_labels else len(source_labels)
+
+
+def project_urls(package):
+    """
+    Project urls of a package, from PyPI ``project_urls`` or the ``Project-URL`` metadata entries
+    :param package:
+    :return: list of (label, url)
+    """
+    urls = package.get("project_urls") or []
+    if isinstance(urls, dict):
+        return sorted(urls.items())
+    pairs = []
+    for entry in urls:
+        if isinstance(entry, basestring):
+            label, _, url = entry.partition(",")
+            entry = (label.strip(), url.strip())
+        pairs.append(tuple(entry))
+    return pairs
+
+
+def repo_url_candidates(package):
+    """
+    Repository urls named by the metadata of a package, in order of trust: the VCS link of the requirement,
+    Project-URL source entries, other Project-URL entries pointing into a repository, the home page and the
+    download url
+    :param package:
+    :return: list of (source, repo url) without duplicates
+    """
+    urls = []
+    if package.get("link_url"):
+        urls.append(("link_url", package["link_url"]))
+    labelled = sorted(project_urls(package), key=lambda pair: _label_rank(pair[0]))
+    urls.extend(("project_url", url) for _, url in labelled)
+    urls.append(("home_page", package.get("home-page")))
+    urls.append(("download_url", package.get("download-url")))
+    candidates = []
+    seen = set()
+    for source, url in urls:
+        repo_url = normalize_repo_url(url)
+        if repo_url and repo_url.lower() not in seen:
+            seen.add(repo_url.lower())
+            candidates.append((source, repo_url))
+    return candidates
+
+
+def readthedocs_slug(package):
+    """
+    Read the Docs project of a package documented there
+    :param package:
+    :return: project slug, None when no url of the package is on Read the Docs
+    """
+    for url in [package.get("home-page")] + [url for _, url in project_urls(package)]:
+        if not url or not isinstance(url, basestring):
+            continue
+        match = readthedocs_pattern.match(utils.parse_url(url.strip()).lower())
+        if match:
+            return match.group(1)
+    return None
+
+
+def readthedocs_repo_url(slug, client=None, api_url=READTHEDOCS_API_URL):
+    """
+    Repository a Read the Docs project builds from, one small JSON request instead of scraping its pages
+    :param slug: Read the Docs project slug
+    :param client: HttpClient to send the request with
+    :param api_url:
+    :return: repo url, None when the project is unknown or not built from GitHub or Bitbucket
+    """
+    try:
+        result = utils.request("GET", api_url, params={"slug": slug}, client=client)
+    except Exception as exp:
+        logger.error("Failed to look up Read the Docs project %s - %s" % (slug, exp))
+        return None
+    projects = result.get("results") or [] if isinstance(result, dict) else []
+    return normalize_repo_url(projects[0].get("repo")) if projects else None
@@ -0,0 +1,296 @@
+# coding=utf-8
+"""
+Resolver daemon and its client.
+
+``pylicense serve`` keeps one warm Manager: its pooled connections, the installed distribution index, the license
+fingerprints, the compiled templates and the PyPI, response and result caches live as long as the process. Every
+request resolves on a fork of that manager (see :meth:`Manager.fork`), so concurrent requests share the warm state
+but not their results. The API is JSON over HTTP, on a localhost port or a Unix socket:
+
+* ``POST /resolve`` with ``{"requirements": "<requirements.txt text>", "include_text": true}`` answers
+  ``{"packages": [...], "unresolved": [{"name": ..., "reason": ...}], "seconds": ...}``, a package has the fields
+  of a report and its ``license_text``
+* ``GET /health`` answers ``{"status": "ok", "uptime": ..., "requests": ...}``
+
+Installed versions and license files come from the environment of the daemon, not from the one of the client.
+Posted requirements may not have options: ``-r``, ``-c`` or ``-e`` lines would make the daemon read its own files.
+The daemon answers on a loopback address unless it is started with ``--allow-remote``.
+"""
+import httplib
+import io
+import json
+import logging
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler
+from BaseHTTPServer import HTTPServer
+from SocketServer import ThreadingMixIn
+from SocketServer import UnixStreamServer
+
+import os
+
+from pylicense_manager.defaults import DEFAULT_ADDRESS
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+MAX_REQUEST_BYTES = 4 * 1024 * 1024
+
+
+def parse_address(address):
+    """
+    :param address: HOST:PORT, or the path of a Unix socket
+    :return: tuple of host and port, or the socket path
+    """
+    if os.sep in address or ":" not in address:
+        return address
+    host, port = address.rsplit(":", 1)
+    return host or "127.0.0.1", int(port)
+
+
+def is_loopback(address):
+    """
+    :param address: HOST:PORT, or the path of a Unix socket
+    :return: whether only local clients can connect, a Unix socket is guarded by its file permissions
+    """
+    server_address = parse_address(address)
+    if not isinstance(server_address, tuple):
+        return True
+    host = server_address[0].strip("[]")
+    return host in ("localhost", "::1") or host.startswith("127.")
+
+
+class RequirementsRejected(ValueError):
+    """
+    Posted requirements the daemon does not resolve
+    """
+
+
+def check_requirements(requirements):
+    """
+    Reject requirements text with options, pip would follow -r and -c to files of the daemon's host
+    :param requirements: text of a requirements file
+    :raise RequirementsRejected:
+    """
+    if not isinstance(requirements, basestring):
+        raise RequirementsRejected("requirements must be the text of a requirements file")
+    # pip joins continued lines before it reads the options
+    for line in requirements.replace("\\\n", " ").splitlines():
+        line = line.split(" #", 1)[0].strip()
+        if line.startswith("#"):
+            continue
+        for token in line.split():
+            if token.startswith("-"):
+                raise RequirementsRejected("Requirement options are not accepted: {}".format(line))
+
+
+class Resolver(object):
+    """
+    Resolves requirements on forks of a warm manager
+    """
+
+    def __init__(self, manager):
+        """
+        :param manager: Manager whose connection pools, caches and indexes are shared by every request
+        """
+        self.manager = manager
+        self.started_at = time.time()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def resolve(self, requirements, include_text=True):
+        """
+        Resolve the licenses of the text of a requirements file
+        :param requirements: text of a requirements file
+        :param include_text: answer the license texts
+        :return: JSON serializable dict
+        """
+        # imported here, the client does not need the manager and its dependencies
+        from pylicense_manager.manager import report_fields
+
+        check_requirements(requirements)
+        with self._lock:
+            self.requests += 1
+        started = time.time()
+        temp_dir = tempfile.mkdtemp()
+        try:
+            requirements_path = os.path.join(temp_dir, "requirements.txt")
+            with open(requirements_path, "w") as requirements_file:
+                requirements_file.write(requirements.encode("utf8") if isinstance(requirements, unicode)
+                                        else requirements)
+            run = self.manager.fork(requirements_path, temp_dir)
+            package_details = run.resolve_texts()
+        finally:
+            shutil.rmtree(temp_dir)
+        packages = []
+        for package in package_details:
+            result = dict((field, package.get(field)) for field in report_fields)
+            if include_text:
+                result["license_text"] = package.get("license_text")
+            packages.append(result)
+        return {
+            "packages": packages,
+            "unresolved": [{"name": name, "reason": reason} for name, reason in run.unresolved],
+            "seconds": time.time() - started
+        }
+
+    def health(self):
+        return {"status": "ok", "uptime": time.time() - self.started_at, "requests": self.requests}
+
+
+class ResolverHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of the resolver, the resolver is the ``resolver`` attribute of the server
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/health":
+            return self.send_json(200, self.server.resolver.health())
+        self.send_json(404, {"error": "Not Found"})
+
+    def do_POST(self):
+        if self.path != "/resolve":
+            return self.send_json(404, {"error": "Not Found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            return self.send_json(413, {"error": "Request larger than {} bytes".format(MAX_REQUEST_BYTES)})
+        try:
+            body = json.loads(self.rfile.read(length) or "{}")
+            requirements = body["requirements"]
+        except (ValueError, KeyError, TypeError) as exp:
+            return self.send_json(400, {"error": "Expected a JSON object with requirements - {}".format(exp)})
+        try:
+            result = self.server.resolver.resolve(requirements, include_text=body.get("include_text", True))
+        except RequirementsRejected as exp:
+            return self.send_json(400, {"error": str(exp)})
+        except Exception as exp:
+            logger.exception("Failed to resolve requirements")
+            return self.send_json(500, {"error": str(exp)})
+        self.send_json(200, result)
+
+    def send_json(self, status, body):
+        response = json.dumps(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, message_format, *args):
+        logger.debug(message_format % args)
+
+
+class ResolverServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class UnixResolverServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # a socket left behind by a daemon that did not shut down cleanly
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        UnixStreamServer.server_bind(self)
+
+
+def make_server(resolver, address=DEFAULT_ADDRESS, allow_remote=False):
+    """
+    :param resolver: Resolver answering the requests
+    :param address: HOST:PORT, or the path of a Unix socket
+    :param allow_remote: answer on an address other hosts can connect to, the API has no authentication
+    :return: server, call serve_forever() to answer requests
+    """
+    if not allow_remote and not is_loopback(address):
+        raise ValueError("{} is not a loopback address, the resolver has no authentication".format(address))
+    if not is_loopback(address):
+        logger.warning("Answering every host that can connect to %s", address)
+    server_address = parse_address(address)
+    if isinstance(server_address, tuple):
+        server = ResolverServer(server_address, ResolverHandler)
+    else:
+        server = UnixResolverServer(server_address, ResolverHandler)
+    server.resolver = resolver
+    return server
+
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+
+    def __init__(self, path, timeout=None):
+        httplib.HTTPConnection.__init__(self, "localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class ResolverClient(object):
+    """
+    Client of a resolver daemon
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=600):
+        """
+        :param address: HOST:PORT, or the path of a Unix socket
+        :param timeout: seconds to wait for an answer
+        """
+        self.address = parse_address(address)
+        self.timeout = timeout
+
+    def _request(self, method, path, body=None):
+        if isinstance(self.address, tuple):
+            connection = httplib.HTTPConnection(self.address[0], self.address[1], timeout=self.timeout)
+        else:
+            connection = UnixHTTPConnection(self.address, timeout=self.timeout)
+        try:
+            payload = json.dumps(body) if body is not None else None
+            connection.request(method, path, payload, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            document = json.loads(response.read() or "{}")
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise Exception("Resolver answered {}: {}".format(response.status, document.get("error")))
+        return document
+
+    def resolve(self, requirements, include_text=True):
+        """
+        :param requirements: text of a requirements file
+        :param include_text: answer the license texts
+        :return: dict of packages, unresolved packages and seconds
+        """
+        return self._request("POST", "/resolve", {"requirements": requirements, "include_text": include_text})
+
+    def health(self):
+        return self._request("GET", "/health")
+
+
+def write_result(output_dir, result):
+    """
+    Write the license files and report answered by a resolver as a local run writes them
+    :param output_dir: directory of the license_files directory and the report.json
+    :param result: answer of ResolverClient.resolve
+    :return: number of license files written
+    """
+    license_dir = os.path.join(output_dir, "license_files")
+    if not os.path.isdir(license_dir):
+        os.makedirs(license_dir)
+    written = 0
+    for package in result["packages"]:
+        license_content = package.pop("license_text", None)
+        if license_content is not None and package.get("license_file"):
+            with io.open(os.path.join(license_dir, package["license_file"]), "w", encoding="utf8") as license_file:
+                license_file.write(license_content)
+            written += 1
+    with open(os.path.join(output_dir, "report.json"), "w") as report_file:
+        json.dump({"packages": result["packages"], "unresolved": result["unresolved"]}, report_file, indent=2,
+                  sort_keys=True)
+    return written
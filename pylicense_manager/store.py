@@ -0,0 +1,103 @@
+# coding=utf-8
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+import os
+
+from pylicense_manager import utils
+from pylicense_manager.defaults import DEFAULT_STORE_PATH
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+# package fields restored from a stored result
+stored_fields = ['author', 'author_email', 'license', 'home-page', 'version', 'classifiers']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    found INTEGER NOT NULL,
+    strategy TEXT,
+    repo_url TEXT,
+    license_text TEXT,
+    metadata TEXT,
+    resolved_at REAL NOT NULL,
+    PRIMARY KEY (name, version)
+)
+"""
+
+
+class ResultStore(object):
+    """
+    SQLite store of resolved (package, version) license results shared between runs.
+
+    The database runs in WAL mode with a busy timeout, so several processes on the same host (concurrent CI
+    jobs) can read while one writes. Within a process the single connection is guarded by a lock. Packages that
+    could not be resolved are kept as negative entries with a shorter TTL, so they are not searched again on
+    every run.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, ttl=30 * 24 * 60 * 60, negative_ttl=24 * 60 * 60, timeout=30):
+        """
+        :param path: database file
+        :param ttl: seconds a resolved license is reused
+        :param negative_ttl: seconds a package without license is not searched again
+        :param timeout: seconds to wait on a database locked by another process
+        """
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        utils.create_path(os.path.dirname(os.path.abspath(path)))
+        # autocommit, every statement is its own transaction
+        self._connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA busy_timeout={}".format(int(timeout * 1000)))
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(SCHEMA)
+
+    def get(self, name, version):
+        """
+        Stored result of a package version, None when missing or expired
+        :param name: package name
+        :param version: package version
+        :return: dict with found, strategy, repo_url, license_text and metadata
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT found, strategy, repo_url, license_text, metadata, resolved_at FROM results "
+                "WHERE name = ? AND version = ?", (utils.normalize_name(name), version)).fetchone()
+        if row is None:
+            return None
+        found, strategy, repo_url, license_text, metadata, resolved_at = row
+        ttl = self.ttl if found else self.negative_ttl
+        if time.time() - resolved_at > ttl:
+            return None
+        return {
+            "found": bool(found),
+            "strategy": strategy,
+            "repo_url": repo_url,
+            "license_text": license_text,
+            "metadata": json.loads(metadata) if metadata else {}
+        }
+
+    def put(self, name, version, found, strategy=None, repo_url=None, license_text=None, metadata=None):
+        """
+        Store the result of a package version, replacing an older one
+        """
+        if isinstance(license_text, str):
+            license_text = license_text.decode("utf8", "replace")
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO results (name, version, found, strategy, repo_url, license_text, metadata, "
+                "resolved_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (utils.normalize_name(name), version, int(bool(found)), strategy, repo_url, license_text,
+                 json.dumps(metadata or {}), time.time()))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
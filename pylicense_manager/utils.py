@@ -1,4 +1,5 @@
 # coding=utf-8
+import codecs
 import errno
 import logging
 import shutil
@@ -10,68 +11,72 @@ import re
 import requests
 from bs4 import BeautifulSoup
 from requests import ConnectionError, HTTPError
-from requests.adapters import HTTPAdapter
-from urllib3 import Retry
+
+from pylicense_manager.client import get_default_client
+from pylicense_manager.health import DeadlineExceeded
+from pylicense_manager.parallel import Cancelled
+from pylicense_manager.ratelimit import RateLimitExhausted
 
 logging.basicConfig()
 logger = logging.getLogger(__name__)
 
 
 def request(method, request_url, params=None, data=None, custom_headers=None, stream=False,
-            json_output=True, verify_ssl=True, timeout=60):
+            json_output=True, verify_ssl=True, timeout=60, client=None, max_bytes=None):
+    if client is None:
+        client = get_default_client()
+    # the host slot is held until a streamed body has been read completely
+    with client.slot(request_url):
+        return _send(client, method, request_url, params, data, custom_headers, stream, json_output, verify_ssl,
+                     timeout, max_bytes)
+
+
+def _send(client, method, request_url, params, data, custom_headers, stream, json_output, verify_ssl, timeout,
+          max_bytes=None):
     logger.info("Sending request to {}".format(request_url))
     response = None
     try:
-        session = requests.Session()
-        session.params = {} if not params else params
-        session.stream = stream
-        session.verify = verify_ssl
-        session.proxies = None  # Future extension to proxy implementation
-        session.headers.update({
-            'Content-Type': "application/json",
-            'Cache-Control': "no-cache"
-        })
-
-        session.mount('https://', HTTPAdapter(
-            max_retries=Retry(
-                total=2,
-                status_forcelist=[429, 500, 502, 503],
-                backoff_factor=5,
-            )
-        ))
-
-        with session:
-            # Request headers
-            if custom_headers:
-                session.headers.update(custom_headers)
-            response = session.request(method=method, url=request_url, data=data, timeout=timeout)
-            logger.info("[%s] Response status: %s" % (response.status_code, response.reason))
-            if response.status_code == 400:
-                raise Exception("Bad request")
-            elif response.status_code == 404:
-                return {}
-            elif response.status_code == 403:
-                logger.info(response.text)
-                return {}
-            else:
-                response.raise_for_status()
+        response = client.request(method, request_url, params=params, data=data, headers=custom_headers,
+                                  stream=stream, verify=verify_ssl, timeout=timeout)
+        logger.info("[%s] Response status: %s" % (response.status_code, response.reason))
+        if response.status_code == 400:
+            response.close()
+            raise Exception("Bad request")
+        elif response.status_code == 404:
+            response.close()
+            return {}
+        elif response.status_code == 403:
+            logger.info(response.text)
+            return {}
+        else:
+            response.raise_for_status()
     except requests.exceptions.HTTPError as error:
         logger.error(error)
-        raise HTTPError(response.text)
+        raise HTTPError(response.text, response=response)
+
+    except (RateLimitExhausted, DeadlineExceeded, Cancelled):
+        raise
 
     except Exception as exp:
         logger.info("REQUEST ERROR: %s" % exp)
-        raise ConnectionError(exp)
+        # the request tells callers which host failed
+        raise ConnectionError(exp, request=requests.Request(method, request_url))
 
     if stream:
         content_string = StringIO()
+        read_length = 0
         for content in response.iter_content(decode_unicode=True, chunk_size=1024 * 16):
             try:
                 if content:
                     content_string.write(content)
+                    read_length += len(content)
             except StopIteration:
                 break
-        response = content_string.getvalue()
+            if max_bytes is not None and read_length >= max_bytes:
+                # the rest of the body is not downloaded
+                response.close()
+                break
+        response = content_string.getvalue()[:max_bytes]
         content_string.flush()
 
     if json_output:
@@ -83,6 +88,49 @@ def request(method, request_url, params=None, data=None, custom_headers=None, st
     return response
 
 
+def stream_text(request_url, client=None, max_bytes=None, chunk_size=1024 * 16, verify_ssl=True, timeout=60):
+    """
+    Yield the body of a GET response as decoded text chunks while it downloads
+    :param request_url:
+    :param client: HttpClient to send the request with
+    :param max_bytes: stop after this many bytes of the body, None reads all of it
+    :param chunk_size:
+    :param verify_ssl:
+    :param timeout:
+    :return: generator of unicode chunks, closing it early closes the response
+    """
+    if client is None:
+        client = get_default_client()
+    with client.slot(request_url):
+        logger.info("Streaming response from {}".format(request_url))
+        try:
+            response = client.request("GET", request_url, stream=True, verify=verify_ssl, timeout=timeout)
+        except (RateLimitExhausted, DeadlineExceeded, Cancelled):
+            raise
+        except Exception as exp:
+            logger.info("REQUEST ERROR: %s" % exp)
+            raise ConnectionError(exp, request=requests.Request("GET", request_url))
+        try:
+            logger.info("[%s] Response status: %s" % (response.status_code, response.reason))
+            if response.status_code >= 400:
+                return
+            try:
+                decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")("replace")
+            except LookupError:
+                decoder = codecs.getincrementaldecoder("utf-8")("replace")
+            read_bytes = 0
+            for content in response.iter_content(chunk_size=chunk_size):
+                read_bytes += len(content)
+                text = decoder.decode(content)
+                if text:
+                    yield text
+                if max_bytes is not None and read_bytes >= max_bytes:
+                    logger.info("Stopped reading {} after {} bytes".format(request_url, read_bytes))
+                    break
+        finally:
+            response.close()
+
+
 def write_to_file(file_path, content):
     logger.info("Writing content to file at %s" % file_path)
     try:
@@ -122,6 +170,15 @@ def delete_directories(directory_path):
             raise
 
 
+def normalize_name(name):
+    """
+    Normalize a package name the way PyPI does (PEP 503)
+    :param name:
+    :return: lower case name with runs of -, _ and . replaced by -
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
 def parse_url(url, only_domain=True, only_path=False):
     parsed_url = urlparse(url)
     if only_path:
@@ -159,14 +216,18 @@ def common_prefix_size(s1, s2):
 
 
 def longest_prefix(lst):
+    """
+    Longest prefix shared by any two strings of a list
+    :param lst:
+    :return: the prefix, the only element of a single element list
+    """
     if len(lst) == 1:
         return lst[0]
+    # the longest shared prefix is always shared by neighbours in sorted order
+    ordered = sorted(lst)
     res = ''
-    maxsize = 0
-    for i in range(len(lst) - 1):
-        for j in range(i + 1, len(lst)):
-            t = common_prefix_size(lst[i], lst[j])
-            maxsize = max(maxsize, t)
-            if maxsize == t:
-                res = lst[i][:maxsize]
+    for first, second in zip(ordered, ordered[1:]):
+        size = common_prefix_size(first, second)
+        if size >= len(res):
+            res = first[:size]
     return res
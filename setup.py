@@ -72,6 +72,7 @@ setup(
         # eg:
         #   'rst': ['docutils>=0.11'],
         #   ':python_version=="2.6"': ['argparse'],
+        'async': ['gevent>=1.2'],
     },
     entry_points={
         'console_scripts': [
@@ -0,0 +1,27 @@
+# coding=utf-8
+"""
+Local HTTP server the tests run their stand-in services on
+"""
+import threading
+from BaseHTTPServer import HTTPServer
+from SocketServer import ThreadingMixIn
+
+
+class ThreadedServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def start_server(test_case, handler_class):
+    """
+    Serve a request handler on a free port of 127.0.0.1 until the test ends
+    :param test_case: unittest.TestCase, the server is shut down with its cleanups
+    :param handler_class: BaseHTTPRequestHandler subclass
+    :return: tuple of the server and its url, http://127.0.0.1:<port>
+    """
+    server = ThreadedServer(("127.0.0.1", 0), handler_class)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    test_case.addCleanup(server.server_close)
+    test_case.addCleanup(server.shutdown)
+    return server, "http://127.0.0.1:{}".format(server.server_address[1])
@@ -0,0 +1,74 @@
+# coding=utf-8
+import io
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+import os
+
+from pylicense_manager import archives
+from pylicense_manager.manager import Manager
+
+
+class TestArchives(unittest.TestCase):
+
+    def setUp(self):
+        self.wheelhouse = tempfile.mkdtemp()
+        self.output_dir = tempfile.mkdtemp()
+        with zipfile.ZipFile(os.path.join(self.wheelhouse, "six-1.11.0-py2.py3-none-any.whl"), "w") as wheel:
+            wheel.writestr("six.py", "# six")
+            wheel.writestr("six-1.11.0.dist-info/METADATA",
+                           "Name: six\nVersion: 1.11.0\nLicense: MIT\nAuthor: Benjamin Peterson\n")
+            wheel.writestr("six-1.11.0.dist-info/LICENSE.txt", "six license")
+            wheel.writestr("six-1.11.0.dist-info/RECORD", "")
+        with tarfile.open(os.path.join(self.wheelhouse, "python-dateutil-2.6.1.tar.gz"), "w:gz") as sdist:
+            for name, content in [("python-dateutil-2.6.1/PKG-INFO", "Name: python-dateutil\nVersion: 2.6.1\n"
+                                                                     "License: Simplified BSD\n"),
+                                  ("python-dateutil-2.6.1/COPYING", "copying text"),
+                                  ("python-dateutil-2.6.1/LICENSE", "dateutil license"),
+                                  ("python-dateutil-2.6.1/docs/license.rst", "docs")]:
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                sdist.addfile(info, io.BytesIO(content))
+        with open(os.path.join(self.wheelhouse, "README"), "w") as readme:
+            readme.write("not an archive")
+
+    def tearDown(self):
+        shutil.rmtree(self.wheelhouse)
+        shutil.rmtree(self.output_dir)
+
+    def test_archive_name_version(self):
+        self.assertEqual(archives.archive_name_version("six-1.11.0-py2.py3-none-any.whl"), ("six", "1.11.0"))
+        self.assertEqual(archives.archive_name_version("python-dateutil-2.6.1.tar.gz"), ("python-dateutil", "2.6.1"))
+        self.assertIsNone(archives.archive_name_version("README"))
+
+    def test_read_archives(self):
+        wheelhouse = archives.index_wheelhouse(self.wheelhouse)
+        self.assertEqual(sorted(wheelhouse), [("python-dateutil", "2.6.1"), ("six", "1.11.0")])
+        results = archives.read_archives(wheelhouse.values(), processes=2)
+        wheel = results[wheelhouse[("six", "1.11.0")]]
+        self.assertEqual(wheel["metadata"]["license"], "MIT")
+        self.assertEqual(wheel["license_text"], "six license")
+        sdist = results[wheelhouse[("python-dateutil", "2.6.1")]]
+        self.assertEqual(sdist["metadata"]["license"], "Simplified BSD")
+        self.assertEqual(sdist["license_file"], "python-dateutil-2.6.1/LICENSE")
+        self.assertEqual(sdist["license_text"], "dateutil license")
+
+    def test_manager_wheelhouse(self):
+        manager = Manager(requirements_path=None, output_path=self.output_dir, wheelhouse=self.wheelhouse)
+        packages = [{"name": "six", "installed_version": None, "version_specific": "==1.11.0"},
+                    {"name": "python_dateutil", "installed_version": None, "version_specific": "==2.6.1"}]
+        manager._read_wheelhouse(packages)
+        manager._get_license_details(packages)
+        manager.search_router(packages)
+        manager.close()
+        self.assertEqual([package["strategy"] for package in packages], ["wheelhouse", "wheelhouse"])
+        self.assertEqual(packages[0]["author"], "Benjamin Peterson")
+        self.assertEqual(sorted(os.listdir(manager.created_dirs)),
+                         ["python-dateutil_license.txt", "six_license.txt"])
+
+
+if __name__ == '__main__':
+    unittest.main()
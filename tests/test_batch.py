@@ -0,0 +1,71 @@
+# coding=utf-8
+import json
+import shutil
+import tempfile
+import unittest
+
+import os
+
+from pylicense_manager.environment import DistributionIndex
+from pylicense_manager.manager import Manager
+
+INDEX = [
+    {"name": "six", "version": "1.11.0", "author": "Benjamin Peterson", "license": "MIT",
+     "home_page": "http://pypi.python.org/pypi/six/"},
+    {"name": "idna", "version": "2.6", "author": "Kim Davies", "license": "BSD 3-Clause",
+     "home_page": "https://github.com/kjd/idna"},
+]
+
+
+class TestBatchManager(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.temp_dir, "output")
+        self.index_path = os.path.join(self.temp_dir, "index.jsonl")
+        with open(self.index_path, "w") as index_file:
+            index_file.write("\n".join(json.dumps(info) for info in INDEX))
+        for service, requirements in [("api", "six==1.11.0\nidna==2.6\n"), ("worker", "idna==2.6\nsix==1.11.0\n"),
+                                      ("web", "six==1.11.0\n")]:
+            os.makedirs(os.path.join(self.temp_dir, "services", service))
+            with open(os.path.join(self.temp_dir, "services", service, "requirements.txt"), "w") as req_file:
+                req_file.write(requirements)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_glob_resolves_each_package_once(self):
+        manager = Manager(requirements_path=os.path.join(self.temp_dir, "services", "*", "requirements.txt"),
+                          output_path=self.output_dir, pypi_index=self.index_path, offline=True,
+                          environment=DistributionIndex(paths=[]))
+        resolved = []
+        search_license = manager._search_license
+
+        def counting_search(package):
+            resolved.append(package["name"])
+            return search_license(package)
+
+        manager._search_license = counting_search
+        try:
+            results = manager.parse_requirements()
+        finally:
+            manager.close()
+        self.assertEqual(sorted(resolved), ["idna", "six"])
+        self.assertEqual(len(results), 3)
+
+        [output_root] = os.listdir(self.output_dir)
+        output_root = os.path.join(self.output_dir, output_root)
+        self.assertEqual(sorted(os.listdir(output_root)),
+                         ["api_requirements", "web_requirements", "worker_requirements"])
+        self.assertEqual(sorted(os.listdir(os.path.join(output_root, "api_requirements", "license_files"))),
+                         ["idna_license.txt", "six_license.txt"])
+        self.assertEqual(os.listdir(os.path.join(output_root, "web_requirements", "license_files")),
+                         ["six_license.txt"])
+        with open(os.path.join(output_root, "worker_requirements", "report.json")) as report_file:
+            report = json.load(report_file)
+        self.assertEqual([(package["name"], package["line_no"], package["strategy"])
+                          for package in report["packages"]], [("idna", "1", "template"), ("six", "2", "template")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+# coding=utf-8
+import json
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+import os
+
+from pylicense_manager.bundle import INDEX_NAME
+from pylicense_manager.bundle import LicenseBundle
+from pylicense_manager.environment import DistributionIndex
+from pylicense_manager.manager import Manager
+
+
+def read_members(path):
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            return dict((name, archive.read(name)) for name in archive.namelist())
+    with tarfile.open(path) as archive:
+        return dict((member.name, archive.extractfile(member).read()) for member in archive.getmembers())
+
+
+class TestLicenseBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_formats(self):
+        for file_name in ("licenses.zip", "licenses.tar", "licenses.tar.gz", "licenses.tar.bz2"):
+            path = os.path.join(self.temp_dir, "out", file_name)
+            with LicenseBundle(path) as bundle:
+                bundle.add("license_files/six_license.txt", u"Copyright © 2018 Benjamin Peterson", name="six")
+                bundle.add("license_files/idna_license.txt", "BSD", name="idna")
+                # nothing is visible under the final path before the archive is complete
+                self.assertFalse(os.path.exists(path))
+            members = read_members(path)
+            self.assertEqual(sorted(members), [INDEX_NAME, "license_files/idna_license.txt",
+                                               "license_files/six_license.txt"])
+            self.assertEqual(members["license_files/six_license.txt"].decode("utf8"),
+                             u"Copyright © 2018 Benjamin Peterson")
+            index = [json.loads(line) for line in members[INDEX_NAME].splitlines()]
+            self.assertEqual([(entry["name"], entry["member"]) for entry in index],
+                             [("six", "license_files/six_license.txt"), ("idna", "license_files/idna_license.txt")])
+            self.assertEqual(index[1]["size"], 3)
+            self.assertEqual(os.listdir(os.path.dirname(path)), [file_name])
+            os.remove(path)
+
+    def test_empty_and_unsupported(self):
+        path = os.path.join(self.temp_dir, "empty.zip")
+        LicenseBundle(path).close()
+        self.assertEqual(read_members(path), {INDEX_NAME: ""})
+        self.assertRaises(ValueError, LicenseBundle, os.path.join(self.temp_dir, "licenses.rar"))
+
+    def test_manager_archive(self):
+        index_path = os.path.join(self.temp_dir, "index.jsonl")
+        with open(index_path, "w") as index_file:
+            index_file.write(json.dumps({"name": "six", "version": "1.11.0", "author": "Benjamin Peterson",
+                                         "license": "MIT", "home_page": "https://github.com/benjaminp/six"}))
+        requirements_paths = []
+        for name in ("app", "worker"):
+            requirements_paths.append(os.path.join(self.temp_dir, name, "requirements.txt"))
+            os.makedirs(os.path.dirname(requirements_paths[-1]))
+            with open(requirements_paths[-1], "w") as requirements_file:
+                requirements_file.write("six==1.11.0\n")
+        output_path = os.path.join(self.temp_dir, "output")
+        archive_path = os.path.join(self.temp_dir, "licenses.tar.gz")
+        manager = Manager(requirements_path=requirements_paths, output_path=output_path, pypi_index=index_path,
+                          offline=True, environment=DistributionIndex(paths=[]), archive=archive_path)
+        results = manager.parse_requirements()
+        manager.close()
+        self.assertFalse(os.path.exists(output_path))
+        self.assertEqual(results[requirements_paths[0]][0]["license_file"], "six_license.txt")
+        members = read_members(archive_path)
+        self.assertEqual(sorted(members), ["app_requirements/license_files/six_license.txt",
+                                           "app_requirements/report.json", INDEX_NAME,
+                                           "worker_requirements/license_files/six_license.txt",
+                                           "worker_requirements/report.json"])
+        self.assertIn("Benjamin Peterson", members["app_requirements/license_files/six_license.txt"])
+        report = json.loads(members["worker_requirements/report.json"])
+        self.assertEqual(report["packages"][0]["strategy"], "template")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+# coding=utf-8
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import os
+from BaseHTTPServer import BaseHTTPRequestHandler
+from multiprocessing.pool import ThreadPool
+
+from pylicense_manager import utils
+from pylicense_manager.cache import MemoryCache
+from pylicense_manager.cache import ResponseCache
+from pylicense_manager.client import HostLimiter
+from pylicense_manager.client import HttpClient
+from tests.local_server import start_server
+
+
+class JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = []
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.connections.append(self.client_address)
+
+    def do_GET(self):
+        body = json.dumps({"path": self.path})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+
+    def setUp(self):
+        JsonHandler.connections = []
+        self.server, self.base_url = start_server(self, JsonHandler)
+
+    def test_connection_reused(self):
+        with HttpClient(pool_maxsize=2) as client:
+            for i in range(5):
+                response = utils.request("GET", "{}/pypi/{}/json".format(self.base_url, i), client=client)
+                self.assertEqual(response["path"], "/pypi/{}/json".format(i))
+        self.assertEqual(len(JsonHandler.connections), 1)
+
+    def test_request_params(self):
+        with HttpClient() as client:
+            response = utils.request("GET", self.base_url + "/search", params={"q": "six"}, client=client)
+        self.assertEqual(response["path"], "/search?q=six")
+
+
+class EtagHandler(JsonHandler):
+    etag = '"v1"'
+    statuses = []
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == self.etag:
+            self.statuses.append(304)
+            self.send_response(304)
+            self.send_header("ETag", self.etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.statuses.append(200)
+        body = json.dumps({"path": self.path, "etag": self.etag})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        EtagHandler.statuses = []
+        self.cache_dir = tempfile.mkdtemp()
+        self.server, base_url = start_server(self, EtagHandler)
+        self.url = base_url + "/pypi/six/1.11.0/json"
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_revalidated_with_etag(self):
+        with HttpClient(cache=ResponseCache(self.cache_dir)) as client:
+            first = utils.request("GET", self.url, client=client)
+            second = utils.request("GET", self.url, client=client)
+        self.assertEqual(first, second)
+        self.assertEqual(EtagHandler.statuses, [200, 304])
+
+    def test_expired_entry_fetched_again(self):
+        with HttpClient(cache=ResponseCache(self.cache_dir, ttl=-1)) as client:
+            utils.request("GET", self.url, client=client)
+            utils.request("GET", self.url, client=client)
+        self.assertEqual(EtagHandler.statuses, [200, 200])
+
+    def test_size_eviction(self):
+        cache = ResponseCache(self.cache_dir, max_size=0)
+        with HttpClient(cache=cache) as client:
+            utils.request("GET", self.url, client=client)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+
+class TestMemoryCache(unittest.TestCase):
+
+    def test_least_recently_used_evicted(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", None)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("b", "missing"), "missing")
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+
+    def test_expired_entry_dropped(self):
+        cache = MemoryCache(ttl=-1)
+        cache.update({"a": 1})
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+
+class TestHostLimiter(unittest.TestCase):
+
+    def test_in_flight_capped_per_host(self):
+        limiter = HostLimiter({"api.github.com": 2, "*": 3})
+        in_flight = {"api.github.com": [0, 0], "*": [0, 0]}
+        lock = threading.Lock()
+
+        def call(url):
+            key = "api.github.com" if "api.github.com" in url else "*"
+            with limiter.slot(url):
+                with lock:
+                    in_flight[key][0] += 1
+                    in_flight[key][1] = max(in_flight[key][1], in_flight[key][0])
+                time.sleep(0.01)
+                with lock:
+                    in_flight[key][0] -= 1
+
+        urls = ["https://api.github.com/repos/a/{}".format(i) for i in range(10)]
+        urls += ["https://docs{}.example.org/".format(i) for i in range(10)]
+        pool = ThreadPool(20)
+        pool.map(call, urls)
+        pool.close()
+        pool.join()
+        self.assertEqual(in_flight["api.github.com"][1], 2)
+        self.assertEqual(in_flight["*"][1], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# coding=utf-8
+import json
+import shutil
+import tempfile
+import unittest
+
+import os
+import pkg_resources
+
+from pylicense_manager.dependencies import DependencyResolver
+from pylicense_manager.environment import DistributionIndex
+from pylicense_manager.manager import Manager
+
+DISTRIBUTIONS = {
+    "app-1.0.dist-info": ["requests[socks] (>=2.0)", "six"],
+    "requests-2.18.4.dist-info": ["idna (<2.7,>=2.5)", "six", "PySocks (!=1.5.7,>=1.5.6); extra == 'socks'",
+                                  "win-inet-pton; sys_platform == 'win32' and extra == 'socks'"],
+    "idna-2.6.dist-info": [],
+    "six-1.11.0.dist-info": [],
+}
+
+
+class TestDependencyResolver(unittest.TestCase):
+
+    def setUp(self):
+        self.site_dir = tempfile.mkdtemp()
+        for entry, requires in DISTRIBUTIONS.items():
+            name, version = entry[:-len(".dist-info")].split("-")
+            os.makedirs(os.path.join(self.site_dir, entry))
+            with open(os.path.join(self.site_dir, entry, "METADATA"), "w") as metadata:
+                metadata.write("Name: {}\nVersion: {}\n".format(name, version))
+                metadata.write("".join("Requires-Dist: {}\n".format(requirement) for requirement in requires))
+        os.makedirs(os.path.join(self.site_dir, "legacy-0.1.egg-info"))
+        with open(os.path.join(self.site_dir, "legacy-0.1.egg-info", "PKG-INFO"), "w") as metadata:
+            metadata.write("Name: legacy\nVersion: 0.1\n")
+        with open(os.path.join(self.site_dir, "legacy-0.1.egg-info", "requires.txt"), "w") as requires:
+            requires.write("six\n\n[docs]\nsphinx\n")
+        self.environment = DistributionIndex(paths=[self.site_dir])
+
+    def tearDown(self):
+        shutil.rmtree(self.site_dir)
+
+    def test_egg_info_requires(self):
+        self.assertEqual(self.environment.get("legacy").requires, ["six", 'sphinx; extra == "docs"'])
+
+    def test_closure(self):
+        releases = {"pysocks": "1.6.8"}
+        infos = {("PySocks", "1.6.8"): {"requires_dist": ["six"]}}
+        lookups = []
+
+        def pypi_info(name, version):
+            lookups.append(name)
+            return infos.get((name, version))
+
+        resolver = DependencyResolver(self.environment, find_release=lambda requirement: releases.get(requirement.key),
+                                      pypi_info=pypi_info)
+        dependencies = resolver.closure([pkg_resources.Requirement.parse("app"),
+                                         pkg_resources.Requirement.parse("legacy")])
+        self.assertEqual([(requirement.project_name, version, required_by)
+                          for requirement, version, required_by in dependencies],
+                         [("requests", "2.18.4", "app"), ("six", "1.11.0", "app"), ("idna", "2.6", "requests"),
+                          ("PySocks", "1.6.8", "requests")])
+        # the requirements of every package are read once
+        self.assertEqual(lookups, ["PySocks"])
+        resolver.closure([pkg_resources.Requirement.parse("app")])
+        self.assertEqual(lookups, ["PySocks"])
+
+    def test_versions_per_specifier(self):
+        infos = {("foo", "1.0"): {"requires_dist": ["bar"]}, ("foo", "2.0"): {"requires_dist": ["baz"]}}
+        releases = {"foo==1.0": "1.0", "foo==2.0": "2.0", "bar": "0.1"}
+        resolver = DependencyResolver(self.environment, find_release=lambda requirement: releases.get(str(requirement)),
+                                      pypi_info=lambda name, version: infos.get((name, version)))
+        resolver.closure([pkg_resources.Requirement.parse("foo==2.0")])
+        dependencies = resolver.closure([pkg_resources.Requirement.parse("foo==1.0")])
+        self.assertEqual([(requirement.project_name, version) for requirement, version, _ in dependencies],
+                         [("bar", "0.1")])
+
+    def test_manager_with_deps(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            requirements_path = os.path.join(temp_dir, "requirements.txt")
+            with open(requirements_path, "w") as requirements_file:
+                requirements_file.write("app==1.0\n")
+            index_path = os.path.join(temp_dir, "index.jsonl")
+            with open(index_path, "w") as index_file:
+                index_file.write(json.dumps({"name": "PySocks", "version": "1.6.8", "requires_dist": []}))
+            manager = Manager(requirements_path=requirements_path, output_path=temp_dir, pypi_index=index_path,
+                              offline=True, environment=self.environment, with_deps=True)
+            packages = manager._read_requirements(requirements_path)
+            manager.close()
+        finally:
+            shutil.rmtree(temp_dir)
+        self.assertEqual([(package["name"], package.get("required_by")) for package in packages],
+                         [("app", None), ("requests", "app"), ("six", "app"), ("idna", "requests"),
+                          ("PySocks", "requests")])
+        self.assertEqual(packages[-1]["version_specific"], "==1.6.8")
+        self.assertEqual(packages[1]["installed_version"], "2.18.4")
+
+
+if __name__ == '__main__':
+    unittest.main()
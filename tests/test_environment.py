@@ -0,0 +1,117 @@
+# coding=utf-8
+import shutil
+import tempfile
+import unittest
+
+import os
+
+from pylicense_manager.environment import DistributionIndex
+from pylicense_manager.manager import Manager
+
+
+def write_file(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, "w") as out_file:
+        out_file.write(content)
+
+
+class TestDistributionIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.site_dir = tempfile.mkdtemp()
+        write_file(os.path.join(self.site_dir, "python_dateutil-2.6.1.dist-info", "METADATA"),
+                   "Metadata-Version: 2.0\nName: python-dateutil\nVersion: 2.6.1\nLicense: BSD\n"
+                   "Home-page: https://dateutil.readthedocs.io\n"
+                   "Classifier: License :: OSI Approved :: BSD License\n"
+                   "Classifier: Programming Language :: Python\n")
+        write_file(os.path.join(self.site_dir, "six-1.11.0-py2.7.egg-info", "PKG-INFO"),
+                   "Metadata-Version: 1.1\nName: six\nVersion: 1.11.0\nLicense: MIT\n")
+        write_file(os.path.join(self.site_dir, "legacy-0.1-py2.7.egg-info"),
+                   "Metadata-Version: 1.0\nName: legacy\nVersion: 0.1\nLicense: GPL\n")
+        write_file(os.path.join(self.site_dir, "not_a_distribution", "__init__.py"), "")
+
+    def tearDown(self):
+        shutil.rmtree(self.site_dir)
+
+    def test_index_lookup(self):
+        index = DistributionIndex([self.site_dir])
+        self.assertEqual(len(index), 3)
+        self.assertIn("Python-Dateutil", index)
+        self.assertEqual(index.version("python_dateutil"), "2.6.1")
+        self.assertEqual(index.version("six"), "1.11.0")
+        self.assertIsNone(index.get("requests"))
+        metadata = index.get("python-dateutil").metadata
+        self.assertEqual(metadata["license"], "BSD")
+        self.assertEqual(metadata["home-page"], "https://dateutil.readthedocs.io")
+        self.assertEqual(metadata["classifiers"], ["License :: OSI Approved :: BSD License",
+                                                   "Programming Language :: Python"])
+        self.assertEqual(index.get("legacy").metadata["license"], "GPL")
+
+    def test_first_path_entry_wins(self):
+        other_site = tempfile.mkdtemp()
+        try:
+            write_file(os.path.join(other_site, "six-1.10.0.dist-info", "METADATA"), "Name: six\nVersion: 1.10.0\n")
+            index = DistributionIndex([other_site, self.site_dir])
+            self.assertEqual(index.version("six"), "1.10.0")
+        finally:
+            shutil.rmtree(other_site)
+
+    def test_metadata_read_on_demand(self):
+        index = DistributionIndex([self.site_dir])
+        self.assertIsNone(index.get("six")._message)
+        self.assertEqual(index.get("six").metadata["license"], "MIT")
+
+    def test_license_files(self):
+        dist_info = os.path.join(self.site_dir, "cryptography-2.1.4.dist-info")
+        write_file(os.path.join(dist_info, "METADATA"), "Name: cryptography\nVersion: 2.1.4\n"
+                                                        "License-File: LICENSE.APACHE\nLicense-File: LICENSE\n")
+        write_file(os.path.join(dist_info, "licenses", "LICENSE"), "dual license")
+        write_file(os.path.join(dist_info, "licenses", "LICENSE.APACHE"), "apache license")
+        write_file(os.path.join(self.site_dir, "cryptography", "licenses.py"), "")
+        write_file(os.path.join(self.site_dir, "cryptography", "COPYING"), "package license")
+        write_file(os.path.join(self.site_dir, "cryptography", "vendor", "COPYING"), "vendored license")
+        write_file(os.path.join(self.site_dir, "cryptography", "_vendor", "idna", "LICENSE"), "vendored license")
+        write_file(os.path.join(dist_info, "RECORD"),
+                   "cryptography/licenses.py,sha256=x,0\ncryptography/COPYING,sha256=z,15\n"
+                   "cryptography/vendor/COPYING,sha256=y,16\ncryptography/_vendor/idna/LICENSE,sha256=y,16\n"
+                   "cryptography-2.1.4.dist-info/RECORD,,\n")
+        # egg-info installs list their files relative to the egg-info directory
+        write_file(os.path.join(self.site_dir, "six", "LICENSE.txt"), "six license")
+        write_file(os.path.join(self.site_dir, "six-1.11.0-py2.7.egg-info", "installed-files.txt"),
+                   "../six/__init__.py\n../six/LICENSE.txt\nPKG-INFO\n")
+        index = DistributionIndex([self.site_dir])
+        cryptography = index.get("cryptography")
+        self.assertEqual([os.path.relpath(path, self.site_dir) for path in cryptography.license_files()],
+                         [os.path.join("cryptography-2.1.4.dist-info", "licenses", "LICENSE"),
+                          os.path.join("cryptography-2.1.4.dist-info", "licenses", "LICENSE.APACHE"),
+                          os.path.join("cryptography", "COPYING")])
+        self.assertEqual(cryptography.license_text()[1], u"dual license")
+        self.assertEqual(index.get("six").license_text(), (os.path.join(self.site_dir, "six", "LICENSE.txt"),
+                                                           u"six license"))
+        self.assertIsNone(index.get("python-dateutil").license_text())
+        self.assertIsNone(index.get("legacy").license_text())
+
+    def test_manager_uses_installed_license(self):
+        write_file(os.path.join(self.site_dir, "python_dateutil-2.6.1.dist-info", "LICENSE.txt"), "dateutil license")
+        output_dir = tempfile.mkdtemp()
+        try:
+            requirements_path = os.path.join(output_dir, "requirements.txt")
+            write_file(requirements_path, "python-dateutil==2.6.1\n")
+            # nothing listens on the API urls, any request would fail
+            manager = Manager(requirements_path=requirements_path, output_path=output_dir,
+                              environment=DistributionIndex([self.site_dir]), pypi_url="http://127.0.0.1:9/pypi",
+                              github_api_url="http://127.0.0.1:9", readthedocs_api_url="http://127.0.0.1:9/")
+            packages = manager.parse_requirements()
+            manager.close()
+            with open(os.path.join(manager.created_dirs, "python-dateutil_license.txt")) as license_file:
+                self.assertEqual(license_file.read(), "dateutil license")
+        finally:
+            shutil.rmtree(output_dir)
+        self.assertEqual(packages[0]["strategy"], "installed")
+        self.assertEqual(packages[0]["local_license_file"],
+                         os.path.join(self.site_dir, "python_dateutil-2.6.1.dist-info", "LICENSE.txt"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+# coding=utf-8
+import json
+import shutil
+import tempfile
+import unittest
+
+import os
+
+from pylicense_manager.environment import DistributionIndex
+from pylicense_manager.fingerprint import LicenseIndex
+from pylicense_manager.fingerprint import build_index
+from pylicense_manager.fingerprint import detect_license
+from pylicense_manager.fingerprint import get_index
+from pylicense_manager.fingerprint import normalize_text
+from pylicense_manager.licenses import render_license
+from pylicense_manager.manager import Manager
+
+MIT_TEXT = u"""The MIT License (MIT)
+
+Copyright © 2010-2018 Benjamin Peterson
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+ZPL_TEXT = u"""Zope Public License (ZPL) Version 2.1
+
+A copyright notice accompanies this license document that identifies the copyright holders.
+
+This license has been certified as open source. It has also been designated as GPL compatible by the Free Software
+Foundation (FSF).
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+following conditions are met:
+
+1. Redistributions in source code must retain the accompanying copyright notice, this list of conditions, and the
+following disclaimer.
+
+2. Redistributions in binary form must reproduce the accompanying copyright notice, this list of conditions, and the
+following disclaimer in the documentation and/or other materials provided with the distribution.
+
+3. Names of the copyright holders must not be used to endorse or promote products derived from this software without
+prior written permission from the copyright holders.
+
+4. The right to distribute this software or to use it for any purpose does not give you the right to use
+Servicemarks (sm) or Trademarks (tm) of the copyright holders. Use of them is covered by separate agreement with the
+copyright holders.
+
+5. If any files are modified, you must cause the modified files to carry prominent notices stating that you changed
+the files and the date of any change.
+
+Disclaimer
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS ``AS IS'' AND ANY EXPRESSED OR IMPLIED WARRANTIES, INCLUDING, BUT
+NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE COPYRIGHT HOLDERS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text(u"Copyright (c) 2018 Someone\n  # (C) Other\nThe Licence, see https://x.org\n"
+                                        u"All rights reserved.\n{{ project }} licences"),
+                         [u"the", u"license", u"see", u"http", u"x", u"org", u"licenses"])
+
+    def test_detect_reference_texts(self):
+        license_id, confidence = detect_license(MIT_TEXT)
+        self.assertEqual(license_id, "MIT")
+        self.assertGreater(confidence, 0.9)
+        for template_name, spdx_id in [("apache", "Apache-2.0"), ("bsd", "BSD-2-Clause"), ("bsd3", "BSD-3-Clause"),
+                                       ("gpl3", "GPL-3.0"), ("x11", "X11"), ("isc", "ISC")]:
+            license_id, confidence = detect_license(render_license(template_name, "six", "Benjamin Peterson", "2018"))
+            self.assertEqual(license_id, spdx_id)
+            self.assertGreater(confidence, 0.9)
+        # reflowed text with a project notice in front still matches
+        notice = u"six is distributed under the following license.\n\n" + u" ".join(MIT_TEXT.split())
+        self.assertEqual(detect_license(notice)[0], "MIT")
+        self.assertIsNone(detect_license(u"All code in this package is proprietary, do not copy."))
+        self.assertIsNone(detect_license(u""))
+
+    def test_near_miss_is_not_detected(self):
+        # the ZPL shares the conditions and the disclaimer of BSD-3-Clause, which is not the same license
+        self.assertIsNone(detect_license(ZPL_TEXT))
+        self.assertGreater(get_index().classify(ZPL_TEXT, min_confidence=0.5)[1], 0.5)
+
+    def test_spdx_directory(self):
+        spdx_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(spdx_dir, "0BSD.txt"), "w") as license_file:
+                license_file.write("Permission to use, copy, modify, and/or distribute this software for any purpose "
+                                   "with or without fee is hereby granted.\n\nTHE SOFTWARE IS PROVIDED \"AS IS\" AND "
+                                   "THE AUTHOR DISCLAIMS ALL WARRANTIES WITH REGARD TO THIS SOFTWARE.")
+            index = build_index(spdx_dir)
+        finally:
+            shutil.rmtree(spdx_dir)
+        self.assertEqual(index.references[-1][:2], ("0BSD", "0BSD.txt"))
+        self.assertEqual(index.classify(u"Copyright (C) 2018 by Someone\n\nPermission to use, copy, modify, and/or "
+                                        u"distribute this software for any purpose with or without fee is hereby "
+                                        u"granted.\n\nTHE SOFTWARE IS PROVIDED \"AS IS\" AND THE AUTHOR DISCLAIMS ALL "
+                                        u"WARRANTIES WITH REGARD TO THIS SOFTWARE."), ("0BSD", 1.0))
+        self.assertEqual(index.classify(MIT_TEXT)[0], "MIT")
+
+    def test_short_texts(self):
+        index = LicenseIndex(shingle_size=3)
+        index.add("WTFPL", u"do what the fuck you want")
+        index.add("Beerware", u"buy me a beer")
+        self.assertEqual(index.classify(u"Buy me a beer!"), ("Beerware", 1.0))
+        self.assertEqual(len(index), 2)
+
+    def test_manager_records_detected_license(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            index_path = os.path.join(temp_dir, "index.jsonl")
+            with open(index_path, "w") as index_file:
+                index_file.write(json.dumps({"name": "six", "version": "1.11.0", "author": "Benjamin Peterson",
+                                             "license": "BSD", "home_page": "https://github.com/benjaminp/six"}))
+            requirements_path = os.path.join(temp_dir, "requirements.txt")
+            with open(requirements_path, "w") as requirements_file:
+                requirements_file.write("six==1.11.0\n")
+            manager = Manager(requirements_path=requirements_path, output_path=temp_dir, pypi_index=index_path,
+                              offline=True, environment=DistributionIndex(paths=[]))
+            packages = manager.parse_requirements()
+            manager._write_license(dict(packages[0], name="six-copy"), MIT_TEXT)
+            manager.close()
+        finally:
+            shutil.rmtree(temp_dir)
+        self.assertEqual((packages[0]["detected_license"], packages[0]["detected_confidence"]), ("BSD-2-Clause", 1.0))
+        self.assertEqual(len(manager._detected), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
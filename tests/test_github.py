@@ -0,0 +1,110 @@
+# coding=utf-8
+import json
+import re
+import shutil
+import tempfile
+import unittest
+
+import os
+from BaseHTTPServer import BaseHTTPRequestHandler
+
+from pylicense_manager.github import GithubGraphQL
+from pylicense_manager.github import graphql_url
+from pylicense_manager.github import repo_slug
+from pylicense_manager.manager import Manager
+from tests.local_server import start_server
+
+REPOSITORIES = {
+    "benjaminp/six": {"licenseInfo": {"spdxId": "MIT", "name": "MIT License"}, "f0": {"text": "six license"}},
+    "kennethreitz/requests": {"licenseInfo": {"spdxId": "Apache-2.0", "name": "Apache License 2.0"},
+                              "f0": None, "f1": {"text": "requests license"}},
+}
+
+
+class GraphQLHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for the GitHub GraphQL endpoint answering repository license queries
+    """
+    queries = []
+    authorizations = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.queries.append(body["query"])
+        self.authorizations.append(self.headers.get("Authorization"))
+        data = {}
+        errors = []
+        for alias, owner, name in re.findall(r'(r\d+): repository\(owner: "([^"]+)", name: "([^"]+)"\)',
+                                             body["query"]):
+            repository = REPOSITORIES.get("{}/{}".format(owner, name))
+            data[alias] = repository
+            if repository is None:
+                errors.append({"type": "NOT_FOUND", "message": "Could not resolve {}/{}".format(owner, name)})
+        response = json.dumps({"data": data, "errors": errors})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestGithubGraphQL(unittest.TestCase):
+
+    def setUp(self):
+        GraphQLHandler.queries = []
+        GraphQLHandler.authorizations = []
+        self.output_dir = tempfile.mkdtemp()
+        self.server, self.base_url = start_server(self, GraphQLHandler)
+        self.url = self.base_url + "/graphql"
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_repo_slug(self):
+        self.assertEqual(repo_slug("https://github.com/BenjaminP/six"), "benjaminp/six")
+        self.assertEqual(repo_slug("https://github.com/benjaminp/six.git"), "benjaminp/six")
+        self.assertEqual(repo_slug("https://api.github.com/repos/benjaminp/six"), "benjaminp/six")
+        self.assertIsNone(repo_slug("https://github.com/benjaminp"))
+
+    def test_graphql_url(self):
+        self.assertEqual(graphql_url("https://api.github.com"), "https://api.github.com/graphql")
+        self.assertEqual(graphql_url("https://github.example.org/api/v3/"), "https://github.example.org/api/graphql")
+
+    def test_fetch_licenses_in_batches(self):
+        graphql = GithubGraphQL("token", url=self.url, batch_size=2)
+        results = graphql.fetch_licenses(["benjaminp/six", "kennethreitz/requests", "nobody/nothing"])
+        self.assertEqual(len(GraphQLHandler.queries), 2)
+        self.assertEqual(results["benjaminp/six"]["text"], "six license")
+        self.assertEqual(results["kennethreitz/requests"]["text"], "requests license")
+        self.assertEqual(results["kennethreitz/requests"]["spdx_id"], "Apache-2.0")
+        self.assertIsNone(results["nobody/nothing"])
+
+    def test_manager_uses_prefetched_licenses(self):
+        manager = Manager(requirements_path=None, output_path=self.output_dir, gh_token="token",
+                          github_batch=True, github_graphql_url=self.url)
+        packages = [
+            {"name": "six", "home-page": "https://github.com/benjaminp/six", "author": "Benjamin Peterson"},
+            {"name": "requests", "home-page": "https://github.com/kennethreitz/requests", "author": "Kenneth"},
+        ]
+        manager._prefetch_github_licenses(packages)
+        manager.search_router(packages)
+        manager.close()
+        self.assertEqual(len(GraphQLHandler.queries), 1)
+        self.assertEqual([package["strategy"] for package in packages], ["github", "github"])
+        self.assertEqual(sorted(os.listdir(manager.created_dirs)), ["requests_license.txt", "six_license.txt"])
+
+    def test_manager_with_several_tokens(self):
+        manager = Manager(requirements_path=None, output_path=self.output_dir, gh_token=["first", "second"],
+                          github_batch=True, github_api_url=self.base_url)
+        manager._prefetch_github_licenses([{"name": "six", "home-page": "https://github.com/benjaminp/six"}])
+        manager.close()
+        self.assertEqual(len(GraphQLHandler.queries), 1)
+        # the GraphQL endpoint of the configured GitHub is paced by the scheduler, which sends the first token
+        self.assertEqual(GraphQLHandler.authorizations, ["token first"])
+
+
+if __name__ == '__main__':
+    unittest.main()
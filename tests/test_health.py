@@ -0,0 +1,203 @@
+# coding=utf-8
+import json
+import shutil
+import tempfile
+import time
+import unittest
+from BaseHTTPServer import BaseHTTPRequestHandler
+
+import os
+from requests import ConnectionError, HTTPError
+
+from pylicense_manager import utils
+from pylicense_manager.client import HttpClient
+from pylicense_manager.environment import DistributionIndex
+from pylicense_manager.health import DeadlineExceeded
+from pylicense_manager.health import HostHealth
+from pylicense_manager.health import HostUnavailable
+from pylicense_manager.manager import Manager
+from pylicense_manager.manager import PROBE_CONCURRENCY
+from pylicense_manager.store import ResultStore
+from tests.local_server import start_server
+
+
+class ServicesHandler(BaseHTTPRequestHandler):
+    """
+    Failing paths, PyPI details and slow home pages without repository links
+    """
+    paths = []
+
+    def do_GET(self):
+        self.paths.append(self.path)
+        base_url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+        status, body = 404, {"message": "Not Found"}
+        if self.path.startswith("/down/"):
+            status, body = 503, {"message": "Service Unavailable"}
+        elif self.path.startswith("/pypi/"):
+            name = self.path.split("/")[2]
+            home_page = "https://github.com/bench/" + name if name.startswith("gh-") else base_url + "/home/" + name
+            status, body = 200, {"info": {"name": name, "version": "1.0", "license": "MIT", "author": "Someone",
+                                          "home_page": home_page}}
+        elif self.path.startswith("/home/"):
+            time.sleep(0.4)
+            status, body = 200, "<html><body>No links</body></html>"
+        elif self.path.startswith("/search/repositories"):
+            status, body = 200, {"total_count": 0, "items": []}
+        response = body if isinstance(body, basestring) else json.dumps(body)
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+class DownHandler(BaseHTTPRequestHandler):
+    """
+    GitHub API and raw file host answering every request with a server error
+    """
+    paths = []
+
+    def do_GET(self):
+        self.paths.append(self.path)
+        self.send_response(500)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_HEAD = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHostHealth(unittest.TestCase):
+
+    def test_circuit_opens_after_failures_in_a_row(self):
+        health = HostHealth(max_failures=2)
+        url = "https://docs.example.org/page"
+        self.assertFalse(health.failure(url))
+        health.success(url, 0.1)
+        self.assertFalse(health.failure(url))
+        self.assertTrue(health.failure(url))
+        self.assertEqual(health.open_hosts(), ["docs.example.org"])
+        with self.assertRaises(HostUnavailable):
+            health.timeout(url + "/other", 60)
+        self.assertEqual(health.timeout("https://pypi.python.org/pypi", 60), 60)
+
+    def test_circuit_retried_after_a_while(self):
+        health = HostHealth(max_failures=1, retry_after=0.1)
+        url = "https://docs.example.org/page"
+        self.assertTrue(health.failure(url))
+        with self.assertRaises(HostUnavailable):
+            health.timeout(url, 60)
+        time.sleep(0.1)
+        self.assertEqual(health.timeout(url, 60), 60)
+        # one more failure opens it again
+        self.assertTrue(health.failure(url))
+        self.assertEqual(health.open_hosts(), ["docs.example.org"])
+
+    def test_adaptive_timeout_and_deadline(self):
+        health = HostHealth(min_samples=3, min_timeout=1.0)
+        url = "https://pypi.python.org/pypi"
+        for seconds in (0.5, 0.5):
+            health.success(url, seconds)
+        self.assertEqual(health.timeout(url, 60), 60)
+        health.success(url, 0.5)
+        # average of 0.5 seconds and a deviation shrinking from 0.25
+        self.assertAlmostEqual(health.timeout(url, 60), 0.5 + 4 * 0.25 * 0.75 * 0.75)
+        for _ in range(20):
+            health.success(url, 0.01)
+        self.assertEqual(health.timeout(url, 60), 1.0)
+        health.deadline = time.time() + 0.5
+        self.assertLessEqual(health.timeout(url, 60), 0.5)
+        health.deadline = time.time()
+        with self.assertRaises(DeadlineExceeded):
+            health.timeout(url, 60)
+        # failures after the deadline are not held against the host
+        self.assertFalse(any(health.failure(url) for _ in range(5)))
+
+
+class TestServices(unittest.TestCase):
+
+    def setUp(self):
+        ServicesHandler.paths = []
+        self.temp_dir = tempfile.mkdtemp()
+        self.server, self.url = start_server(self, ServicesHandler)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_failing_host_is_skipped(self):
+        with HttpClient(max_retries=0, health=HostHealth(max_failures=2)) as client:
+            for i in range(2):
+                with self.assertRaises(HTTPError):
+                    utils.request("GET", "{}/down/{}".format(self.url, i), client=client)
+            with self.assertRaises(ConnectionError):
+                utils.request("GET", self.url + "/pypi/six/1.0/json", client=client)
+        self.assertEqual(ServicesHandler.paths, ["/down/0", "/down/1"])
+
+    def test_deadline_reports_partial_results(self):
+        requirements_path = os.path.join(self.temp_dir, "requirements.txt")
+        with open(requirements_path, "w") as requirements_file:
+            requirements_file.write("first==1.0\nsecond==1.0\nthird==1.0\n")
+        manager = Manager(requirements_path=requirements_path, output_path=self.temp_dir, pypi_url=self.url + "/pypi",
+                          github_api_url=self.url, environment=DistributionIndex(paths=[]), deadline=0.75)
+        started = time.time()
+        try:
+            packages = manager.parse_requirements()
+        finally:
+            manager.close()
+        self.assertLess(time.time() - started, 2)
+        self.assertEqual(packages[0]["strategy"], "template")
+        self.assertEqual(manager.unresolved, [("second", "deadline exceeded"), ("third", "deadline exceeded")])
+        # the third home page is never requested
+        self.assertEqual([path for path in ServicesHandler.paths if path.startswith("/home/")],
+                         ["/home/first", "/home/second"])
+
+    def test_run_continues_with_github_down(self):
+        DownHandler.paths = []
+        down_server, down_url = start_server(self, DownHandler)
+        requirements_path = os.path.join(self.temp_dir, "requirements.txt")
+        with open(requirements_path, "w") as requirements_file:
+            requirements_file.write("gh-first==1.0\ngh-second==1.0\nplain==1.0\n")
+        store_path = os.path.join(self.temp_dir, "store.db")
+        manager = Manager(requirements_path=requirements_path, output_path=self.temp_dir,
+                          http_client=HttpClient(max_retries=0, health=HostHealth(max_failures=3)),
+                          pypi_url=self.url + "/pypi", github_api_url=down_url, github_raw_url=down_url,
+                          environment=DistributionIndex(paths=[]), store_path=store_path)
+        try:
+            packages = manager.parse_requirements()
+        finally:
+            manager.close()
+        host = "127.0.0.1:{}".format(down_server.server_address[1])
+        # the home page of the last package has no links, its GitHub search is skipped and it is unresolved as well
+        self.assertEqual(manager.unresolved, [(name, host + " unavailable") for name in ("gh-first", "gh-second",
+                                                                                        "plain")])
+        self.assertEqual([package.get("strategy") for package in packages], [None, None, None])
+        # probes in flight when the circuit opens still arrive, nothing is sent afterwards
+        self.assertLessEqual(len(DownHandler.paths), 3 + PROBE_CONCURRENCY)
+        self.assertIsNone(ResultStore(store_path).get("gh-first", "1.0"))
+
+    def test_unresolved_in_requirement_order(self):
+        DownHandler.paths = []
+        down_server, down_url = start_server(self, DownHandler)
+        requirements_path = os.path.join(self.temp_dir, "requirements.txt")
+        with open(requirements_path, "w") as requirements_file:
+            requirements_file.write("plain==1.0\ngh-first==1.0\ngh-second==1.0\n")
+        manager = Manager(requirements_path=requirements_path, output_path=self.temp_dir, workers=3,
+                          http_client=HttpClient(max_retries=0, health=HostHealth(max_failures=3)),
+                          pypi_url=self.url + "/pypi", github_api_url=down_url, github_raw_url=down_url,
+                          environment=DistributionIndex(paths=[]))
+        try:
+            manager.parse_requirements()
+        finally:
+            manager.close()
+        host = "127.0.0.1:{}".format(down_server.server_address[1])
+        # the slow home page of plain is read after GitHub failed for the other packages
+        self.assertEqual(manager.unresolved, [(name, host + " unavailable") for name in ("plain", "gh-first",
+                                                                                        "gh-second")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# coding=utf-8
+import json
+import shutil
+import tempfile
+import unittest
+from BaseHTTPServer import BaseHTTPRequestHandler
+
+import os
+
+from pylicense_manager import utils
+from pylicense_manager.client import HttpClient
+from pylicense_manager.environment import DistributionIndex
+from pylicense_manager.instrumentation import Recorder
+from pylicense_manager.manager import Manager
+from tests.local_server import start_server
+
+
+class JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status = 404 if self.path.startswith("/missing") else 200
+        body = json.dumps({"path": self.path})
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.server, self.base_url = start_server(self, JsonHandler)
+
+    def test_requests_per_host(self):
+        events = []
+        recorder = Recorder(hooks=[lambda event, fields: events.append((event, fields))])
+        with HttpClient(recorder=recorder) as client:
+            utils.request("GET", self.base_url + "/pypi/six/json", client=client)
+            utils.request("GET", self.base_url + "/missing", client=client)
+        stats = recorder.report()["hosts"]["127.0.0.1:{}".format(self.server.server_address[1])]
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["statuses"], {"200": 1, "404": 1})
+        self.assertEqual(stats["bytes"], len(json.dumps({"path": "/pypi/six/json"})) + len(
+            json.dumps({"path": "/missing"})))
+        self.assertEqual(stats["retries"], 0)
+        self.assertIsNotNone(stats["p99_ms"])
+        self.assertEqual([event for event, _ in events], ["request", "request"])
+        self.assertEqual(events[0][1]["status"], 200)
+
+    def test_failing_hook_is_ignored(self):
+        def hook(event, fields):
+            raise ValueError("metrics backend down")
+
+        recorder = Recorder(hooks=[hook])
+        recorder.stage_time("search", 1.5)
+        self.assertEqual(recorder.report()["stages"], {"search": 1.5})
+
+    def test_manager_report(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            index_path = os.path.join(temp_dir, "index.jsonl")
+            with open(index_path, "w") as index_file:
+                index_file.write(json.dumps({"name": "six", "version": "1.11.0", "author": "Benjamin Peterson",
+                                             "license": "MIT", "home_page": "https://github.com/benjaminp/six"}))
+            requirements_path = os.path.join(temp_dir, "requirements.txt")
+            with open(requirements_path, "w") as requirements_file:
+                requirements_file.write("six==1.11.0\nunknown==1.0\n")
+            recorder = Recorder()
+            manager = Manager(requirements_path=requirements_path, output_path=temp_dir, pypi_index=index_path,
+                              offline=True, environment=DistributionIndex(paths=[]), recorder=recorder)
+            manager.parse_requirements()
+            manager.close()
+            report_path = os.path.join(temp_dir, "report.json")
+            recorder.write(report_path, manager.resolved_packages, manager.unresolved)
+            with open(report_path) as report_file:
+                report = json.load(report_file)
+        finally:
+            shutil.rmtree(temp_dir)
+        self.assertTrue({"read_requirements", "package_details", "search"} <= set(report["stages"]))
+        self.assertEqual(report["strategies"], {"template": 1, "not_found": 1})
+        six = report["packages"][0]
+        self.assertEqual(six["name"], "six")
+        self.assertEqual(sorted(six["timings"]), ["details", "detect", "search", "write"])
+        self.assertEqual(manager.run_report()["strategies"], report["strategies"])
+
+
+if __name__ == '__main__':
+    unittest.main()
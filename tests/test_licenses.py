@@ -0,0 +1,39 @@
+# coding=utf-8
+import unittest
+
+from pylicense_manager import licenses
+from pylicense_manager.manager import Manager
+
+
+class TestLicenses(unittest.TestCase):
+
+    def test_classify_license_name(self):
+        self.assertEqual(licenses.classify_license("BSD 3-Clause"), ("BSD-3-Clause", "bsd3"))
+        self.assertEqual(licenses.classify_license("BSD"), ("BSD-2-Clause", "bsd"))
+        self.assertEqual(licenses.classify_license("LGPLv3"), ("LGPL-3.0", "lgpl"))
+        self.assertEqual(licenses.classify_license("GPL-2.0"), ("GPL-2.0", "gpl2"))
+        self.assertEqual(licenses.classify_license("Apache License, Version 2.0"), ("Apache-2.0", "apache"))
+        self.assertEqual(licenses.classify_license("Dual licensed under the MIT licence"), ("MIT", "mit"))
+        self.assertEqual(licenses.classify_license("LGPL-2.1"), ("LGPL-2.1", None))
+        self.assertIsNone(licenses.classify_license("Proprietary"))
+
+    def test_classify_classifiers(self):
+        classifiers = ["Programming Language :: Python",
+                       "License :: OSI Approved :: GNU Lesser General Public License v3 or later (LGPLv3+)"]
+        self.assertEqual(licenses.classify_license("UNKNOWN", classifiers), ("LGPL-3.0+", "lgpl"))
+        self.assertEqual(licenses.classify_license("MIT", classifiers), ("MIT", "mit"))
+
+    def test_environment_is_shared(self):
+        self.assertIs(licenses.get_environment(), licenses.get_environment())
+
+    def test_generate_license(self):
+        content = Manager.generate_license("BSD 3-Clause", "six", "Benjamin Peterson", "2018")
+        self.assertIn("Neither the name of six", content)
+        content = Manager.generate_license(None, "six", "Benjamin Peterson", "2018",
+                                           classifiers=["License :: OSI Approved :: MIT License"])
+        self.assertIn("Benjamin Peterson", content)
+        self.assertIsNone(Manager.generate_license("Proprietary", "six", "Benjamin Peterson", "2018"))
+
+
+if __name__ == '__main__':
+    unittest.main()
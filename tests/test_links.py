@@ -0,0 +1,88 @@
+# coding=utf-8
+import unittest
+from BaseHTTPServer import BaseHTTPRequestHandler
+
+from pylicense_manager import utils
+from pylicense_manager.client import HttpClient
+from pylicense_manager.links import RepoLinkScanner
+from pylicense_manager.manager import Manager
+from tests.local_server import start_server
+
+HEADER = ('<html><body><a href="https://github.com/snide/sphinx_rtd_theme">theme</a>'
+          '<a href="https://github.com/benjaminp/six">six</a>'
+          '<a href="https://github.com/benjaminp/six/issues">issues</a>'
+          '<a href="https://github.com/benjaminp/six">source</a>'
+          '<a href="https://github.com/benjaminp/six">fork</a>')
+
+
+class HomePageHandler(BaseHTTPRequestHandler):
+    """
+    Home page with the repository links up front followed by a large body
+    """
+    sent = []
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.end_headers()
+        self.wfile.write(HEADER)
+        filler = "<p>" + "x" * 1024 + "</p>"
+        try:
+            for _ in range(32768):
+                self.wfile.write(filler)
+                self.sent.append(len(filler))
+        except Exception:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRepoLinkScanner(unittest.TestCase):
+
+    def test_votes_repository(self):
+        scanner = RepoLinkScanner(min_votes=10)
+        # tags split across chunks
+        for start in range(0, len(HEADER), 7):
+            scanner.feed(HEADER[start:start + 7])
+        self.assertFalse(scanner.done)
+        self.assertEqual(scanner.repo_url(), "https://github.com/benjaminp/six")
+
+    def test_done_after_min_votes(self):
+        scanner = RepoLinkScanner(min_votes=3)
+        scanner.feed(HEADER)
+        self.assertTrue(scanner.done)
+
+    def test_no_links(self):
+        scanner = RepoLinkScanner()
+        scanner.feed('<a href="https://example.com/six">home</a>')
+        self.assertIsNone(scanner.repo_url())
+
+    def test_longest_prefix(self):
+        self.assertEqual(utils.longest_prefix(["benjaminp/six", "pallets/flask", "benjaminp/sixer"]), "benjaminp/six")
+        self.assertEqual(utils.longest_prefix(["pallets"]), "pallets")
+        self.assertEqual(utils.longest_prefix([]), "")
+
+
+class TestExtractHomePageUrls(unittest.TestCase):
+
+    def setUp(self):
+        HomePageHandler.sent = []
+        self.server, base_url = start_server(self, HomePageHandler)
+        self.url = base_url + "/"
+
+    def test_stops_reading_early(self):
+        with HttpClient() as client:
+            self.assertEqual(Manager.extract_home_page_urls(self.url, client=client),
+                             "https://github.com/benjaminp/six")
+        # the 32 MB page was not downloaded
+        self.assertLess(len(HomePageHandler.sent), 32768)
+
+    def test_byte_cap(self):
+        with HttpClient() as client:
+            chunks = list(utils.stream_text(self.url, client=client, max_bytes=64 * 1024, chunk_size=16 * 1024))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 64 * 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# coding=utf-8
+import json
+import shutil
+import tempfile
+import unittest
+
+import os
+
+from pylicense_manager.environment import DistributionIndex
+from pylicense_manager.manager import Manager
+
+INDEX = [
+    {"name": "six", "version": "1.11.0", "author": "Benjamin Peterson", "license": "MIT",
+     "home_page": "http://pypi.python.org/pypi/six/"},
+    {"name": "six", "version": "1.10.0", "author": "Benjamin Peterson", "license": "MIT",
+     "home_page": "http://pypi.python.org/pypi/six/"},
+    {"name": "idna", "version": "2.6", "author": "Kim Davies", "license": "BSD 3-Clause",
+     "home_page": "https://github.com/kjd/idna"},
+]
+
+
+class TestIncrementalManager(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.temp_dir, "output")
+        self.index_path = os.path.join(self.temp_dir, "index.jsonl")
+        with open(self.index_path, "w") as index_file:
+            index_file.write("\n".join(json.dumps(info) for info in INDEX))
+        self.requirements_path = os.path.join(self.temp_dir, "requirements.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_manager(self, requirements):
+        with open(self.requirements_path, "w") as requirements_file:
+            requirements_file.write(requirements)
+        manager = Manager(requirements_path=self.requirements_path, output_path=self.output_dir,
+                          pypi_index=self.index_path, offline=True, incremental=True,
+                          environment=DistributionIndex(paths=[]))
+        resolved = []
+        search_license = manager._search_license
+
+        def counting_search(package):
+            resolved.append(package["name"])
+            return search_license(package)
+
+        manager._search_license = counting_search
+        try:
+            packages = manager.parse_requirements()
+        finally:
+            manager.close()
+        return manager, packages, resolved
+
+    def read_manifest(self, manager):
+        with open(os.path.join(os.path.dirname(manager.created_dirs), "manifest.json")) as manifest_file:
+            return json.load(manifest_file)["packages"]
+
+    def test_incremental_runs(self):
+        manager, packages, resolved = self.run_manager("six==1.11.0\nidna==2.6\n")
+        self.assertEqual(resolved, ["six", "idna"])
+        self.assertEqual(sorted(os.listdir(manager.created_dirs)), ["idna_license.txt", "six_license.txt"])
+        manifest = self.read_manifest(manager)
+        self.assertEqual(manifest["six"]["line"], "six==1.11.0")
+        self.assertEqual(manifest["six"]["version"], "1.11.0")
+        self.assertEqual(manifest["idna"]["source"], "template")
+        self.assertEqual(len(manifest["idna"]["sha256"]), 64)
+
+        # nothing changed
+        manager, packages, resolved = self.run_manager("six==1.11.0\nidna==2.6\n")
+        self.assertEqual(resolved, [])
+        self.assertEqual([package["strategy"] for package in packages], ["template", "template"])
+
+        # six changed, idna removed
+        manager, packages, resolved = self.run_manager("six==1.10.0\n")
+        self.assertEqual(resolved, ["six"])
+        self.assertEqual(os.listdir(manager.created_dirs), ["six_license.txt"])
+        manifest = self.read_manifest(manager)
+        self.assertEqual(sorted(manifest), ["six"])
+        self.assertEqual(manifest["six"]["version"], "1.10.0")
+
+    def test_modified_license_file_is_resolved_again(self):
+        manager, packages, resolved = self.run_manager("six==1.11.0\n")
+        with open(os.path.join(manager.created_dirs, "six_license.txt"), "a") as license_file:
+            license_file.write("edited")
+        manager, packages, resolved = self.run_manager("six==1.11.0\n")
+        self.assertEqual(resolved, ["six"])
+
+
+if __name__ == '__main__':
+    unittest.main()
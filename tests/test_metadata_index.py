@@ -0,0 +1,75 @@
+# coding=utf-8
+import json
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import os
+
+from pylicense_manager.manager import Manager
+from pylicense_manager.metadata_index import PyPIMetadataIndex
+
+SIX_INFO = {"name": "six", "version": "1.11.0", "author": "Benjamin Peterson", "author_email": "b@example.org",
+            "license": "MIT", "home_page": "http://pypi.python.org/pypi/six/"}
+IDNA_INFO = {"name": "idna", "version": "2.6", "author": "Kim Davies", "author_email": "k@example.org",
+             "license": "BSD-like", "home_page": "https://github.com/kjd/idna"}
+
+
+class TestPyPIMetadataIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def assert_index(self, index):
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.get("Six", "1.11.0")["author"], "Benjamin Peterson")
+        self.assertEqual(index.get("idna", "2.6")["license"], "BSD-like")
+        self.assertIsNone(index.get("six", "1.10.0"))
+
+    def test_directory(self):
+        os.makedirs(os.path.join(self.temp_dir, "six"))
+        with open(os.path.join(self.temp_dir, "six", "1.11.0.json"), "w") as json_file:
+            json.dump({"info": SIX_INFO, "urls": []}, json_file)
+        with open(os.path.join(self.temp_dir, "idna-2.6.json"), "w") as json_file:
+            json.dump({"info": IDNA_INFO}, json_file)
+        self.assert_index(PyPIMetadataIndex(self.temp_dir))
+
+    def test_json_lines(self):
+        path = os.path.join(self.temp_dir, "index.jsonl")
+        with open(path, "w") as json_file:
+            json_file.write(json.dumps({"info": SIX_INFO}) + "\n\n" + json.dumps(IDNA_INFO) + "\n")
+        self.assert_index(PyPIMetadataIndex(path))
+
+    def test_sqlite(self):
+        path = os.path.join(self.temp_dir, "index.sqlite")
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE metadata (name TEXT, version TEXT, json TEXT)")
+        connection.executemany("INSERT INTO metadata VALUES (?, ?, ?)",
+                               [("six", "1.11.0", json.dumps({"info": SIX_INFO})),
+                                ("idna", "2.6", json.dumps(IDNA_INFO))])
+        connection.commit()
+        connection.close()
+        self.assert_index(PyPIMetadataIndex(path))
+
+    def test_offline_manager(self):
+        path = os.path.join(self.temp_dir, "index.jsonl")
+        with open(path, "w") as json_file:
+            json_file.write(json.dumps(SIX_INFO) + "\n")
+        manager = Manager(requirements_path=None, output_path=self.temp_dir, pypi_index=path, offline=True,
+                          pypi_url="http://127.0.0.1:1/pypi")
+        packages = [{"name": "six", "installed_version": None, "version_specific": "==1.11.0"}]
+        manager._get_license_details(packages)
+        manager.search_router(packages)
+        manager.close()
+        self.assertEqual(packages[0]["home-page"], "http://pypi.python.org/pypi/six/")
+        self.assertEqual(packages[0]["strategy"], "template")
+        with open(os.path.join(manager.created_dirs, "six_license.txt")) as license_file:
+            self.assertIn("Benjamin Peterson", license_file.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+# coding=utf-8
+import json
+import shutil
+import tempfile
+import time
+import unittest
+from BaseHTTPServer import BaseHTTPRequestHandler
+from urlparse import parse_qs
+from urlparse import urlparse
+
+from pylicense_manager import manager as manager_module
+from pylicense_manager.manager import Manager
+from pylicense_manager.parallel import check_cancelled
+from pylicense_manager.parallel import first_success
+from tests.local_server import start_server
+
+RAW_FILES = {"/bench/found/raw/HEAD/COPYING": "copying text", "/bench/found/raw/HEAD/LICENCE": "licence text",
+             "/raw/bench/slowpkg/HEAD/LICENSE": "home page license", "/raw/bench/slowpkg-fork/HEAD/LICENSE": "fork license",
+             "/bench/large/raw/HEAD/LICENSE": "license text " * 5000}
+
+
+class BitbucketHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for Bitbucket raw files and a source listing of two pages
+    """
+    paths = []
+    heads = []
+
+    def do_GET(self):
+        (self.heads if self.command == "HEAD" else self.paths).append(self.path)
+        parsed_url = urlparse(self.path)
+        base_url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+        status, body = 404, "Not Found"
+        if parsed_url.path in RAW_FILES:
+            status, body = 200, RAW_FILES[parsed_url.path]
+        elif parsed_url.path == "/repositories/bench/listed/src":
+            page = int(parse_qs(parsed_url.query).get("page", ["1"])[0])
+            if page == 1:
+                values = [{"path": "README.rst", "links": {"self": {"href": base_url + "/files/README.rst"}}}]
+                listing = {"values": values, "next": base_url + "/repositories/bench/listed/src?pagelen=100&page=2"}
+            else:
+                values = [{"path": "LICENSE-MIT", "links": {"self": {"href": base_url + "/files/LICENSE-MIT"}}}]
+                listing = {"values": values}
+            status, body = 200, json.dumps(listing)
+        elif parsed_url.path == "/files/LICENSE-MIT":
+            status, body = 200, "mit text"
+        elif parsed_url.path == "/slowpkg/":
+            time.sleep(0.5)
+            status, body = 200, '<a href="https://github.com/bench/slowpkg">Source</a>'
+        elif parsed_url.path == "/search/repositories":
+            item = {"name": "slowpkg-fork", "url": "https://api.github.com/repos/bench/slowpkg-fork"}
+            status, body = 200, json.dumps({"total_count": 1, "items": [item]})
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    do_HEAD = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class TestFirstSuccess(unittest.TestCase):
+
+    def test_best_ranked_success_wins(self):
+        delays = {"a": 0.2, "b": 0.0, "c": 0.0}
+
+        def attempt(item):
+            time.sleep(delays[item])
+            return item.upper() if item in ("a", "b") else None
+
+        # b answers first, a is ranked before it
+        self.assertEqual(first_success(attempt, ["a", "b", "c"]), (0, "A"))
+
+    def test_dropped_attempts_are_cancelled(self):
+        delays = {"fast": 0.0, "slow": 0.1}
+        checked = []
+
+        def attempt(item):
+            time.sleep(delays[item])
+            check_cancelled()
+            checked.append(item)
+            return item
+
+        self.assertEqual(first_success(attempt, ["fast", "slow"]), (0, "fast"))
+        time.sleep(0.2)
+        # the slow attempt stops at its check, the fast one ranked before it succeeded
+        self.assertEqual(checked, ["fast"])
+
+    def test_items_after_a_success_are_not_started(self):
+        started = []
+
+        def attempt(item):
+            started.append(item)
+            if item == 2:
+                raise ValueError("broken")
+            return item == 1
+
+        self.assertEqual(first_success(attempt, [0, 1, 2, 3, 4], concurrency=1), (1, True))
+        self.assertEqual(started, [0, 1])
+        self.assertIsNone(first_success(attempt, [0, 2, 3], concurrency=2))
+        self.assertIsNone(first_success(attempt, []))
+
+    def test_stagger_and_deadline(self):
+        started = {}
+
+        def attempt(item):
+            started[item] = time.time()
+            time.sleep(item)
+            return item
+
+        begin = time.time()
+        # the failing first item lets the second start before its turn, the second succeeds before the turn of
+        # the third
+        self.assertEqual(first_success(lambda item: item != 0 and attempt(item), [0, 0.3, 0.05], stagger=0.2),
+                         (1, 0.3))
+        self.assertLess(started[0.3] - begin, 0.1)
+        self.assertNotIn(0.05, started)
+        # the slow first item is still running when the deadline passes
+        self.assertEqual(first_success(attempt, [0.4, 0.05], deadline=0.2), (1, 0.05))
+
+    def test_fatal_errors(self):
+        def attempt(item):
+            if item == "fatal":
+                raise KeyError(item)
+            return item == "found"
+
+        with self.assertRaises(KeyError):
+            first_success(attempt, ["missing", "fatal", "found"], fatal=(KeyError,))
+        self.assertEqual(first_success(attempt, ["found", "fatal"], fatal=(KeyError,)), (0, True))
+
+    def test_join_waits_for_attempts_in_flight(self):
+        finished = []
+
+        def attempt(item):
+            time.sleep(item)
+            finished.append(item)
+            return item
+
+        self.assertEqual(first_success(attempt, [0.01, 0.2], join=True), (0, 0.01))
+        self.assertEqual(finished, [0.01, 0.2])
+
+
+class TestBitbucketProbing(unittest.TestCase):
+
+    def setUp(self):
+        BitbucketHandler.paths = []
+        BitbucketHandler.heads = []
+        self.output_dir = tempfile.mkdtemp()
+        self.server, url = start_server(self, BitbucketHandler)
+        self.manager = Manager(requirements_path=None, output_path=self.output_dir, bitbucket_api_url=url,
+                               bitbucket_raw_url=url)
+
+    def tearDown(self):
+        self.manager.close()
+        shutil.rmtree(self.output_dir)
+
+    def test_raw_file_found(self):
+        self.assertEqual(self.manager.bitbucket_repo_search("https://bitbucket.org/bench/found"), "copying text")
+        # COPYING is ranked before LICENCE, the source listing is not read
+        self.assertFalse([path for path in BitbucketHandler.paths if path.startswith("/repositories/")])
+        # LICENSE is downloaded at once, the other names are probed with HEAD requests and only the winner is
+        # downloaded
+        self.assertIn("/bench/found/raw/HEAD/COPYING", BitbucketHandler.heads)
+        self.assertNotIn("/bench/found/raw/HEAD/LICENSE", BitbucketHandler.heads)
+        self.assertEqual(BitbucketHandler.paths, ["/bench/found/raw/HEAD/LICENSE", "/bench/found/raw/HEAD/COPYING"])
+
+    def test_raw_file_is_capped(self):
+        self.addCleanup(setattr, manager_module, "MAX_LICENSE_BYTES", manager_module.MAX_LICENSE_BYTES)
+        manager_module.MAX_LICENSE_BYTES = 100
+        license_content = self.manager.bitbucket_repo_search("https://bitbucket.org/bench/large")
+        self.assertEqual(license_content, ("license text " * 5000)[:100])
+
+    def test_listing_pages_are_followed(self):
+        self.assertEqual(self.manager.bitbucket_repo_search("https://bitbucket.org/bench/listed/src/default/"),
+                         "mit text")
+        self.assertEqual([path for path in BitbucketHandler.paths if not path.startswith("/bench/")],
+                         ["/repositories/bench/listed/src?pagelen=100", "/repositories/bench/listed/src?pagelen=100&page=2",
+                          "/files/LICENSE-MIT"])
+
+
+class TestHedgedSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.server, self.url = start_server(self, BitbucketHandler)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def search(self, **kwargs):
+        manager = Manager(requirements_path=None, output_path=self.output_dir, github_api_url=self.url,
+                          github_raw_url=self.url + "/raw", **kwargs)
+        try:
+            started = time.time()
+            result = manager._search_license({"name": "slowpkg", "home-page": self.url + "/slowpkg/"})
+            return result[:2], time.time() - started
+        finally:
+            manager.close()
+
+    def test_same_result_as_serial_run(self):
+        serial, _ = self.search()
+        self.assertEqual(serial, ("home_page", "https://github.com/bench/slowpkg"))
+        # the GitHub search answers first, the home page still takes precedence
+        self.assertEqual(self.search(hedge=True, hedge_stagger=0.05)[0], serial)
+        hedged, seconds = self.search(hedge=True, hedge_stagger=0.05, hedge_deadline=0.3)
+        self.assertEqual(hedged, ("github_search", "https://api.github.com/repos/bench/slowpkg-fork"))
+        self.assertLess(seconds, 0.5)
+
+    def test_searches_after_the_deadline_are_cancelled(self):
+        BitbucketHandler.paths = []
+        manager = Manager(requirements_path=None, output_path=self.output_dir, github_api_url=self.url,
+                          github_raw_url=self.url + "/raw", hedge=True, hedge_stagger=0.05, hedge_deadline=0.3)
+        try:
+            manager._search_license({"name": "slowpkg", "home-page": self.url + "/slowpkg/"})
+            time.sleep(0.6)
+        finally:
+            manager.close()
+        # the home page answers after the deadline, the repository it links is not asked anymore
+        self.assertIn("/slowpkg/", BitbucketHandler.paths)
+        self.assertNotIn("/raw/bench/slowpkg/HEAD/LICENSE", BitbucketHandler.paths)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,31 @@
 # coding=utf-8
+import subprocess
 import sys
 import unittest
 
 import os
 
+from pylicense_manager import green
 from pylicense_manager.cli import main
 from pylicense_manager.manager import Manager
 
 sys.path.append("..")
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
 requirements_file = os.path.realpath(os.path.join(SCRIPT_DIR, 'requirements.txt'))
+# runs the command line in a fresh interpreter and prints the modules that were loaded when gevent was asked to patch
+PATCH_ORDER_SCRIPT = """
+import sys
+from pylicense_manager import cli
+from pylicense_manager import green
+
+def patch():
+    print(sorted(name for name in {modules} if name in sys.modules))
+    raise SystemExit(0)
+
+green.patch = patch
+sys.argv = ["pylicense", "--async", "-r", {requirements!r}]
+cli.main([])
+"""
 
 
 class TestPyLicenseManager(unittest.TestCase):
@@ -22,6 +38,24 @@ class TestPyLicenseManager(unittest.TestCase):
         options = ["-h"]
         self.assertTrue(main(options))
 
+    def test_async_patches_before_imports(self):
+        modules = ["pylicense_manager.cache", "pylicense_manager.store", "requests", "urllib3", "ssl", "bs4"]
+        script = PATCH_ORDER_SCRIPT.format(modules=modules, requirements=requirements_file)
+        output = subprocess.check_output([sys.executable, "-c", script], cwd=os.path.dirname(SCRIPT_DIR))
+        self.assertEqual(output.strip().splitlines()[-1], "[]")
+
+    def test_map_keeps_order(self):
+        manager = Manager(requirements_path=requirements_file, output_path=SCRIPT_DIR, workers=4)
+        self.assertEqual(manager._map(lambda x: x * 2, range(20)), [x * 2 for x in range(20)])
+
+    @unittest.skipUnless(green.gevent, "gevent is not installed")
+    def test_map_greenlets_keeps_order(self):
+        def delayed(x):
+            green.gevent.sleep(0.001 * (20 - x))
+            return x * 2
+        self.manager.green_concurrency = 10
+        self.assertEqual(self.manager._map(delayed, range(20)), [x * 2 for x in range(20)])
+
     def test_parse_requirements(self):
         package_details = self.manager.parse_requirements()
         # print package_details
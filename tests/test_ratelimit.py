@@ -0,0 +1,104 @@
+# coding=utf-8
+import json
+import time
+import unittest
+from BaseHTTPServer import BaseHTTPRequestHandler
+
+from requests import Response
+
+from pylicense_manager import utils
+from pylicense_manager.client import HttpClient
+from pylicense_manager.ratelimit import GithubScheduler
+from pylicense_manager.ratelimit import RateLimitExhausted
+from tests.local_server import start_server
+
+
+def rate_limited_response(status_code, remaining, reset, **headers):
+    response = Response()
+    response.status_code = status_code
+    response.headers.update({"X-RateLimit-Remaining": str(remaining), "X-RateLimit-Reset": str(int(reset))})
+    response.headers.update(headers)
+    return response
+
+
+class TokenHandler(BaseHTTPRequestHandler):
+    """
+    GitHub stand-in where the "spent" token is out of requests
+    """
+    tokens = []
+
+    def do_GET(self):
+        token = self.headers.get("Authorization")
+        self.tokens.append(token)
+        status, remaining = (403, 0) if token == "token spent" else (200, 4999)
+        body = json.dumps({"message": "API rate limit exceeded"} if status == 403 else {"total_count": 0})
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("X-RateLimit-Remaining", str(remaining))
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestGithubScheduler(unittest.TestCase):
+    url = "https://api.github.com/repos/benjaminp/six/license"
+
+    def test_rotates_to_token_with_budget(self):
+        scheduler = GithubScheduler(["a", "b"], max_wait=0)
+        self.assertTrue(scheduler.update("a", self.url, rate_limited_response(403, 0, time.time() + 600)))
+        self.assertEqual(scheduler.acquire(self.url), "b")
+
+    def test_exhausted_tokens_raise(self):
+        scheduler = GithubScheduler(["a", "b"], max_wait=10)
+        for token in ("a", "b"):
+            scheduler.update(token, self.url, rate_limited_response(200, 0, time.time() + 600))
+        self.assertRaises(RateLimitExhausted, scheduler.acquire, self.url)
+        # the search budget is separate from the core budget
+        self.assertIn(scheduler.acquire("https://api.github.com/search/repositories"), ("a", "b"))
+
+    def test_budget_restored_after_reset(self):
+        scheduler = GithubScheduler(["a"], max_wait=0)
+        scheduler.update("a", self.url, rate_limited_response(200, 0, time.time() - 1))
+        self.assertEqual(scheduler.acquire(self.url), "a")
+
+    def test_retry_after_pauses_all_tokens(self):
+        scheduler = GithubScheduler(["a", "b"], max_wait=0.5)
+        self.assertTrue(scheduler.update("a", self.url, rate_limited_response(403, 100, time.time() + 600,
+                                                                              **{"Retry-After": "0.2"})))
+        started = time.time()
+        scheduler.acquire(self.url)
+        self.assertGreaterEqual(time.time() - started, 0.1)
+
+    def test_paces_low_budget(self):
+        scheduler = GithubScheduler(["a"], max_wait=0, pace_below=50)
+        scheduler.update("a", self.url, rate_limited_response(200, 10, time.time() + 100))
+        scheduler.acquire(self.url)
+        self.assertRaises(RateLimitExhausted, scheduler.acquire, self.url)
+
+
+class TestSchedulerClient(unittest.TestCase):
+
+    def setUp(self):
+        TokenHandler.tokens = []
+        self.server, base_url = start_server(self, TokenHandler)
+        self.url = base_url + "/search/repositories"
+
+    def test_client_switches_token(self):
+        scheduler = GithubScheduler(["spent", "fresh"], max_wait=0, hosts=("127.0.0.1",))
+        with HttpClient(scheduler=scheduler) as client:
+            self.assertEqual(utils.request("GET", self.url, client=client), {"total_count": 0})
+            self.assertEqual(utils.request("GET", self.url, client=client), {"total_count": 0})
+        self.assertEqual(TokenHandler.tokens, ["token spent", "token fresh", "token fresh"])
+
+    def test_client_reports_exhaustion(self):
+        scheduler = GithubScheduler(["spent"], max_wait=0, hosts=("127.0.0.1",))
+        with HttpClient(scheduler=scheduler) as client:
+            self.assertRaises(RateLimitExhausted, utils.request, "GET", self.url, client=client)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+# coding=utf-8
+import base64
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from BaseHTTPServer import BaseHTTPRequestHandler
+from urlparse import parse_qs
+from urlparse import urlparse
+
+import os
+
+from pylicense_manager.manager import Manager
+from pylicense_manager.manifest import content_hash
+from pylicense_manager.repo_urls import normalize_repo_url
+from pylicense_manager.repo_urls import readthedocs_repo_url
+from pylicense_manager.repo_urls import readthedocs_slug
+from pylicense_manager.repo_urls import repo_url_candidates
+from tests.local_server import start_server
+
+LICENSES = {"dateutil/dateutil": "dateutil license", "pallets/click": "click license",
+            "bench/accents": u"Copyright \xa9 2018 Jos\xe9 Mar\xeda".encode("utf8")}
+# license files on the raw file host
+RAW_FILES = {"/raw/pallets/click/HEAD/LICENSE.txt": "click license"}
+READTHEDOCS = {"dateutil": "https://github.com/dateutil/dateutil.git"}
+
+
+class ServicesHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for the GitHub license endpoint, the raw file host and the Read the Docs project API
+    """
+    paths = []
+
+    def do_GET(self):
+        self.paths.append(self.path)
+        parsed_url = urlparse(self.path)
+        parts = parsed_url.path.strip("/").split("/")
+        body = {"message": "Not Found"}
+        status = 404
+        if parsed_url.path in RAW_FILES:
+            status, body = 200, RAW_FILES[parsed_url.path]
+        elif parts[0] == "repos" and len(parts) == 4 and "/".join(parts[1:3]) in LICENSES:
+            status, body = 200, {"content": base64.b64encode(LICENSES["/".join(parts[1:3])])}
+        elif parsed_url.path == "/api/v2/project/":
+            slug = parse_qs(parsed_url.query)["slug"][0]
+            status, body = 200, {"results": [{"slug": slug, "repo": READTHEDOCS[slug]}] if slug in READTHEDOCS else []}
+        response = body if isinstance(body, basestring) else json.dumps(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(response)
+
+    do_HEAD = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRepoUrls(unittest.TestCase):
+
+    def setUp(self):
+        ServicesHandler.paths = []
+        self.output_dir = tempfile.mkdtemp()
+        self.server, self.url = start_server(self, ServicesHandler)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_normalize_repo_url(self):
+        expected = "https://github.com/pallets/click"
+        for url in ("https://github.com/pallets/click", "https://www.github.com/pallets/click/tree/master/docs",
+                    "git+https://github.com/pallets/click.git@7.0#egg=click", "git://github.com/pallets/click.git",
+                    "git+ssh://git@github.com/pallets/click.git", "git@github.com:pallets/click.git",
+                    "https://github.com/pallets/click/archive/7.0.tar.gz", "https://github.com/pallets/click/issues",
+                    "https://codeload.github.com/pallets/click/tar.gz/7.0", "https://pallets.github.io/click/"):
+            self.assertEqual(normalize_repo_url(url), expected, url)
+        self.assertEqual(normalize_repo_url("https://bitbucket.org/ned/coveragepy/src/default/"),
+                         "https://bitbucket.org/ned/coveragepy")
+        for url in ("https://github.com/pallets", "https://github.com/sponsors/pallets", "https://palletsprojects.com",
+                    "https://pallets.github.io/", None, "UNKNOWN"):
+            self.assertIsNone(normalize_repo_url(url), url)
+
+    def test_candidates(self):
+        package = {
+            "name": "click",
+            "home-page": "https://palletsprojects.com/p/click/",
+            "download-url": "https://github.com/pallets/click/archive/7.0.tar.gz",
+            "project_urls": ["Documentation, https://click.palletsprojects.com/", "Issue tracker, "
+                             "https://github.com/pallets/click/issues", "Source Code, https://github.com/pallets/click/"]
+        }
+        self.assertEqual(repo_url_candidates(package), [("project_url", "https://github.com/pallets/click")])
+        package["link_url"] = "git+https://github.com/fork/click.git@fix#egg=click"
+        package["project_urls"] = {"Code": "https://github.com/pallets/click"}
+        self.assertEqual(repo_url_candidates(package), [("link_url", "https://github.com/fork/click"),
+                                                        ("project_url", "https://github.com/pallets/click")])
+
+    def test_readthedocs(self):
+        package = {"name": "python-dateutil", "home-page": "https://dateutil.readthedocs.io"}
+        self.assertEqual(readthedocs_slug(package), "dateutil")
+        self.assertEqual(readthedocs_repo_url("dateutil", api_url=self.url + "/api/v2/project/"),
+                         "https://github.com/dateutil/dateutil")
+        self.assertIsNone(readthedocs_repo_url("unknown", api_url=self.url + "/api/v2/project/"))
+
+    def test_manager_skips_home_page(self):
+        manager = Manager(requirements_path=None, output_path=self.output_dir, github_api_url=self.url,
+                          readthedocs_api_url=self.url + "/api/v2/project/", github_raw_url=self.url + "/raw")
+        packages = [
+            {"name": "click", "home-page": self.url + "/p/click/",
+             "project_urls": {"Source Code": "https://github.com/pallets/click"}},
+            {"name": "python-dateutil", "home-page": "https://dateutil.readthedocs.io"},
+        ]
+        manager.search_router(packages)
+        manager.close()
+        self.assertEqual([(package["strategy"], package["repo_url"]) for package in packages],
+                         [("project_url", "https://github.com/pallets/click"),
+                          ("readthedocs", "https://github.com/dateutil/dateutil")])
+        # the raw file host has the click license, dateutil falls back to the license endpoint
+        self.assertIn("/raw/pallets/click/HEAD/LICENSE.txt", ServicesHandler.paths)
+        self.assertEqual(sorted(path for path in ServicesHandler.paths if not path.startswith("/raw/")),
+                         ["/api/v2/project/?slug=dateutil", "/repos/dateutil/dateutil/license"])
+
+    def test_non_ascii_license(self):
+        manager = Manager(requirements_path=None, output_path=self.output_dir, github_api_url=self.url,
+                          github_raw_url=self.url + "/raw")
+        package = {"name": "accents", "project_urls": {"Source Code": "https://github.com/bench/accents"}}
+        manager._route_package(package)
+        manager.close()
+        self.assertEqual(package["strategy"], "project_url")
+        license_path = os.path.join(manager.created_dirs, package["license_file"])
+        with io.open(license_path, encoding="utf8") as license_file:
+            self.assertEqual(license_file.read(), u"Copyright \xa9 2018 Jos\xe9 Mar\xeda")
+        self.assertEqual(package["license_sha256"], content_hash(u"Copyright \xa9 2018 Jos\xe9 Mar\xeda"))
+        # a byte string is hashed as it is
+        self.assertEqual(content_hash(b"MIT"), content_hash(u"MIT"))
+
+
+if __name__ == '__main__':
+    unittest.main()
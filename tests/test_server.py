@@ -0,0 +1,134 @@
+# coding=utf-8
+import io
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+import os
+
+from pylicense_manager.environment import DistributionIndex
+from pylicense_manager.manager import Manager
+from pylicense_manager.server import Resolver
+from pylicense_manager.server import RequirementsRejected
+from pylicense_manager.server import ResolverClient
+from pylicense_manager.server import is_loopback
+from pylicense_manager.server import make_server
+from pylicense_manager.server import parse_address
+from pylicense_manager.server import write_result
+
+PACKAGES = [
+    {"name": "six", "version": "1.11.0", "author": "Benjamin Peterson", "license": "MIT",
+     "home_page": "https://github.com/benjaminp/six"},
+    {"name": "attrs", "version": "18.1.0", "author": "Hynek Schlawack", "license": "MIT",
+     "home_page": "http://www.attrs.org/"},
+]
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        index_path = os.path.join(self.temp_dir, "index.jsonl")
+        with open(index_path, "w") as index_file:
+            index_file.write("\n".join(json.dumps(package) for package in PACKAGES))
+        self.manager = Manager(requirements_path=None, output_path=self.temp_dir, pypi_index=index_path, offline=True,
+                               environment=DistributionIndex(paths=[]))
+        self.resolver = Resolver(self.manager)
+
+    def tearDown(self):
+        self.manager.close()
+        shutil.rmtree(self.temp_dir)
+
+    def serve(self, address):
+        server = make_server(self.resolver, address)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address("127.0.0.1:8421"), ("127.0.0.1", 8421))
+        self.assertEqual(parse_address(":9000"), ("127.0.0.1", 9000))
+        self.assertEqual(parse_address("/run/pylicense.sock"), "/run/pylicense.sock")
+
+    def test_resolve_over_http(self):
+        server = self.serve("127.0.0.1:0")
+        client = ResolverClient("127.0.0.1:{}".format(server.server_address[1]))
+        first = client.resolve("six==1.11.0\nunknown==1.0\n")
+        self.assertEqual([(package["name"], package["strategy"]) for package in first["packages"]],
+                         [("six", "template"), ("unknown", None)])
+        self.assertIn(u"Benjamin Peterson", first["packages"][0]["license_text"])
+        self.assertEqual(first["packages"][0]["license_file"], "six_license.txt")
+        # the second request runs on a fork of the same warm manager, its results are its own
+        second = client.resolve("attrs==18.1.0\n", include_text=False)
+        self.assertEqual([package["name"] for package in second["packages"]], ["attrs"])
+        self.assertNotIn("license_text", second["packages"][0])
+        self.assertEqual(client.health()["requests"], 2)
+        self.assertEqual(self.manager.resolved_packages, [])
+        # nothing is written besides the PyPI index
+        self.assertEqual(os.listdir(self.temp_dir), ["index.jsonl"])
+
+        output_dir = os.path.join(self.temp_dir, "output")
+        self.assertEqual(write_result(output_dir, first), 1)
+        with io.open(os.path.join(output_dir, "license_files", "six_license.txt"), encoding="utf8") as license_file:
+            self.assertIn(u"Benjamin Peterson", license_file.read())
+        with open(os.path.join(output_dir, "report.json")) as report_file:
+            self.assertEqual(len(json.load(report_file)["packages"]), 2)
+
+    def test_resolve_over_unix_socket(self):
+        socket_path = os.path.join(self.temp_dir, "pylicense.sock")
+        self.serve(socket_path)
+        result = ResolverClient(socket_path).resolve("six==1.11.0\n")
+        self.assertEqual(result["packages"][0]["strategy"], "template")
+        self.assertEqual(result["unresolved"], [])
+
+    def test_forks_resolve_their_own_dependencies(self):
+        first = self.manager.fork(None)
+        second = self.manager.fork(None)
+        self.assertIsNot(first.dependency_resolver, second.dependency_resolver)
+        self.assertIsNot(first.dependency_resolver, self.manager.dependency_resolver)
+        # the PyPI details stay shared and warm
+        self.assertIs(first._pypi_infos, second._pypi_infos)
+
+    def test_bad_request(self):
+        server = self.serve("127.0.0.1:0")
+        client = ResolverClient("127.0.0.1:{}".format(server.server_address[1]))
+        with self.assertRaises(Exception) as raised:
+            client._request("POST", "/resolve", {"packages": []})
+        self.assertIn("400", str(raised.exception))
+
+    def test_option_lines_are_rejected(self):
+        secret_path = os.path.join(self.temp_dir, "secret.txt")
+        with open(secret_path, "w") as secret_file:
+            secret_file.write("attrs==18.1.0\n")
+        server = self.serve("127.0.0.1:0")
+        client = ResolverClient("127.0.0.1:{}".format(server.server_address[1]))
+        for requirements in ("-r {}\n".format(secret_path), "six==1.11.0\n  --constraint {}\n".format(secret_path),
+                             "six==1.11.0 \\\n    -c {}\n".format(secret_path)):
+            with self.assertRaises(Exception) as raised:
+                client.resolve(requirements)
+            self.assertIn("400", str(raised.exception))
+        with self.assertRaises(RequirementsRejected):
+            self.resolver.resolve(["six==1.11.0"])
+        self.assertEqual(self.resolver.requests, 0)
+        # names with dashes and comments are no options
+        result = client.resolve("python-dateutil==2.6.1  # -r comment\n# -e .\n")
+        self.assertEqual([package["name"] for package in result["packages"]], ["python-dateutil"])
+
+    def test_loopback_addresses(self):
+        self.assertTrue(is_loopback("127.0.0.1:8421"))
+        self.assertTrue(is_loopback("localhost:8421"))
+        self.assertTrue(is_loopback(":8421"))
+        self.assertTrue(is_loopback("/run/pylicense.sock"))
+        self.assertFalse(is_loopback("0.0.0.0:8421"))
+        self.assertFalse(is_loopback("192.168.1.10:8421"))
+        with self.assertRaises(ValueError):
+            make_server(self.resolver, "0.0.0.0:0")
+
+
+if __name__ == '__main__':
+    unittest.main()
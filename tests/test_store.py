@@ -0,0 +1,128 @@
+# coding=utf-8
+import json
+import shutil
+import tempfile
+import unittest
+from BaseHTTPServer import BaseHTTPRequestHandler
+
+import os
+
+from pylicense_manager.environment import DistributionIndex
+from pylicense_manager.manager import Manager
+from pylicense_manager.store import ResultStore
+from tests.local_server import start_server
+
+
+class TemplateHandler(BaseHTTPRequestHandler):
+    """
+    PyPI details of a package whose home page has no repository links and which GitHub does not know
+    """
+    paths = []
+
+    def do_GET(self):
+        self.paths.append(self.path)
+        base_url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+        status, body = 404, {"message": "Not Found"}
+        if self.path.startswith("/pypi/"):
+            status, body = 200, {"info": {"name": "six", "version": "1.11.0", "license": "MIT",
+                                          "author": "Benjamin Peterson", "home_page": base_url + "/home",
+                                          "classifiers": ["License :: OSI Approved :: MIT License"]}}
+        elif self.path.startswith("/home"):
+            status, body = 200, "<html><body>No links</body></html>"
+        elif self.path.startswith("/search/repositories"):
+            status, body = 200, {"total_count": 0, "items": []}
+        response = body if isinstance(body, basestring) else json.dumps(body)
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestResultStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_path = os.path.join(self.temp_dir, "results.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_round_trip_normalized_name(self):
+        store = ResultStore(self.store_path)
+        store.put("Python_Dateutil", "2.6.1", found=True, strategy="github",
+                  repo_url="https://github.com/dateutil/dateutil", license_text="license text",
+                  metadata={"license": "BSD"})
+        result = ResultStore(self.store_path).get("python-dateutil", "2.6.1")
+        self.assertTrue(result["found"])
+        self.assertEqual(result["strategy"], "github")
+        self.assertEqual(result["license_text"], "license text")
+        self.assertEqual(result["metadata"], {"license": "BSD"})
+        self.assertIsNone(store.get("python-dateutil", "2.6.0"))
+        store.close()
+
+    def test_negative_entry_ttl(self):
+        store = ResultStore(self.store_path, negative_ttl=-1)
+        store.put("ghost", "1.0", found=False)
+        store.put("six", "1.11.0", found=True, license_text="MIT")
+        self.assertIsNone(store.get("ghost", "1.0"))
+        self.assertTrue(store.get("six", "1.11.0")["found"])
+        store.close()
+
+    def test_stored_result_skips_network(self):
+        store = ResultStore(self.store_path)
+        store.put("six", "1.11.0", found=True, strategy="github", repo_url="https://github.com/benjaminp/six",
+                  license_text=u"six license", metadata={"license": "MIT", "home-page": "https://github.com/x/y"})
+        store.put("ghost", "1.0", found=False)
+        store.close()
+        manager = Manager(requirements_path=None, output_path=self.temp_dir, store_path=self.store_path)
+        packages = [
+            {"name": "six", "installed_version": None, "version_specific": "==1.11.0"},
+            {"name": "ghost", "installed_version": None, "version_specific": "==1.0"},
+        ]
+        manager._get_license_details(packages)
+        manager.search_router(packages)
+        manager.close()
+        self.assertEqual(packages[0]["strategy"], "github")
+        self.assertEqual(packages[0]["license"], "MIT")
+        self.assertIsNone(packages[1]["strategy"])
+        with open(os.path.join(manager.created_dirs, "six_license.txt")) as license_file:
+            self.assertEqual(license_file.read(), "six license")
+        self.assertEqual(os.listdir(manager.created_dirs), ["six_license.txt"])
+
+    def test_templates_are_stored_as_negative_entries(self):
+        TemplateHandler.paths = []
+        server, url = start_server(self, TemplateHandler)
+        packages = [{"name": "six", "installed_version": None, "version_specific": "==1.11.0"}]
+        manager = Manager(requirements_path=None, output_path=self.temp_dir, pypi_url=url + "/pypi",
+                          github_api_url=url, store_path=self.store_path, environment=DistributionIndex(paths=[]))
+        manager._get_license_details(packages)
+        manager.search_router(packages)
+        manager.close()
+        self.assertEqual(packages[0]["strategy"], "template")
+        store = ResultStore(self.store_path)
+        stored = store.get("six", "1.11.0")
+        store.close()
+        # the search is repeated once the negative TTL expires
+        self.assertFalse(stored["found"])
+        self.assertEqual(stored["strategy"], "template")
+        self.assertIsNone(stored["license_text"])
+        self.assertEqual(stored["metadata"]["classifiers"], ["License :: OSI Approved :: MIT License"])
+        requested = len(TemplateHandler.paths)
+        shutil.rmtree(manager.created_dirs)
+        # until then the template is generated again from the stored metadata
+        packages = [{"name": "six", "installed_version": None, "version_specific": "==1.11.0"}]
+        manager = Manager(requirements_path=None, output_path=self.temp_dir, pypi_url=url + "/pypi",
+                          github_api_url=url, store_path=self.store_path, environment=DistributionIndex(paths=[]))
+        manager._get_license_details(packages)
+        manager.search_router(packages)
+        manager.close()
+        self.assertEqual(len(TemplateHandler.paths), requested)
+        self.assertEqual(packages[0]["strategy"], "template")
+        with open(os.path.join(manager.created_dirs, "six_license.txt")) as license_file:
+            self.assertIn("Benjamin Peterson", license_file.read())
+
+if __name__ == '__main__':
+    unittest.main()